@@ -0,0 +1,291 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Re-analyses the measurement files saved by PyPV in whole directory
+# trees (e.g. <user>/<date>/) with a pool of processes, each one
+# analysing chunks of files with the batch functions of VICurves, and
+# writes a summary table. The results are cached by file size,
+# modification time and hash, so that the files already processed are
+# skipped.
+#
+# Usage: python2 BatchProcess.py [-o summary.txt] [-j processes] dir...
+
+from multiprocessing import Pool
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import VICurves
+import MeasurementFile
+import ResultsDatabase
+from MeasurementReport import (
+        CURRENT_POSITIVE, IRRADIANCE_UNIT_MULTIPLIER,
+        CURRENT_UNIT_MULTIPLIER)
+
+CACHE_FILE = '.pypv_batch_cache.json'
+# files analysed together by a process
+CHUNK_FILES = 64
+SUMMARY_COLUMNS = (
+        'file', 'user', 'experiment', 'device', 'diode', 'direction',
+        'date', 'irradiance', 'cellArea', 'jscDensity', 'voc', 'ff',
+        'efficiency', 'voltageMaxPower', 'seriesResistance',
+        'parallelResistance', 'points', 'hysteresisIndex',
+        'pceHysteresisIndex')
+
+
+def fileHash(fileName):
+    with open(fileName, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def findMeasurementFiles(directories):
+    """ the PyPV measurement files in the directory trees, sorted """
+    fileNames = []
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                if not name.endswith('.txt'):
+                    continue
+                fileName = os.path.join(root, name)
+                if MeasurementFile.isMeasurementFile(fileName):
+                    fileNames.append(fileName)
+    return sorted(fileNames)
+
+
+def analyseMeasurements(metadatas, voltages, currents):
+    """ the figures of merit computed by MainWindow.processMeasurement
+    and by the header of the file, for many curves, the ones of
+    extractdata computed together """
+    currents = [
+            current * (CURRENT_POSITIVE * 2 - 1) for current in currents]
+    maxPower, jsc, voc, ff, voltageMaxPower, currentMaxPower = (
+            VICurves.extractdataBatch(voltages, currents))
+    results = []
+    for i, (metadata, voltage, current) in enumerate(
+            zip(metadatas, voltages, currents)):
+        cellArea = metadata.get('cellArea') or 1.0
+        irradiance = metadata.get('irradiance') or 0.0
+        if irradiance:
+            efficiency = 100 * (
+                    (maxPower[i] / cellArea) /
+                    (irradiance * IRRADIANCE_UNIT_MULTIPLIER))
+        else:
+            efficiency = 0.0
+        compliance = metadata.get('compliance') or abs(current).max()
+        reverse = metadata.get('direction') == 'reverse'
+        results.append({
+                'jscDensity': jsc[i] * CURRENT_UNIT_MULTIPLIER / cellArea,
+                'voc': voc[i],
+                'ff': ff[i],
+                'efficiency': efficiency,
+                'voltageMaxPower': voltageMaxPower[i],
+                'seriesResistance': VICurves.calcSeriesResistance(
+                        voltage, current, compliance, reverse),
+                'parallelResistance': VICurves.calcParallelResistance(
+                        voltage, current),
+                'points': len(voltage)})
+    return results
+
+
+def summaryRow(fileName, metadata, results):
+    row = dict(
+            (key, metadata.get(key)) for key in SUMMARY_COLUMNS
+            if key in metadata)
+    for key, value in results.items():
+        try:
+            row[key] = float(value)
+        except ValueError:
+            # the series resistance can be "NotFound"
+            row[key] = None
+        if row[key] != row[key]:
+            # nan, e.g. the Voc of a curve clipped at the compliance
+            row[key] = None
+    row['file'] = fileName
+    return row
+
+
+def processChunk(fileNames):
+    """ reads and analyses the files together, returns for each one its
+    summary row or the error message """
+    outcomes = dict((fileName, None) for fileName in fileNames)
+    read = []
+    for fileName in fileNames:
+        try:
+            metadata, voltage, current = MeasurementFile.readMeasurement(
+                    fileName)
+            if not len(voltage):
+                raise ValueError("No data points")
+        except Exception as e:
+            outcomes[fileName] = (fileName, None, str(e))
+            continue
+        read.append((fileName, metadata, voltage, current))
+    if read:
+        names, metadatas, voltages, currents = zip(*read)
+        try:
+            results = analyseMeasurements(metadatas, voltages, currents)
+        except Exception:
+            # an error of one curve, found analysing them one at a time
+            results = []
+            for metadata, voltage, current in zip(
+                    metadatas, voltages, currents):
+                try:
+                    results.extend(analyseMeasurements(
+                            [metadata], [voltage], [current]))
+                except Exception as e:
+                    results.append(e)
+        for fileName, metadata, result in zip(names, metadatas, results):
+            if isinstance(result, Exception):
+                outcomes[fileName] = (fileName, None, str(result))
+            else:
+                outcomes[fileName] = (
+                        fileName, summaryRow(fileName, metadata, result),
+                        None)
+    return [outcomes[fileName] for fileName in fileNames]
+
+
+def processFile(fileName):
+    """ reads and analyses a file, returns its summary row or the error
+    message """
+    return processChunk([fileName])[0]
+
+
+def loadCache(cacheName):
+    if os.path.isfile(cacheName):
+        with open(cacheName) as f:
+            return json.load(f)
+    return {}
+
+
+def saveCache(cacheName, cache):
+    with open(cacheName + '.tmp', 'w') as f:
+        json.dump(cache, f)
+    if os.path.exists(cacheName):
+        os.remove(cacheName)
+    os.rename(cacheName + '.tmp', cacheName)
+
+
+def isCached(cache, fileName):
+    """ True if the cached results of the file are still valid, files
+    touched but not changed are recognised by their hash """
+    entry = cache.get(fileName)
+    if entry is None:
+        return False
+    stat = os.stat(fileName)
+    if entry['size'] != stat.st_size:
+        return False
+    if entry['mtime'] == stat.st_mtime:
+        return True
+    if entry['hash'] == fileHash(fileName):
+        entry['mtime'] = stat.st_mtime
+        return True
+    return False
+
+
+def processFiles(fileNames, cache, processes=None):
+    """ processes the files not in the cache, updating it, returns the
+    number of processed files and the errors """
+    toProcess = [f for f in fileNames if not isCached(cache, f)]
+    if not toProcess:
+        return 0, []
+    chunks = [
+            toProcess[first:first + CHUNK_FILES]
+            for first in range(0, len(toProcess), CHUNK_FILES)]
+    pool = Pool(processes)
+    try:
+        results = pool.map(processChunk, chunks)
+    finally:
+        pool.close()
+        pool.join()
+    errors = []
+    for fileName, row, error in [r for chunk in results for r in chunk]:
+        if error is not None:
+            errors.append((fileName, error))
+            cache.pop(fileName, None)
+            continue
+        stat = os.stat(fileName)
+        cache[fileName] = {
+                'size': stat.st_size, 'mtime': stat.st_mtime,
+                'hash': fileHash(fileName), 'row': row}
+    return len(toProcess), errors
+
+
+def formatValue(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return "%.5g" % value
+    return unicode(value).encode('utf-8')
+
+
+def writeSummary(output, rows):
+    output.write('\t'.join(SUMMARY_COLUMNS) + '\n')
+    for row in rows:
+        output.write('\t'.join(
+                formatValue(row.get(key)) for key in SUMMARY_COLUMNS) + '\n')
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+            description="Re-analyse PyPV measurement files and write a "
+            "summary table")
+    parser.add_argument(
+            'directories', nargs='+', help="directory trees to search")
+    parser.add_argument(
+            '-o', '--output', help="summary file, standard output if absent")
+    parser.add_argument(
+            '-j', '--processes', type=int, default=None,
+            help="number of processes, as many as the CPUs if absent")
+    parser.add_argument(
+            '--cache', default=CACHE_FILE,
+            help="results cache file (default %s)" % CACHE_FILE)
+    parser.add_argument(
+            '--no-cache', action='store_true',
+            help="process all the files again")
+    parser.add_argument(
+            '--database',
+            help="also write the results to this results database, e.g. "
+            "%s" % ResultsDatabase.DATABASE_FILE)
+    options = parser.parse_args(arguments)
+
+    fileNames = findMeasurementFiles(options.directories)
+    if options.no_cache:
+        cache = {}
+    else:
+        cache = loadCache(options.cache)
+    processed, errors = processFiles(fileNames, cache, options.processes)
+    saveCache(options.cache, cache)
+    for fileName, error in errors:
+        sys.stderr.write("Skipped %s: %s\n" % (fileName, error))
+    sys.stderr.write("%d files, %d processed, %d errors\n" % (
+            len(fileNames), processed, len(errors)))
+
+    rows = [cache[f]['row'] for f in fileNames if f in cache]
+    if options.database:
+        results = ResultsDatabase.ResultsDatabase(options.database)
+        results.insertMany(rows)
+        results.close()
+    if options.output:
+        with open(options.output, 'w') as f:
+            writeSummary(f, rows)
+    else:
+        writeSummary(sys.stdout, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Replacement of uic.loadUiType which does not parse and translate the
+# .ui file at every start: the file is compiled once to a python module
+# (ui_<name>.py, next to it) and compiled again only when it changes.
+
+from PyQt4 import QtGui
+import imp
+import os
+import xml.etree.ElementTree as ElementTree
+
+COMPILED_PREFIX = 'ui_'
+
+
+def compiledFileName(uiFile):
+    directory, name = os.path.split(os.path.abspath(uiFile))
+    return os.path.join(
+            directory, COMPILED_PREFIX + os.path.splitext(name)[0] + '.py')
+
+
+def compileUi(uiFile, compiledFile):
+    """ writes the python module of the ui file, the old module is
+    replaced only once the new one is complete """
+    # uic is slow to import, it is needed only here
+    from PyQt4 import uic
+    with open(compiledFile + '.tmp', 'w') as f:
+        uic.compileUi(uiFile, f)
+    if os.path.exists(compiledFile):
+        os.remove(compiledFile)
+    os.rename(compiledFile + '.tmp', compiledFile)
+
+
+def baseClass(uiFile):
+    """ the Qt class of the top level widget of the ui file """
+    # the first widget met is the top level one, the rest is not parsed
+    with open(uiFile) as f:
+        for event, element in ElementTree.iterparse(f, events=('start',)):
+            if element.tag == 'widget':
+                return getattr(QtGui, element.get('class'))
+    raise ValueError("No widget in %s" % uiFile)
+
+
+def loadUiType(uiFile):
+    """ (form class, base class) of the ui file, as uic.loadUiType """
+    compiledFile = compiledFileName(uiFile)
+    try:
+        if (
+                not os.path.isfile(compiledFile) or
+                os.path.getmtime(compiledFile) < os.path.getmtime(uiFile)):
+            print("Compiling %s" % uiFile)
+            compileUi(uiFile, compiledFile)
+    except (IOError, OSError) as e:
+        # e.g. a read-only installation
+        print("Cannot compile %s (%s), loading it directly" % (uiFile, e))
+        from PyQt4 import uic
+        return uic.loadUiType(uiFile)
+    module = imp.load_source(
+            os.path.splitext(os.path.basename(compiledFile))[0],
+            compiledFile)
+    formClass = [
+            getattr(module, name) for name in dir(module)
+            if name.startswith('Ui_')][0]
+    return formClass, baseClass(uiFile)
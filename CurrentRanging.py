@@ -0,0 +1,99 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Prediction of the fixed current ranges of a sweep from a previous curve
+# of the same cell (or from a quick pre-scan), avoiding the settling time
+# of the autorange at every range change. The sweep is split in segments
+# each one with the smallest range holding the expected current with
+# RANGE_MARGIN headroom, the segments too short take the larger range of
+# their neighbours to limit the range changes.
+
+from numpy import *
+
+from Keithley2400 import CURRENT_RANGES, RANGE_FULL_SCALE
+
+RANGE_MARGIN = 2.0
+MIN_SEGMENT_POINTS = 5
+# quick autoranged pre-scan used when no previous curve is known
+PRESCAN_POINTS = 11
+PRESCAN_INTEGRATION_TIME = 0.1
+
+
+def rangeFor(current, compliance):
+    """ smallest range measuring current with the margin, or measuring
+    the compliance if the current could reach it """
+    target = min(current * RANGE_MARGIN, compliance)
+    for currentRange in CURRENT_RANGES:
+        if currentRange * RANGE_FULL_SCALE >= target:
+            return currentRange
+    return CURRENT_RANGES[-1]
+
+
+def predictCurrents(voltages, previousVoltage, previousCurrent):
+    """ absolute current expected at the voltages from a previous curve,
+    the largest of the neighbouring points as the curve can change between
+    them, infinite outside the previous curve """
+    previousVoltage = asarray(previousVoltage, dtype=float)
+    order = argsort(previousVoltage)
+    voltage = previousVoltage[order]
+    current = abs(asarray(previousCurrent, dtype=float)[order])
+    local = maximum(current, maximum(
+            concatenate((current[1:], current[-1:])),
+            concatenate((current[:1], current[:-1]))))
+    # half a step beyond the ends of the previous curve is still known
+    margin = abs(diff(voltage)).max() / 2 if len(voltage) > 1 else 0
+    predicted = interp(voltages, voltage, local)
+    predicted[
+            (voltages < voltage[0] - margin) |
+            (voltages > voltage[-1] + margin)] = inf
+    return predicted
+
+
+def rangeSchedule(predicted, compliance, minSegment=MIN_SEGMENT_POINTS):
+    """ current range for each point of the sweep """
+    ranges = array([rangeFor(current, compliance) for current in predicted])
+    while True:
+        bounds = flatnonzero(diff(ranges)) + 1
+        starts = concatenate(([0], bounds))
+        stops = concatenate((bounds, [len(ranges)]))
+        values = ranges[starts]
+        # a short segment takes the range of a neighbour with a larger
+        # range, short segments with the largest range are kept
+        for segment in flatnonzero(stops - starts < minSegment):
+            larger = [
+                    values[n] for n in (segment - 1, segment + 1)
+                    if 0 <= n < len(starts) and values[n] > values[segment]]
+            if larger:
+                ranges[starts[segment]:stops[segment]] = min(larger)
+                break
+        else:
+            return ranges
+
+
+def describeRanges(voltage, ranges):
+    """ the ranges used in a sweep as text for the file header, e.g.
+    "1e-05 A from -0.1 V, auto from 0.5 V" """
+    segments = []
+    for i in range(len(ranges)):
+        if i and ranges[i] == ranges[i - 1]:
+            continue
+        if ranges[i]:
+            name = "%g A" % ranges[i]
+        else:
+            name = "auto"
+        segments.append("%s from %g V" % (name, voltage[i]))
+    return ", ".join(segments)
@@ -0,0 +1,335 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Fit of the single diode equation
+#   I = Iph - I0 (exp((V + I Rs) / (n Vt)) - 1) - (V + I Rs) / Rsh
+# in its explicit Lambert W form, with the current sign used by VICurves
+# (photocurrent positive). Many curves are fitted together by a
+# Levenberg-Marquardt iteration vectorised across the curves, the curves
+# not converged or fitted poorly being fitted again from other starting
+# points.
+
+from numpy import *
+
+import VICurves
+
+BOLTZMANN_OVER_CHARGE = 8.617333e-5
+# fitted parameters: photocurrent, log of saturation current, log of
+# ideality factor, log of series and of shunt resistances
+NUM_PARAMETERS = 5
+# bounds of the fitted parameters, keeping the model finite
+LOWER_BOUNDS = array([-1.0, log(1e-25), log(0.5), log(1e-4), log(1e-1)])
+UPPER_BOUNDS = array([1.0, log(1e-1), log(10.0), log(1e5), log(1e11)])
+# the shunt resistance is kept within this factor of the one from the
+# slope near short circuit, as calcParallelResistance, which measures it
+# well: left free the fit can trade it for the other parameters
+SHUNT_RANGE = 10.0
+# starting series resistances, as fractions of the one from the slope at
+# the highest voltage, which is overestimated when the diode does not
+# dominate there yet. All the curves start from the first one, the next
+# ones are tried only on the curves not converged yet or whose rms error,
+# relative to their highest current, is above RETRY_RMS_ERROR.
+SERIES_STARTS = (0.01, 0.1, 1.0)
+RETRY_RMS_ERROR = 1e-2
+# parameters whose standard error is larger, in the fitted logarithmic
+# units, are not determined by the curve
+MAX_STANDARD_ERROR = 1.0
+# relative decrease of the cost below which an iteration is converged
+COST_TOLERANCE = 1e-9
+# a parameter this close (in the fitted units) to a bound is not fitted
+BOUND_TOLERANCE = 1e-3
+# points within this fraction of the compliance are clipped by the
+# instrument, not given by the diode
+COMPLIANCE_TOLERANCE = 1e-3
+
+
+def lambertWExp(x):
+    """ Lambert W of exp(x), computed on x so that it does not overflow
+    for the large exponents of forward biased diodes """
+    # the start is kept positive where exp(x) underflows
+    w = where(
+            x > 1, x - log(maximum(x, 1)),
+            maximum(exp(minimum(x, 1)), 1e-300))
+    for i in range(8):
+        w = maximum(w * (1 + x - log(w)) / (1 + w), 1e-300)
+    return w
+
+
+def diodeCurrent(parameters, voltage, thermalVoltage):
+    """ current of the single diode model for each row of parameters """
+    photoCurrent = parameters[:, 0:1]
+    saturationCurrent = exp(parameters[:, 1:2])
+    nVt = exp(parameters[:, 2:3]) * thermalVoltage
+    seriesResistance = exp(parameters[:, 3:4])
+    shuntResistance = exp(parameters[:, 4:5])
+    sumResistance = seriesResistance + shuntResistance
+    logTheta = (
+            log(seriesResistance * saturationCurrent * shuntResistance /
+                (nVt * sumResistance)) +
+            shuntResistance * (
+                seriesResistance * (photoCurrent + saturationCurrent) +
+                voltage) / (nVt * sumResistance))
+    return (
+            (shuntResistance * (photoCurrent + saturationCurrent) - voltage) /
+            sumResistance -
+            nVt / seriesResistance * lambertWExp(logTheta))
+
+
+def linearSlopeBatch(x, y, window):
+    weight = window.astype(float)
+    count = maximum(weight.sum(axis=1), 1)
+    xMean = (x * weight).sum(axis=1) / count
+    yMean = (y * weight).sum(axis=1) / count
+    dx = (x - xMean[:, newaxis]) * weight
+    dy = (y - yMean[:, newaxis]) * weight
+    return (dx * dy).sum(axis=1) / maximum((dx * dx).sum(axis=1), 1e-30)
+
+
+def initialParameters(
+        voltage, current, valid, thermalVoltage, seriesFraction=1.0):
+    """ starting point from the slopes near short circuit and near the
+    highest voltage, as in calcParallelResistance, the series resistance
+    being multiplied by seriesFraction """
+    rows = arange(len(voltage))
+    index = arange(voltage.shape[1])
+    posJsc = where(valid, abs(voltage), inf).argmin(axis=1)
+    photoCurrent = maximum(current[rows, posJsc], 0)
+    window = valid & (abs(index - posJsc[:, newaxis]) <= 5)
+    slope = linearSlopeBatch(voltage, current, window)
+    shuntResistance = where(slope < 0, -1 / minimum(slope, -1e-30), 1e6)
+    shuntResistance = clip(shuntResistance, 1, 1e9)
+
+    posMaxV = where(valid, voltage, -inf).argmax(axis=1)
+    maxVoltage = voltage[rows, posMaxV]
+    maxCurrent = current[rows, posMaxV]
+    idealityFactor = 1.5 * ones(len(voltage))
+    nVt = idealityFactor * thermalVoltage
+    # near the highest voltage dV/dI = - (Rs + n Vt / I) for the diode
+    window = valid & (abs(index - posMaxV[:, newaxis]) <= 3)
+    slope = linearSlopeBatch(voltage, current, window)
+    diode = maximum(photoCurrent - maxCurrent, 1e-12)
+    seriesResistance = where(
+            slope < 0, -1 / minimum(slope, -1e-30) - nVt / diode, 1.0)
+    seriesResistance = clip(seriesResistance * seriesFraction, 1e-3, 1e4)
+
+    junctionVoltage = maximum(
+            maxVoltage - diode * seriesResistance, 10 * nVt)
+    diode = maximum(diode - junctionVoltage / shuntResistance, 1e-12)
+    saturationCurrent = diode / expm1(junctionVoltage / nVt)
+    saturationCurrent = clip(saturationCurrent, 1e-20, 1e-2)
+    return column_stack((
+            photoCurrent, log(saturationCurrent), log(idealityFactor),
+            log(seriesResistance), log(shuntResistance)))
+
+
+def residualsBatch(parameters, voltage, current, weight, thermalVoltage):
+    residuals = (
+            diodeCurrent(parameters, voltage, thermalVoltage) - current)
+    return where(weight > 0, residuals * weight, 0)
+
+
+def jacobianBatch(parameters, voltage, current, weight, thermalVoltage,
+                  residuals):
+    """ derivatives of the residuals by the parameters, by finite
+    differences, one matrix per row """
+    jacobian = zeros((len(parameters), voltage.shape[1], NUM_PARAMETERS))
+    for j in range(NUM_PARAMETERS):
+        step = 1e-7 * maximum(abs(parameters[:, j]), 1e-3)
+        shifted = parameters.copy()
+        shifted[:, j] += step
+        jacobian[:, :, j] = (residualsBatch(
+                shifted, voltage, current, weight, thermalVoltage) -
+                residuals) / step[:, newaxis]
+    return jacobian
+
+
+def levenbergMarquardt(
+        parameters, lower, upper, voltage, current, weight,
+        thermalVoltage, maxIterations):
+    """ minimises the weighted residuals of each row from the starting
+    parameters, within the bounds of the row, returns the parameters,
+    their cost and whether the iteration ended before maxIterations """
+    parameters = clip(parameters, lower, upper)
+    residuals = residualsBatch(
+            parameters, voltage, current, weight, thermalVoltage)
+    cost = (residuals ** 2).sum(axis=1)
+    damping = 1e-3 * ones(len(voltage))
+    finished = zeros(len(voltage), dtype=bool)
+    # the iterations go on only on the curves not converged yet
+    active = arange(len(voltage))
+    diagonal = (Ellipsis, arange(NUM_PARAMETERS), arange(NUM_PARAMETERS))
+    for iteration in range(maxIterations):
+        p = parameters[active]
+        v, c, w = voltage[active], current[active], weight[active]
+        r = residuals[active]
+        jacobian = jacobianBatch(p, v, c, w, thermalVoltage, r)
+        normal = einsum('rpi,rpj->rij', jacobian, jacobian)
+        gradient = einsum('rpi,rp->ri', jacobian, r)
+        damped = normal.copy()
+        damped[diagonal] += damping[active, newaxis] * (
+                normal[diagonal] + 1e-20)
+        delta = - einsum('rij,rj->ri', linalg.pinv(damped), gradient)
+        trial = clip(p + delta, lower[active], upper[active])
+        trialResiduals = residualsBatch(trial, v, c, w, thermalVoltage)
+        trialCost = (trialResiduals ** 2).sum(axis=1)
+        better = isfinite(trialCost) & (trialCost < cost[active])
+        # accepted steps reducing the cost by a negligible fraction
+        flat = better & (
+                cost[active] - trialCost < COST_TOLERANCE * cost[active])
+        improved = active[better]
+        parameters[improved] = trial[better]
+        residuals[improved] = trialResiduals[better]
+        cost[improved] = trialCost[better]
+        damping[active] = where(
+                better, damping[active] / 3, damping[active] * 4)
+        stalled = abs(trial - p).max(axis=1) < 1e-9
+        done = (
+                stalled | flat | (damping[active] > 1e12) |
+                (cost[active] < 1e-28))
+        finished[active[done]] = True
+        active = active[~done]
+        if not len(active):
+            break
+    return parameters, cost, finished
+
+
+def fitCurves(
+        voltage, current, lengths=None, temperature=298.15,
+        maxIterations=200, compliance=None):
+    """ fits the single diode model to many curves
+
+    voltage and current are in V and A, as 2-D arrays with one curve per
+    row plus the valid lengths or as lists of 1-D arrays (see
+    VICurves.extractdataBatch).
+    Returns a dict of arrays: seriesResistance, shuntResistance,
+    idealityFactor, saturationCurrent, photoCurrent, the rms of the
+    residuals relative to the highest current of the curve and
+    converged. The parameters ending at a bound, or not determined by
+    the curve, are nan, as all the ones of the curves with too few
+    points, and these curves are not converged. The points at the compliance
+    current, when given, are left out. """
+    if lengths is None and not (
+            isinstance(voltage, ndarray) and voltage.ndim == 2):
+        voltage, lengths = VICurves.stackCurves(voltage)
+        current, lengths = VICurves.stackCurves(current)
+    voltage = asarray(voltage, dtype=float)
+    current = asarray(current, dtype=float)
+    if lengths is None:
+        lengths = ones(len(voltage), dtype=int) * voltage.shape[1]
+    lengths = asarray(lengths, dtype=int)
+
+    thermalVoltage = BOLTZMANN_OVER_CHARGE * temperature
+    valid = arange(voltage.shape[1]) < lengths[:, newaxis]
+    if compliance:
+        valid &= abs(current) < compliance * (1 - COMPLIANCE_TOLERANCE)
+    voltage = where(valid, voltage, 0)
+    current = where(valid, current, 0)
+    scale = where(valid, abs(current), 0).max(axis=1)
+    scale[scale == 0] = 1
+    weight = valid / scale[:, newaxis]
+
+    rows = arange(len(voltage))
+    for start, fraction in enumerate(SERIES_STARTS):
+        if start:
+            rows = flatnonzero(~converged | (
+                    sqrt(cost / maximum(valid.sum(axis=1), 1)) >
+                    RETRY_RMS_ERROR))
+            if not len(rows):
+                break
+        fit = fitStart(
+                voltage[rows], current[rows], valid[rows], weight[rows],
+                thermalVoltage, fraction, maxIterations)
+        if not start:
+            parameters, cost, converged = fit
+            continue
+        better = fit[1] < cost[rows]
+        parameters[rows[better]] = fit[0][better]
+        cost[rows[better]] = fit[1][better]
+        converged[rows[better]] = fit[2][better]
+    # curves without enough points to determine the parameters
+    parameters[valid.sum(axis=1) <= NUM_PARAMETERS] = nan
+    converged &= ~isnan(parameters).any(axis=1)
+    return {
+            'photoCurrent': parameters[:, 0],
+            'saturationCurrent': exp(parameters[:, 1]),
+            'idealityFactor': exp(parameters[:, 2]),
+            'seriesResistance': exp(parameters[:, 3]),
+            'shuntResistance': exp(parameters[:, 4]),
+            'rmsError': sqrt(cost / maximum(valid.sum(axis=1), 1)),
+            'converged': converged}
+
+
+def fitStart(
+        voltage, current, valid, weight, thermalVoltage, seriesFraction,
+        maxIterations):
+    """ fits the curves from the initial parameters with seriesFraction,
+    returns the parameters, with nan for the ones ending at a bound or
+    not determined, the cost and the converged flags, false for the
+    curves with a parameter at a bound """
+    initial = initialParameters(
+            voltage, current, valid, thermalVoltage, seriesFraction)
+    lower = tile(LOWER_BOUNDS, (len(initial), 1))
+    upper = tile(UPPER_BOUNDS, (len(initial), 1))
+    lower[:, 4] = maximum(lower[:, 4], initial[:, 4] - log(SHUNT_RANGE))
+    upper[:, 4] = minimum(upper[:, 4], initial[:, 4] + log(SHUNT_RANGE))
+    parameters, cost, finished = levenbergMarquardt(
+            initial, lower, upper, voltage, current, weight,
+            thermalVoltage, maxIterations)
+    atBound = (
+            (parameters - lower < BOUND_TOLERANCE) |
+            (upper - parameters < BOUND_TOLERANCE))
+    error = standardErrors(
+            parameters, cost, voltage, current, valid, weight,
+            thermalVoltage)
+    # the photocurrent is not a logarithm, and is 0 for the dark curves
+    undetermined = error > MAX_STANDARD_ERROR
+    undetermined[:, 0] = False
+    parameters[atBound | undetermined] = nan
+    return parameters, cost, finished & ~atBound.any(axis=1)
+
+
+def standardErrors(
+        parameters, cost, voltage, current, valid, weight, thermalVoltage):
+    """ standard errors of the fitted parameters, from the jacobian at the
+    minimum """
+    residuals = residualsBatch(
+            parameters, voltage, current, weight, thermalVoltage)
+    jacobian = jacobianBatch(
+            parameters, voltage, current, weight, thermalVoltage, residuals)
+    normal = einsum('rpi,rpj->rij', jacobian, jacobian)
+    # scaled to a unit diagonal, the parameters the curve does not
+    # determine, alone or together, get a huge error instead of a
+    # singular matrix
+    scale = sqrt(maximum(diagonal(normal, axis1=1, axis2=2), 1e-300))
+    correlation = normal / (scale[:, :, newaxis] * scale[:, newaxis, :])
+    correlation += 1e-12 * eye(NUM_PARAMETERS)
+    degrees = maximum(valid.sum(axis=1) - NUM_PARAMETERS, 1)
+    with errstate(over='ignore'):
+        variance = (cost / degrees)[:, newaxis] * diagonal(
+                linalg.inv(correlation), axis1=1, axis2=2) / scale ** 2
+    return sqrt(abs(variance))
+
+
+def fitCurve(voltage, current, temperature=298.15, compliance=None):
+    """ fitCurves for a single curve, returns a dict of floats and the
+    converged flag """
+    results = fitCurves(
+            [asarray(voltage)], [asarray(current)], temperature=temperature,
+            compliance=compliance)
+    fit = dict((key, float(value[0])) for key, value in results.items())
+    fit['converged'] = bool(results['converged'][0])
+    return fit
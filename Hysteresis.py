@@ -0,0 +1,268 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Hysteresis of the illuminated cells measured forward and then reverse
+# (as "Auto Measure" does). The forward and the reverse curve of a diode
+# are resampled on a common voltage grid, from 0 V to the end of the
+# shorter scan, and compared by two indices, both positive when the
+# reverse curve is the better one:
+#   area index  (Ar - Af) / Ar, A the area under the current in the
+#               power quadrant
+#   PCE index   (Pr - Pf) / Pr, P the maximum power
+# All the pairs are processed together, so a whole day of measurements is
+# analysed in one call. The index of a pair is recorded with its reverse
+# curve, in the header of the file and in the results database.
+#
+# Usage: python2 Hysteresis.py [-o table.txt] [--write-headers]
+#                              [--database results.sqlite] dir...
+
+from numpy import *
+import argparse
+import os
+import sys
+
+import BatchProcess
+import MeasurementFile
+import MeasurementReport
+import ResultsDatabase
+import VICurves
+
+# points of the common voltage grid of a pair
+GRID_POINTS = 200
+# curves of the same diode, light and day are paired
+PAIR_KEYS = ('user', 'experiment', 'device', 'diode', 'irradiance', 'date')
+HYSTERESIS_COLUMNS = (
+        'forwardFile', 'file', 'experiment', 'device', 'diode',
+        'irradiance', 'hysteresisIndex', 'pceHysteresisIndex')
+
+
+def interpolateBatch(grid, x, y, lengths):
+    """ linear interpolation of the curves y(x) at the points of grid, one
+    curve per row with the first lengths[i] points of row i valid and x
+    without repeated values, the points of grid within the range of x.
+    The rows are laid one after the other on a single axis, each one
+    scaled to a unit interval and shifted beyond the previous one, so a
+    single interp call serves all of them. """
+    x = asarray(x, dtype=float)
+    y = asarray(y, dtype=float)
+    lengths = asarray(lengths, dtype=int)
+    rows = arange(len(x))
+    valid = arange(x.shape[1]) < lengths[:, newaxis]
+    order = argsort(where(valid, x, inf), axis=1)
+    x = x[rows[:, newaxis], order]
+    y = y[rows[:, newaxis], order]
+    low = x[:, 0]
+    span = x[rows, lengths - 1] - low
+    span[span == 0] = 1
+    offset = 2 * rows
+
+    def toAxis(values):
+        return (
+                (values - low[:, newaxis]) / span[:, newaxis] +
+                offset[:, newaxis])
+    # after sorting the valid points are the first ones of each row
+    resampled = interp(toAxis(grid).ravel(), toAxis(x)[valid], y[valid])
+    return resampled.reshape(shape(grid))
+
+
+def commonGrid(lowV, highV, points=GRID_POINTS):
+    """ rows of points voltages from lowV to highV """
+    return (
+            lowV[:, newaxis] +
+            (highV - lowV)[:, newaxis] * linspace(0, 1, points))
+
+
+def hysteresisBatch(
+        forwardVoltages, forwardCurrents, reverseVoltages, reverseCurrents,
+        points=GRID_POINTS):
+    """ area and PCE hysteresis indices, as arrays, of the pairs of
+    curves given as lists of arrays (currents in A, as measured), nan for
+    the pairs without a common voltage range in the power quadrant """
+    pairs = len(forwardVoltages)
+    voltage, lengths = VICurves.stackCurves(
+            list(forwardVoltages) + list(reverseVoltages))
+    current, lengths = VICurves.stackCurves(
+            list(forwardCurrents) + list(reverseCurrents))
+    current *= MeasurementReport.CURRENT_POSITIVE * 2 - 1
+    valid = arange(voltage.shape[1]) < lengths[:, newaxis]
+    maxPower = VICurves.calcPowerBatch(voltage, current, valid)[0]
+
+    lowV = where(valid, voltage, inf).min(axis=1)
+    highV = where(valid, voltage, -inf).max(axis=1)
+    gridLow = maximum(maximum(lowV[:pairs], lowV[pairs:]), 0)
+    gridHigh = minimum(highV[:pairs], highV[pairs:])
+    overlap = gridHigh > gridLow
+    gridHigh = where(overlap, gridHigh, gridLow)
+    grid = commonGrid(gridLow, gridHigh, points)
+    grid = concatenate((grid, grid))
+    resampled = interpolateBatch(grid, voltage, current, lengths)
+    area = trapz(maximum(resampled, 0), grid, axis=1)
+
+    with errstate(divide='ignore', invalid='ignore'):
+        areaIndex = (area[pairs:] - area[:pairs]) / area[pairs:]
+        pceIndex = (maxPower[pairs:] - maxPower[:pairs]) / maxPower[pairs:]
+    areaIndex[~overlap] = nan
+    pceIndex[maxPower[pairs:] <= 0] = nan
+    return areaIndex, pceIndex
+
+
+def nanToNone(value):
+    if isnan(value):
+        return None
+    return float(value)
+
+
+def curveHysteresis(forwardVoltage, forwardCurrent, voltage, current):
+    """ (area index, PCE index) of a single pair, the reverse curve being
+    voltage and current, None for the undefined indices """
+    areaIndex, pceIndex = hysteresisBatch(
+            [forwardVoltage], [forwardCurrent], [voltage], [current])
+    return nanToNone(areaIndex[0]), nanToNone(pceIndex[0])
+
+
+def pairCurves(metadatas):
+    """ (forward, reverse) indices in metadatas of the illuminated curves
+    with the same PAIR_KEYS: each reverse curve is paired with the latest
+    unpaired forward curve measured before it, the curves left without
+    a partner are skipped """
+    groups = {}
+    for i, metadata in enumerate(metadatas):
+        if not metadata.get('irradiance'):
+            continue
+        direction = metadata.get('direction')
+        if direction not in ('forward', 'reverse'):
+            continue
+        key = tuple(metadata.get(name) for name in PAIR_KEYS)
+        groups.setdefault(key, []).append(
+                (str(metadata.get('time')), i, direction))
+    pairs = []
+    for key in sorted(groups):
+        unpaired = []
+        for timeStamp, i, direction in sorted(groups[key]):
+            if direction == 'forward':
+                unpaired.append(i)
+            elif unpaired:
+                pairs.append((unpaired.pop(), i))
+    return pairs
+
+
+def analyseFiles(fileNames):
+    """ hysteresis rows (HYSTERESIS_COLUMNS) of the pairs of measurement
+    files and the files which could not be read, with their error """
+    metadatas, voltages, currents, names, errors = [], [], [], [], []
+    for fileName in fileNames:
+        try:
+            metadata, voltage, current = MeasurementFile.readMeasurement(
+                    fileName)
+        except Exception as e:
+            errors.append((fileName, str(e)))
+            continue
+        metadatas.append(metadata)
+        voltages.append(voltage)
+        currents.append(current)
+        names.append(fileName)
+    pairs = pairCurves(metadatas)
+    if not pairs:
+        return [], errors
+    forward, reverse = zip(*pairs)
+    areaIndex, pceIndex = hysteresisBatch(
+            [voltages[i] for i in forward], [currents[i] for i in forward],
+            [voltages[i] for i in reverse], [currents[i] for i in reverse])
+    rows = []
+    for n, (f, r) in enumerate(pairs):
+        row = dict(
+                (key, metadatas[r].get(key)) for key in HYSTERESIS_COLUMNS
+                if key in metadatas[r])
+        row.update(
+                forwardFile=names[f], file=names[r],
+                hysteresisIndex=nanToNone(areaIndex[n]),
+                pceHysteresisIndex=nanToNone(pceIndex[n]))
+        rows.append(row)
+    return rows, errors
+
+
+def writeHeader(fileName, hysteresisIndex, pceHysteresisIndex):
+    """ adds the hysteresis line to the header of a measurement file, in
+    place of the one already there """
+    with open(fileName, 'rb') as f:
+        content = f.read()
+    header, block = MeasurementFile.splitContent(content)
+    line = MeasurementReport.formatHysteresis(
+            hysteresisIndex, pceHysteresisIndex)
+    header = [
+            text for text in header
+            if not text.startswith("Hysteresis Index:")]
+    header.insert(len(header) - 1, line)
+    with open(fileName + '.tmp', 'wb') as f:
+        f.write("\n".join(header).encode('latin-1'))
+        f.write(block)
+    os.remove(fileName)
+    os.rename(fileName + '.tmp', fileName)
+
+
+def writeTable(output, rows):
+    output.write('\t'.join(HYSTERESIS_COLUMNS) + '\n')
+    for row in rows:
+        output.write('\t'.join(
+                BatchProcess.formatValue(row.get(key))
+                for key in HYSTERESIS_COLUMNS) + '\n')
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+            description="Hysteresis indices of the forward and reverse "
+            "curves of the PyPV measurement files")
+    parser.add_argument(
+            'directories', nargs='+', help="directory trees to search")
+    parser.add_argument(
+            '-o', '--output', help="table file, standard output if absent")
+    parser.add_argument(
+            '--write-headers', action='store_true',
+            help="write the indices in the header of the reverse files")
+    parser.add_argument(
+            '--database',
+            help="also write the indices to the results of the reverse "
+            "files in this results database, e.g. %s" %
+            ResultsDatabase.DATABASE_FILE)
+    options = parser.parse_args(arguments)
+
+    fileNames = BatchProcess.findMeasurementFiles(options.directories)
+    rows, errors = analyseFiles(fileNames)
+    for fileName, error in errors:
+        sys.stderr.write("Skipped %s: %s\n" % (fileName, error))
+    sys.stderr.write("%d files, %d pairs, %d errors\n" % (
+            len(fileNames), len(rows), len(errors)))
+
+    if options.write_headers:
+        for row in rows:
+            writeHeader(
+                    row['file'], row['hysteresisIndex'],
+                    row['pceHysteresisIndex'])
+    if options.database:
+        results = ResultsDatabase.ResultsDatabase(options.database)
+        results.updateMany(
+                rows, ('hysteresisIndex', 'pceHysteresisIndex'))
+        results.close()
+    if options.output:
+        with open(options.output, 'w') as f:
+            writeTable(f, rows)
+    else:
+        writeTable(sys.stdout, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,46 +18,196 @@
 
 # -*- coding: utf-8 -*-
 
-from visa import *
-from time import sleep
+from time import sleep, time
+import functools
+import numpy
+
+# formats accepted by :FORM:DATA, binary ones are decoded with these datatypes
+DATA_FORMATS = {'ASCII': None, 'SREAL': 'f', 'DREAL': 'd'}
+
+# status byte bits: event summary (set by *OPC through *ESE 1) and
+# master summary (service request through *SRE 32)
+STB_EVENT_SUMMARY = 32
+STB_MASTER_SUMMARY = 64
+
+# status element bit set when the reading is in compliance
+STATUS_COMPLIANCE = 8
+# points of the source list, the limit of :SOUR:LIST
+MAX_LIST_POINTS = 100
+# current ranges, a range measures up to RANGE_FULL_SCALE times its value
+CURRENT_RANGES = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+RANGE_FULL_SCALE = 1.05
+# usual name of the instrument resource, tried before listing all of them
+GPIB_RESOURCE = "GPIB0::%d::INSTR"
+# statistics of the trace buffer computed by the instrument (:CALC3:FORM)
+STATISTICS = {'mean': 'MEAN', 'std': 'SDEV', 'min': 'MIN', 'max': 'MAX'}
+
+
+class MeasurementAborted(Exception):
+    """ raised when a measurement is cancelled or times out """
+
+
+def forgetsStateOnError(method):
+    """ for the K2400 methods talking to the instrument: after an error
+    (e.g. a VISA timeout or an aborted measurement) the settings the
+    instrument received are not known, so the shadow copy of its
+    configuration is forgotten """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            self.invalidateState()
+            raise
+    return wrapper
 
 
 class K2400():
     """ Keithley 2400 instrument class. """
-    def __init__(self, address=24):
-        rm = ResourceManager()
+    def __init__(self, address=24, dataFormat='ASCII', simulated=False):
+        if dataFormat not in DATA_FORMATS:
+            raise ValueError("Unknown data format %s" % dataFormat)
+        self.dataFormat = dataFormat
+        # completion waiting: sparse polling interval after the predicted
+        # sweep duration, extra time allowed before giving up and an
+        # optional callable returning True when the user asked to stop
+        self.pollInterval = 0.05
+        self.timeoutMargin = 10.0
+        self.cancelCheck = None
+        # shadow copy of the instrument configuration, None when unknown
+        self.state = None
+        if simulated:
+            # no VISA needed, the simulator answers like the instrument
+            import Keithley2400Simulator
+            self.ctrl = Keithley2400Simulator.K2400Simulator()
+            print(self.ctrl.query("*IDN?"))
+            return
+        # imported here, the simulated instrument works without VISA
+        import visa
+        rm = visa.ResourceManager()
         print(rm)
-        ######## in case the resource name is known, it can be set here and the following three lines can be eliminated
-        #instrumentName = str("GPIB0::{0}::INSTR").format(address)
-        rmList = rm.list_resources()
-        print("Available resources: {}".format(rmList))
-        instrumentName = filter(lambda x: 'GPIB' in x and str(address) in x, rmList)[0]
-        ########
+        # opening the usual resource name directly avoids enumerating
+        # all the VISA resources, which is slow on some buses
+        try:
+            instrumentName = GPIB_RESOURCE % address
+            self.ctrl = rm.open_resource(instrumentName)
+        except Exception:
+            rmList = rm.list_resources()
+            print("Available resources: {}".format(rmList))
+            instrumentName = filter(lambda x: 'GPIB' in x and '::%d::' % address in x, rmList)[0]
+            self.ctrl = rm.open_resource(instrumentName)
         print("Using resource: {}".format(instrumentName))
-        self.ctrl = rm.open_resource(instrumentName)
         print(self.ctrl.query("*IDN?"))
 
-    def reset(self):
-        """ resets instrument """
-        self.ctrl.write("*rst; status:preset; *cls")
+    @forgetsStateOnError
+    def reset(self, force=False):
+        """ resets instrument, when the configuration is already known
+        it just switches off the output and clears the status """
+        if force or self.state is None:
+            self.ctrl.write("*rst; status:preset; *cls")
+            self.state = {}
+        else:
+            self.ctrl.write(":OUTP OFF; *CLS")
         self.shutterClose()
 
     def close(self):
         """ closes the VISA instance (I think) """
         self.ctrl.close()
 
-    def waitForMeasurementDone(self):
-        measurementDone = False
-        notPassed = self.ctrl.query(":STAT:OPER:COND?")
-        while not measurementDone:
-            try:
-                query = self.ctrl.query(":STAT:OPER:COND?")
-                if query != notPassed:
-                    measurementDone = True
-            except:
-                sleep(0.1)
-                measurementDone = False
-                print "no measurement done"
+    @forgetsStateOnError
+    def configure(self, settings, commands=()):
+        """ sends in a single transaction the (header, value) settings
+        differing from the shadow copy of the configuration, followed by
+        the commands which have to be sent anyway. The shadow copy is
+        updated once the transaction is written. """
+        changed = []
+        if self.state is None:
+            state = None
+        else:
+            state = dict(self.state)
+        for header, value in settings:
+            if state is not None and state.get(header) == value:
+                continue
+            changed.append("%s %s" % (header, value))
+            if state is not None:
+                # a node and its subnodes (e.g. RANG and RANG:AUTO)
+                # influence each other, forget the related ones
+                for cached in state.keys():
+                    if (
+                            cached.startswith(header + ":") or
+                            header.startswith(cached + ":")):
+                        del state[cached]
+                state[header] = value
+        message = "; ".join(changed + list(commands))
+        if message:
+            self.ctrl.write(message)
+        self.state = state
+
+    def invalidateState(self):
+        """ forgets the configuration, next reset will be a full one """
+        self.state = None
+
+    def formatSettings(self, status=False):
+        """ binary transfers include only voltage and current, plus the
+        status element when requested """
+        if self.dataFormat == 'ASCII':
+            return [
+                    (":FORM:DATA", "ASC"),
+                    (":FORM:ELEM", "VOLT,CURR,RES,TIME,STAT")]
+        if status:
+            elements = "VOLT,CURR,STAT"
+        else:
+            elements = "VOLT,CURR"
+        return [
+                (":FORM:DATA", self.dataFormat),
+                (":FORM:ELEM", elements),
+                (":FORM:BORD", "SWAP")]
+
+    def startMeasurement(self, settings, commands=(), status=False):
+        """ configures and starts a measurement in one transaction, its
+        completion raises a service request through the operation complete
+        bit """
+        settings = (
+                list(settings) + self.formatSettings(status) +
+                [("*ESE", "1"), ("*SRE", "32")])
+        self.configure(
+                settings, list(commands) + [
+                        "*CLS", ":OUTP ON", ":INIT", "*OPC"])
+
+    def isMeasurementDone(self):
+        """ serial polls the status byte, cheaper than a query on GPIB """
+        statusByte = self.ctrl.read_stb()
+        return bool(statusByte & (STB_EVENT_SUMMARY | STB_MASTER_SUMMARY))
+
+    def isCancelled(self):
+        return self.cancelCheck is not None and self.cancelCheck()
+
+    def abortMeasurement(self, reason):
+        self.invalidateState()
+        self.ctrl.write(":ABOR; :OUTP OFF; *CLS")
+        raise MeasurementAborted(reason)
+
+    @forgetsStateOnError
+    def waitForMeasurementDone(self, expectedDuration=0.0, timeout=None):
+        """ sleeps for the expected duration and then polls sparsely until
+        the operation complete is signalled, the timeout (by default the
+        expected duration plus timeoutMargin) expires or the measurement
+        is cancelled """
+        if timeout is None:
+            timeout = expectedDuration + self.timeoutMargin
+        startTime = time()
+        wakeTime = startTime + expectedDuration
+        while time() < wakeTime:
+            if self.isCancelled():
+                self.abortMeasurement("Measurement stopped")
+            sleep(min(self.pollInterval * 4, max(wakeTime - time(), 0)))
+        while not self.isMeasurementDone():
+            if self.isCancelled():
+                self.abortMeasurement("Measurement stopped")
+            if time() - startTime > timeout:
+                self.abortMeasurement(
+                        "Measurement not completed in %g s" % timeout)
+            sleep(self.pollInterval)
 
     def splitData(self, inputData):
         voltage = []
@@ -67,81 +217,344 @@ class K2400():
             current.append(inputData[i*5+1])
         return {'voltage': voltage, 'current': current}
 
-    def measureCurrent(
-            self, numberOfPoints, compliance, setVoltage, integrationTime):
-        self.ctrl.write(":SOUR:VOLT %lf" % setVoltage)
-        self.ctrl.write(":SENS:FUNC 'CURR'")
-        self.ctrl.write(":SENS:CURR:NPLC %lf" % integrationTime)
-        self.ctrl.write(":SENS:CURR:PROT %lf" % compliance)
-        self.ctrl.write(":TRAC:FEED SENS")
-        self.ctrl.write(":TRAC:POIN %d" % numberOfPoints)
-        self.ctrl.write(":TRAC:FEED:CONT NEXT")
-        self.ctrl.write(":TRIG:COUN %d" % numberOfPoints)
-        self.ctrl.write(":OUTP ON")
-        self.ctrl.write(":INIT")
-        self.waitForMeasurementDone()
-        data = self.ctrl.query_ascii_values(":TRACE:DATA?")
-        self.ctrl.write(":OUTP OFF")
-        self.ctrl.write("*RST")
-        data = self.splitData(data)
+    @forgetsStateOnError
+    def readData(self):
+        """ reads the trace buffer as a dict of voltage and current and
+        switches off the output
+
+        In binary mode only voltage and current are transferred and the
+        returned arrays are column views on the decoded buffer. """
+        if self.dataFormat == 'ASCII':
+            data = self.ctrl.query_ascii_values(
+                    ":OUTP OFF; *CLS; :TRACE:DATA?")
+            return self.splitData(data)
+        data = self.ctrl.query_binary_values(
+                ":OUTP OFF; *CLS; :TRACE:DATA?",
+                datatype=DATA_FORMATS[self.dataFormat],
+                is_big_endian=False, container=numpy.array)
+        data = data.reshape(-1, 2)
+        return {'voltage': data[:, 0], 'current': data[:, 1]}
+
+    @forgetsStateOnError
+    def queryValues(self, query):
+        """ values answered to query, in the transfer format """
+        if self.dataFormat == 'ASCII':
+            return self.ctrl.query_ascii_values(query, container=numpy.array)
+        return self.ctrl.query_binary_values(
+                query, datatype=DATA_FORMATS[self.dataFormat],
+                is_big_endian=False, container=numpy.array)
+
+    def readStatistics(self, statistics):
+        """ statistics (names of STATISTICS) of the readings in the trace
+        buffer, computed by the instrument, as a dict of voltage and
+        current dicts, e.g. data['voltage']['mean']; switches off the
+        output. Only the statistics are transferred. """
+        data = {'voltage': {}, 'current': {}}
+        prefix = ":OUTP OFF; *CLS; "
+        for name in statistics:
+            values = self.queryValues(
+                    prefix + ":CALC3:FORM %s; :CALC3:DATA?" % (
+                            STATISTICS[name]))
+            # voltage and current come first in all the element lists
+            data['voltage'][name] = values[0]
+            data['current'][name] = values[1]
+            prefix = ""
         return data
 
+    def fetchReadings(self, query=":FETC?"):
+        """ fetches the last readings, without switching off the output,
+        as a dict of voltage, current and status arrays
+
+        The measurement has to be started with the status element. """
+        if self.dataFormat == 'ASCII':
+            data = self.queryValues(query).reshape(-1, 5)
+            statusColumn = 4
+        else:
+            data = self.queryValues(query).reshape(-1, 3)
+            statusColumn = 2
+        return {
+                'voltage': data[:, 0], 'current': data[:, 1],
+                'status': data[:, statusColumn].astype(int)}
+
+    # the integration time is global to all the sense functions, it is
+    # always set through :SENS:VOLT:NPLC so it has only one cache entry
+
+    def bufferSettings(self, numberOfPoints):
+        return [
+                (":TRAC:FEED", "SENS"),
+                (":TRAC:POIN", "%d" % numberOfPoints),
+                (":TRIG:COUN", "%d" % numberOfPoints)]
+
+    def measureCurrent(
+            self, numberOfPoints, compliance, setVoltage, integrationTime,
+            statistics=None):
+        """ numberOfPoints readings at setVoltage, as readData returns them
+        or, if statistics are given, as readStatistics """
+        settings = [
+                (":SOUR:FUNC", "VOLT"),
+                (":SOUR:VOLT:MODE", "FIX"),
+                (":SOUR:VOLT:LEV", "%lf" % setVoltage),
+                (":SOUR:DEL:AUTO", "ON"),
+                (":SENS:FUNC", "'CURR'"),
+                (":SENS:VOLT:NPLC", "%lf" % integrationTime),
+                (":SENS:CURR:PROT", "%lf" % compliance),
+                (":SENS:CURR:RANG:AUTO", "ON")]
+        self.startMeasurement(
+                settings + self.bufferSettings(numberOfPoints),
+                [":TRAC:FEED:CONT NEXT"])
+        self.waitForMeasurementDone(self.sweepDuration(
+                numberOfPoints, integrationTime, 0))
+        if statistics:
+            return self.readStatistics(statistics)
+        return self.readData()
+
     def measureVoltage(
-            self, numberOfPoints, compliance, setCurrent, integrationTime):
-        self.ctrl.write(":SOUR:FUNC CURR")
-        self.ctrl.write(":SOUR:CURR:MODE FIXED")
-        self.ctrl.write(":SENS:FUNC 'VOLT'")
-        self.ctrl.write(":SENS:VOLT:PROT %lf" % compliance)
-        self.ctrl.write(":SOUR:CURR:RANG MIN")
-        self.ctrl.write(":SOUR:CURR:LEV %lf" % setCurrent)
-        self.ctrl.write(":SENS:VOLT:NPLC %lf" % integrationTime)
-        self.ctrl.write(":TRAC:FEED SENS")
-        self.ctrl.write(":TRAC:POIN %d" % numberOfPoints)
-        self.ctrl.write(":TRAC:FEED:CONT NEXT")
-        self.ctrl.write(":TRIG:COUN %d" % numberOfPoints)
-        self.ctrl.write(":OUTP ON")
-        self.ctrl.write(":INIT")
-        self.waitForMeasurementDone()
-        data = self.ctrl.query_ascii_values(":TRACE:DATA?")
-        self.ctrl.write(":OUTP OFF")
-        self.ctrl.write("*RST")
-        data = self.splitData(data)
-        return data
+            self, numberOfPoints, compliance, setCurrent, integrationTime,
+            statistics=None):
+        """ numberOfPoints readings at setCurrent, as readData returns them
+        or, if statistics are given, as readStatistics """
+        settings = [
+                (":SOUR:FUNC", "CURR"),
+                (":SOUR:CURR:MODE", "FIX"),
+                (":SOUR:DEL:AUTO", "ON"),
+                (":SENS:FUNC", "'VOLT'"),
+                (":SENS:VOLT:PROT", "%lf" % compliance),
+                (":SOUR:CURR:RANG", "MIN"),
+                (":SOUR:CURR:LEV", "%lf" % setCurrent),
+                (":SENS:VOLT:NPLC", "%lf" % integrationTime)]
+        self.startMeasurement(
+                settings + self.bufferSettings(numberOfPoints),
+                [":TRAC:FEED:CONT NEXT"])
+        self.waitForMeasurementDone(self.sweepDuration(
+                numberOfPoints, integrationTime, 0))
+        if statistics:
+            return self.readStatistics(statistics)
+        return self.readData()
 
     def measureIV(
             self, startVoltage, endVoltage, step, compliance, scaleValue,
             integrationTime, delayTime):
-        self.ctrl.write(":SENS:FUNC \"CURR\"")
-        self.ctrl.write(":SENS:CURR:PROT %lf" % compliance)
+        settings = [
+                (":SENS:FUNC", "'CURR'"),
+                (":SENS:CURR:PROT", "%lf" % compliance)]
         if scaleValue:
-            self.ctrl.write(":SENS:CURR:RANG %lf" % scaleValue)
+            settings.append((":SENS:CURR:RANG", "%lf" % scaleValue))
         else:
-            self.ctrl.write(":SENS:CURR:RANG:AUTO ON")
-        self.ctrl.write(":SOUR:FUNC VOLT")
-        self.ctrl.write(":SOUR:VOLT:START %lf" % startVoltage)
-        self.ctrl.write(":SOUR:VOLT:STOP %lf" % endVoltage)
-        self.ctrl.write(":SOUR:VOLT:STEP %lf" % step)
-        self.ctrl.write(":SOUR:VOLT:MODE SWE")
-        self.ctrl.write(":SENS:VOLT:NPLC %lf" % integrationTime)
-        self.ctrl.write(":TRAC:FEED SENS")
-        self.ctrl.write(":TRAC:POIN %d" % (
-                int(abs((startVoltage-endVoltage)/step)+1)))
-        self.ctrl.write(":TRAC:FEED:CONT NEXT")
-        self.ctrl.write(":TRIG:COUN %d" % (
-                int(abs((startVoltage-endVoltage)/step)+1)))
-        self.ctrl.write(":SOUR:DEL %lf" % delayTime)
-        self.ctrl.write(":OUTP ON")
-        self.ctrl.write(":INIT")
-
-        self.waitForMeasurementDone()
-
-        data = self.ctrl.query_ascii_values(":TRACE:DATA?")
-        self.ctrl.write(":OUTP OFF")
-        self.ctrl.write("*RST")
-        data = self.splitData(data)
+            settings.append((":SENS:CURR:RANG:AUTO", "ON"))
+        settings += [
+                (":SOUR:FUNC", "VOLT"),
+                (":SOUR:VOLT:START", "%lf" % startVoltage),
+                (":SOUR:VOLT:STOP", "%lf" % endVoltage),
+                (":SOUR:VOLT:STEP", "%lf" % step),
+                (":SOUR:VOLT:MODE", "SWE"),
+                (":SENS:VOLT:NPLC", "%lf" % integrationTime),
+                (":SOUR:DEL", "%lf" % delayTime)]
+        numberOfPoints = int(abs((startVoltage-endVoltage)/step)+1)
+        self.startMeasurement(
+                settings + self.bufferSettings(numberOfPoints),
+                [":TRAC:FEED:CONT NEXT"])
+
+        self.waitForMeasurementDone(self.sweepDuration(
+                numberOfPoints, integrationTime, delayTime))
+
+        data = self.readData()
         self.beep()
         return data
 
+    @staticmethod
+    def sweepVoltages(startVoltage, endVoltage, step):
+        """ the voltages of a linear sweep """
+        numberOfPoints = int(abs((startVoltage-endVoltage)/step)+1)
+        if endVoltage < startVoltage:
+            step = - abs(step)
+        else:
+            step = abs(step)
+        return startVoltage + step * numpy.arange(numberOfPoints)
+
+    def streamIV(
+            self, startVoltage, endVoltage, step, compliance, scaleValue,
+            integrationTime, delayTime, chunkPoints=20,
+            abortOnCompliance=0):
+        """ sweeps like measureIV, generating the readings while the sweep
+        runs as dicts of voltage, current and status arrays, see
+        streamList """
+        return self.streamList(
+                self.sweepVoltages(startVoltage, endVoltage, step),
+                compliance, scaleValue, integrationTime, delayTime,
+                chunkPoints, abortOnCompliance)
+
+    def measureListIV(
+            self, voltages, compliance, scaleValue, integrationTime,
+            delayTime, ranges=None, beep=True):
+        """ measures the current at the given voltages, in their order,
+        returns a dict of voltage, current and range arrays (see
+        streamList) """
+        readings = list(self.streamList(
+                voltages, compliance, scaleValue, integrationTime,
+                delayTime, MAX_LIST_POINTS, ranges=ranges, beep=beep))
+        return {
+                'voltage': numpy.concatenate(
+                        [r['voltage'] for r in readings]),
+                'current': numpy.concatenate(
+                        [r['current'] for r in readings]),
+                'range': numpy.concatenate(
+                        [r['range'] for r in readings])}
+
+    def measureChunk(self, settings, voltages, integrationTime, delayTime):
+        self.startMeasurement(settings + [
+                (":SOUR:LIST:VOLT", ",".join("%lf" % v for v in voltages)),
+                (":TRIG:COUN", "%d" % len(voltages))], status=True)
+        self.waitForMeasurementDone(self.sweepDuration(
+                len(voltages), integrationTime, delayTime))
+        return self.fetchReadings()
+
+    def streamList(
+            self, voltages, compliance, scaleValue, integrationTime,
+            delayTime, chunkPoints=20, abortOnCompliance=0, ranges=None,
+            beep=True):
+        """ measures the current at the given voltages, generating the
+        readings while the sweep runs as dicts of voltage, current, status
+        and range (0 for autorange) arrays
+
+        The voltages are sourced as a list of at most chunkPoints voltages
+        at a time (limited to MAX_LIST_POINTS), each chunk is fetched as
+        soon as it is completed. With abortOnCompliance the sweep is
+        aborted, and MeasurementAborted raised, when that many consecutive
+        readings are in compliance, as for a shorted cell.
+
+        ranges gives a fixed current range for each voltage, overriding
+        scaleValue; a chunk overflowing its range, or limited by it below
+        the compliance, is measured again with autorange. """
+        numberOfPoints = len(voltages)
+        chunkPoints = max(1, min(chunkPoints, MAX_LIST_POINTS))
+        settings = [
+                (":SENS:FUNC", "'CURR'"),
+                (":SENS:CURR:PROT", "%lf" % compliance),
+                (":SOUR:FUNC", "VOLT"),
+                (":SOUR:VOLT:MODE", "LIST"),
+                (":SENS:VOLT:NPLC", "%lf" % integrationTime),
+                (":SOUR:DEL", "%lf" % delayTime)]
+        autoRange = [(":SENS:CURR:RANG:AUTO", "ON")]
+        checkRanges = ranges is not None
+        if ranges is None:
+            ranges = numpy.ones(numberOfPoints) * (scaleValue or 0)
+        # chunks end where the range changes
+        bounds = set(range(0, numberOfPoints, chunkPoints))
+        bounds.update(numpy.flatnonzero(numpy.diff(ranges)) + 1)
+        bounds = sorted(bounds) + [numberOfPoints]
+
+        inCompliance = 0
+        try:
+            for first, stop in zip(bounds[:-1], bounds[1:]):
+                chunk = voltages[first:stop]
+                currentRange = ranges[first]
+                if currentRange:
+                    rangeSettings = [(":SENS:CURR:RANG", "%lf" % currentRange)]
+                else:
+                    rangeSettings = autoRange
+                readings = self.measureChunk(
+                        settings + rangeSettings, chunk, integrationTime,
+                        delayTime)
+                if checkRanges and currentRange and \
+                        currentRange < compliance:
+                    limited = (
+                            (readings['status'] & STATUS_COMPLIANCE) != 0) | (
+                            abs(readings['current']) >
+                            RANGE_FULL_SCALE * currentRange)
+                    if limited.any():
+                        # predicted range too low
+                        currentRange = 0
+                        readings = self.measureChunk(
+                                settings + autoRange, chunk,
+                                integrationTime, delayTime)
+                readings['range'] = numpy.ones(len(chunk)) * currentRange
+                limited = (readings['status'] & STATUS_COMPLIANCE) != 0
+                for isLimited in limited:
+                    inCompliance = inCompliance + 1 if isLimited else 0
+                    if abortOnCompliance and \
+                            inCompliance >= abortOnCompliance:
+                        break
+                yield readings
+                if abortOnCompliance and inCompliance >= abortOnCompliance:
+                    self.abortMeasurement(
+                            "Compliance reached on %d consecutive points" %
+                            abortOnCompliance)
+        except GeneratorExit:
+            self.invalidateState()
+            self.ctrl.write(":ABOR; :OUTP OFF; *CLS")
+            raise
+        self.ctrl.write(":OUTP OFF; *CLS")
+        if beep:
+            self.beep()
+
+    def startBias(
+            self, voltage, compliance, scaleValue, integrationTime,
+            delayTime):
+        """ switches on the output at voltage, the readings are then taken
+        by readBias without configuring again the instrument """
+        settings = [
+                (":SENS:FUNC", "'CURR'"),
+                (":SENS:CURR:PROT", "%lf" % compliance)]
+        if scaleValue:
+            settings.append((":SENS:CURR:RANG", "%lf" % scaleValue))
+        else:
+            settings.append((":SENS:CURR:RANG:AUTO", "ON"))
+        settings += [
+                (":SOUR:FUNC", "VOLT"),
+                (":SOUR:VOLT:MODE", "FIX"),
+                (":SOUR:VOLT:LEV", "%lf" % voltage),
+                (":SENS:VOLT:NPLC", "%lf" % integrationTime),
+                (":SOUR:DEL", "%lf" % delayTime),
+                (":TRIG:COUN", "1")]
+        self.configure(
+                settings + self.formatSettings(status=True),
+                ["*CLS", ":OUTP ON"])
+
+    def readBias(self, voltage):
+        """ sources voltage and reads it back with the current, in a single
+        transaction, as a dict of one point voltage, current and status
+        arrays """
+        level = "%lf" % voltage
+        readings = self.fetchReadings(":SOUR:VOLT:LEV %s; :READ?" % level)
+        if self.state is not None:
+            self.state[":SOUR:VOLT:LEV"] = level
+        return readings
+
+    def stopBias(self):
+        self.ctrl.write(":OUTP OFF; *CLS")
+
+    def startVoltageMonitor(self, compliance, integrationTime, averageCount):
+        """ switches on the output at zero current, each reading of
+        readVoltageMonitor is then the mean of averageCount conversions
+        made by the repeating filter of the instrument """
+        settings = [
+                (":SOUR:FUNC", "CURR"),
+                (":SOUR:CURR:MODE", "FIX"),
+                (":SOUR:DEL:AUTO", "ON"),
+                (":SENS:FUNC", "'VOLT'"),
+                (":SENS:VOLT:PROT", "%lf" % compliance),
+                (":SOUR:CURR:RANG", "MIN"),
+                (":SOUR:CURR:LEV", "%lf" % 0),
+                (":SENS:VOLT:NPLC", "%lf" % integrationTime),
+                (":SENS:AVER:TCON", "REP"),
+                (":SENS:AVER:COUN", "%d" % max(averageCount, 1)),
+                (":SENS:AVER:STAT", "ON" if averageCount > 1 else "OFF"),
+                (":TRIG:COUN", "1")]
+        self.configure(
+                settings + self.formatSettings(status=True),
+                ["*CLS", ":OUTP ON"])
+
+    def readVoltageMonitor(self):
+        """ one averaged reading, as a dict of one point voltage, current
+        and status arrays """
+        return self.fetchReadings(":READ?")
+
+    def stopVoltageMonitor(self):
+        """ switches off the output and the filter, which would otherwise
+        slow down the other measurements """
+        self.configure(
+                [(":SENS:AVER:STAT", "OFF")], [":OUTP OFF", "*CLS"])
+
     def beep(self):
         self.ctrl.write(":SYST:BEEP 2000, 0.1")
 
@@ -149,12 +562,14 @@ class K2400():
         self.ctrl.write(":SYST:BEEP 1800, 0.2")
 
     def text(self, text):
-        self.ctrl.write(":DISP:WIND:TEXT:DATA \'%s\'" % str(text)[:20])
-        self.ctrl.write(":DISP:WIND:TEXT:STAT ON")
+        self.ctrl.write(
+                ":DISP:WIND:TEXT:DATA \'%s\'; :DISP:WIND:TEXT:STAT ON" %
+                str(text)[:20])
 
     def subtext(self, text):
-        self.ctrl.write(":DISP:WIND2:TEXT:DATA \'%s\'" % str(text)[:32])
-        self.ctrl.write(":DISP:WIND2:TEXT:STAT ON")
+        self.ctrl.write(
+                ":DISP:WIND2:TEXT:DATA \'%s\'; :DISP:WIND2:TEXT:STAT ON" %
+                str(text)[:32])
 
     def removetext(self):
         self.ctrl.write(":DISP:WIND:TEXT:STAT OFF")
@@ -164,6 +579,8 @@ class K2400():
 
     def setlocal(self):
         self.ctrl.write(":SYST:LOC")
+        # settings can be changed from the front panel while in local
+        self.invalidateState()
 
     def shutterClose(self):
         self.ctrl.write(":SOURCE2:TTL 0")
@@ -171,6 +588,14 @@ class K2400():
     def shutterOpen(self):
         self.ctrl.write(":SOURCE2:TTL 15")
 
-    def scanSpeed(self, stepV, integrationTime, delayTime):
-        scanSpeed = stepV / (0.003 + delayTime + integrationTime * 0.06)
+    @staticmethod
+    def pointTime(integrationTime, delayTime):
+        return 0.003 + delayTime + integrationTime * 0.06
+
+    @staticmethod
+    def scanSpeed(stepV, integrationTime, delayTime):
+        scanSpeed = stepV / K2400.pointTime(integrationTime, delayTime)
         return scanSpeed
+
+    def sweepDuration(self, numberOfPoints, integrationTime, delayTime):
+        return numberOfPoints * self.pointTime(integrationTime, delayTime)
@@ -0,0 +1,437 @@
+# Simulated Keithley 2400 for PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# -*- coding: utf-8 -*-
+
+from time import sleep, time
+import numpy
+
+BOLTZMANN_OVER_CHARGE = 8.617333e-5
+# value returned by the instrument for an over range reading
+OVERFLOW = 9.9e37
+NOT_A_NUMBER = 9.91e37
+CURRENT_RANGES = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+VOLTAGE_RANGES = (0.2, 2.0, 20.0, 200.0)
+# status element bit set when the reading is in compliance
+STATUS_COMPLIANCE = 8
+ELEMENTS = ('VOLT', 'CURR', 'RES', 'TIME', 'STAT')
+
+
+class DiodeModel():
+    """ Single diode model of a solar cell, currents in A flowing into the
+    device (the sign the Keithley measures), so the photocurrent is
+    negative at short circuit. """
+    def __init__(
+            self, photoCurrent=2e-3, saturationCurrent=1e-11,
+            idealityFactor=1.6, seriesResistance=10.0,
+            shuntResistance=2e4, temperature=298.15):
+        self.photoCurrent = photoCurrent
+        self.saturationCurrent = saturationCurrent
+        self.idealityFactor = idealityFactor
+        self.seriesResistance = seriesResistance
+        self.shuntResistance = shuntResistance
+        self.temperature = temperature
+
+    def current(self, voltage, illuminated=True):
+        """ solves the implicit diode equation with Newton iterations """
+        voltage = numpy.asarray(voltage, dtype=float)
+        nVt = (self.idealityFactor * BOLTZMANN_OVER_CHARGE *
+               self.temperature)
+        photoCurrent = self.photoCurrent if illuminated else 0.0
+        rs = self.seriesResistance
+        current = numpy.zeros_like(voltage)
+        for i in range(100):
+            junction = numpy.minimum((voltage - current * rs) / nVt, 200)
+            diode = self.saturationCurrent * numpy.expm1(junction)
+            residual = (
+                    diode + (voltage - current * rs) / self.shuntResistance -
+                    photoCurrent - current)
+            derivative = (
+                    - self.saturationCurrent * numpy.exp(junction) * rs / nVt -
+                    rs / self.shuntResistance - 1)
+            step = residual / derivative
+            current = current - step
+            if numpy.all(abs(step) < 1e-15):
+                break
+        return current
+
+    def voltage(self, current, illuminated=True):
+        """ voltage at a forced current, by bisection on current() """
+        low, high = -5.0, 5.0
+        for i in range(60):
+            middle = (low + high) / 2
+            if self.current(middle, illuminated) > current:
+                high = middle
+            else:
+                low = middle
+        return (low + high) / 2
+
+
+def shortMnemonic(mnemonic):
+    """ SCPI short form of a header node, e.g. SOURCE2 -> SOUR2 """
+    mnemonic = mnemonic.upper()
+    query = ''
+    if mnemonic.endswith('?'):
+        query = '?'
+        mnemonic = mnemonic[:-1]
+    suffix = ''
+    while mnemonic and mnemonic[-1].isdigit():
+        suffix = mnemonic[-1] + suffix
+        mnemonic = mnemonic[:-1]
+    if len(mnemonic) > 4:
+        if mnemonic[3] in 'AEIOU':
+            mnemonic = mnemonic[:3]
+        else:
+            mnemonic = mnemonic[:4]
+    return mnemonic + suffix + query
+
+
+def parseCommand(command):
+    """ splits a command into its short form header and parameter """
+    command = command.strip()
+    if ' ' in command:
+        header, parameter = command.split(' ', 1)
+    else:
+        header, parameter = command, ''
+    if header.startswith('*'):
+        return header.upper(), parameter.strip()
+    nodes = [shortMnemonic(n) for n in header.strip(':').split(':')]
+    return ':'.join(nodes), parameter.strip().strip('\'"')
+
+
+class K2400Simulator():
+    """ Stand-in for the VISA resource of a Keithley 2400, implementing
+    the subset of SCPI used by Keithley2400.K2400.
+
+    The connected device is a DiodeModel, illuminated when the shutter
+    TTL line is high. Readings get gaussian noise and are clipped at the
+    compliance. With realTime each reading takes the time of the latency
+    model (NPLC with autozero, source delay and the fixed per point
+    overhead of K2400.scanSpeed) and every bus transaction takes
+    busLatency, otherwise sweeps complete instantly. """
+    def __init__(
+            self, model=None, noise=2e-7, realTime=True, busLatency=0.001,
+            lineFrequency=50.0, pointOverhead=0.003):
+        if model is None:
+            model = DiodeModel()
+        self.model = model
+        self.noise = noise
+        self.realTime = realTime
+        self.busLatency = busLatency
+        self.lineFrequency = lineFrequency
+        self.pointOverhead = pointOverhead
+        self.random = numpy.random.RandomState()
+        self.displayText = ''
+        self.displaySubtext = ''
+        self.shutterLevel = 0
+        self.beeps = []
+        self.reset()
+
+    def reset(self):
+        self.settings = {
+                'SOUR:FUNC': 'VOLT', 'SOUR:VOLT:MODE': 'FIX',
+                'SOUR:CURR:MODE': 'FIX', 'SOUR:VOLT': '0',
+                'SOUR:CURR:LEV': '0', 'SOUR:DEL': '0',
+                'SENS:FUNC': 'CURR', 'SENS:CURR:PROT': '0.000105',
+                'SENS:VOLT:PROT': '21', 'SENS:CURR:RANG:AUTO': 'ON',
+                'SENS:CURR:NPLC': '1', 'TRAC:POIN': '100',
+                'TRIG:COUN': '1', 'FORM:DATA': 'ASC',
+                'FORM:ELEM': 'VOLT,CURR,RES,TIME,STAT', 'FORM:BORD': 'NORM'}
+        self.output = False
+        self.feedNext = False
+        self.buffer = numpy.zeros((0, 5))
+        self.lastReadings = numpy.zeros((0, 5))
+        self.sweepStart = 0.0
+        self.pointTime = 0.0
+        self.sweepDuration = 0.0
+        self.operationComplete = False
+        self.opcPending = False
+        self.eventEnable = 0
+        self.serviceEnable = 0
+        self.startTime = time()
+
+    # latency model
+
+    def transaction(self, size=0):
+        if self.realTime:
+            sleep(self.busLatency + size * 1e-6)
+
+    def now(self):
+        return time()
+
+    def nplc(self):
+        for key in ('SENS:CURR:NPLC', 'SENS:VOLT:NPLC', 'SENS:RES:NPLC'):
+            if key in self.settings:
+                return float(self.settings[key])
+        return 1.0
+
+    def averageCount(self):
+        """ conversions averaged in a reading by the repeating filter """
+        if self.settings.get('SENS:AVER:STAT', 'OFF') not in ('ON', '1'):
+            return 1
+        return int(self.settings.get('SENS:AVER:COUN', '10'))
+
+    def readingTime(self):
+        # three A/D conversions per reading with autozero on
+        integration = 3 * self.nplc() / self.lineFrequency
+        return (
+                self.pointOverhead + float(self.settings['SOUR:DEL']) +
+                integration * self.averageCount())
+
+    def pointsDone(self):
+        if not self.realTime or not self.pointTime:
+            return len(self.buffer)
+        done = int((self.now() - self.sweepStart) / self.pointTime)
+        return min(done, len(self.buffer))
+
+    def isSweeping(self):
+        # the trigger model is running whether or not the buffer is fed
+        if not self.realTime or not self.pointTime:
+            return False
+        return self.now() < self.sweepStart + self.sweepDuration
+
+    # sourcing and measuring
+
+    def sourceValues(self, count):
+        function = self.settings['SOUR:FUNC']
+        mode = self.settings['SOUR:%s:MODE' % function]
+        if mode.startswith('SWE'):
+            start = float(self.settings['SOUR:%s:STAR' % function])
+            stop = float(self.settings['SOUR:%s:STOP' % function])
+            step = float(self.settings['SOUR:%s:STEP' % function])
+            if stop < start:
+                step = - abs(step)
+            else:
+                step = abs(step)
+            return start + step * numpy.arange(count)
+        if mode.startswith('LIST'):
+            values = numpy.array([
+                    float(v) for v in
+                    self.settings['SOUR:LIST:%s' % function].split(',')])
+            return numpy.resize(values, count)
+        if function == 'VOLT':
+            level = self.settings['SOUR:VOLT']
+        else:
+            level = self.settings['SOUR:CURR:LEV']
+        return numpy.ones(count) * float(level)
+
+    def currentRange(self):
+        if self.settings['SENS:CURR:RANG:AUTO'] == 'ON':
+            return None
+        return float(self.settings.get('SENS:CURR:RANG', 1.0))
+
+    def acquire(self, count):
+        """ readings as rows of voltage, current, resistance, time and
+        status, for the next count points of the source sequence """
+        illuminated = self.shutterLevel != 0
+        source = self.sourceValues(count)
+        status = numpy.zeros(count)
+        noise = self.noise / numpy.sqrt(self.averageCount())
+        if self.settings['SOUR:FUNC'] == 'VOLT':
+            voltage = source
+            current = self.model.current(voltage, illuminated)
+            current = current + noise * self.random.randn(count)
+            compliance = float(self.settings['SENS:CURR:PROT'])
+            inCompliance = abs(current) >= compliance
+            current = numpy.clip(current, -compliance, compliance)
+            status[inCompliance] = STATUS_COMPLIANCE
+            currentRange = self.currentRange()
+            if currentRange is not None:
+                current[abs(current) > 1.05 * currentRange] = OVERFLOW
+        else:
+            current = source
+            voltage = numpy.array([
+                    self.model.voltage(i, illuminated) for i in current])
+            voltage = voltage + noise * self.random.randn(count)
+            compliance = float(self.settings['SENS:VOLT:PROT'])
+            inCompliance = abs(voltage) >= compliance
+            voltage = numpy.clip(voltage, -compliance, compliance)
+            status[inCompliance] = STATUS_COMPLIANCE
+        timestamp = (
+                self.now() - self.startTime +
+                self.readingTime() * numpy.arange(1, count + 1))
+        resistance = numpy.ones(count) * NOT_A_NUMBER
+        return numpy.column_stack(
+                (voltage, current, resistance, timestamp, status))
+
+    def initiate(self):
+        if not self.output:
+            return
+        count = int(self.settings['TRIG:COUN'])
+        readings = self.acquire(count)
+        if self.feedNext:
+            self.buffer = readings[:int(self.settings['TRAC:POIN'])]
+            self.feedNext = False
+        self.lastReadings = readings
+        self.sweepStart = self.now()
+        self.pointTime = self.readingTime()
+        self.sweepDuration = self.pointTime * count
+
+    def waitSweep(self):
+        if self.realTime and self.pointTime:
+            remaining = self.sweepStart + self.sweepDuration - self.now()
+            if remaining > 0:
+                sleep(remaining)
+
+    def bufferStatistic(self):
+        """ the :CALC3:FORM statistic of each element of the buffer, as a
+        single reading """
+        form = self.settings.get('CALC3:FORM', 'MEAN')
+        buffer = self.buffer[:self.pointsDone()]
+        if not len(buffer):
+            return numpy.ones((1, 5)) * NOT_A_NUMBER
+        if form == 'SDEV':
+            statistic = buffer.std(axis=0, ddof=1)
+        elif form == 'PKPK':
+            statistic = buffer.max(axis=0) - buffer.min(axis=0)
+        else:
+            statistic = getattr(buffer, form.lower())(axis=0)
+        return statistic[numpy.newaxis]
+
+    def formatReadings(self, readings):
+        columns = [
+                ELEMENTS.index(e) for e in
+                self.settings['FORM:ELEM'].split(',')]
+        return readings[:, columns].ravel()
+
+    # VISA resource interface
+
+    def write(self, message):
+        self.transaction(len(message))
+        for command in message.split(';'):
+            if command.strip():
+                self.execute(*parseCommand(command))
+
+    def execute(self, header, parameter):
+        if header == '*RST':
+            self.reset()
+        elif header == '*CLS':
+            self.operationComplete = False
+        elif header == '*ESE':
+            self.eventEnable = int(parameter)
+        elif header == '*SRE':
+            self.serviceEnable = int(parameter)
+        elif header == '*OPC':
+            self.opcPending = True
+        elif header in ('STAT:PRES', 'SYST:LOC', 'ABOR'):
+            if header == 'ABOR':
+                self.buffer = self.buffer[:self.pointsDone()]
+                self.pointTime = 0.0
+        elif header == 'OUTP':
+            self.output = parameter.upper() in ('ON', '1')
+        elif header == 'INIT':
+            self.initiate()
+        elif header == 'TRAC:FEED:CONT':
+            self.feedNext = parameter.upper().startswith('NEXT')
+        elif header == 'TRAC:CLE':
+            self.buffer = numpy.zeros((0, 5))
+        elif header == 'SOUR2:TTL':
+            self.shutterLevel = int(parameter)
+        elif header == 'SYST:BEEP':
+            self.beeps.append(parameter)
+        elif header == 'DISP:WIND:TEXT:DATA':
+            self.displayText = parameter
+        elif header == 'DISP:WIND2:TEXT:DATA':
+            self.displaySubtext = parameter
+        elif header.startswith('DISP:'):
+            pass
+        else:
+            self.setSetting(header, parameter)
+
+    def setSetting(self, header, parameter):
+        if header in ('SENS:VOLT:NPLC', 'SENS:CURR:NPLC'):
+            # the integration time is shared by all the functions
+            self.settings['SENS:CURR:NPLC'] = parameter
+            self.settings['SENS:VOLT:NPLC'] = parameter
+            return
+        if header == 'SENS:CURR:RANG':
+            self.settings['SENS:CURR:RANG:AUTO'] = 'OFF'
+        if header == 'SOUR:VOLT:LEV':
+            header = 'SOUR:VOLT'
+        self.settings[header] = parameter.upper()
+
+    def readStatusByte(self):
+        if self.opcPending and not self.isSweeping():
+            self.opcPending = False
+            self.operationComplete = True
+        statusByte = 0
+        if self.operationComplete and self.eventEnable & 1:
+            statusByte |= 32
+        if statusByte & self.serviceEnable:
+            statusByte |= 64
+        return statusByte
+
+    def read_stb(self):
+        self.transaction()
+        return self.readStatusByte()
+
+    def answer(self, header):
+        if header == '*IDN?':
+            return ["KEITHLEY INSTRUMENTS INC.,MODEL 2400,SIMULATED,C32"]
+        if header == '*OPC?':
+            self.waitSweep()
+            return [1]
+        if header == '*STB?':
+            return [self.readStatusByte()]
+        if header == 'STAT:OPER:COND?':
+            # bit 10 reports the idle state of the trigger model
+            return [0 if self.isSweeping() else 1024]
+        if header == 'TRAC:POIN:ACT?':
+            return [self.pointsDone()]
+        if header == 'TRAC:DATA?':
+            self.waitSweep()
+            return list(self.formatReadings(self.buffer))
+        if header == 'READ?':
+            self.initiate()
+            self.waitSweep()
+            return list(self.formatReadings(self.lastReadings))
+        if header == 'FETC?':
+            return list(self.formatReadings(self.lastReadings))
+        if header == 'CALC3:DATA?':
+            self.waitSweep()
+            return list(self.formatReadings(self.bufferStatistic()))
+        raise ValueError("Simulated Keithley can't answer %s" % header)
+
+    def queryValues(self, message):
+        commands = [c for c in message.split(';') if c.strip()]
+        for command in commands[:-1]:
+            self.execute(*parseCommand(command))
+        return self.answer(parseCommand(commands[-1])[0])
+
+    def query(self, message):
+        self.transaction(len(message))
+        values = self.queryValues(message)
+        answer = ','.join(str(v) for v in values)
+        self.transaction(len(answer))
+        return answer
+
+    def query_ascii_values(self, message, container=list):
+        values = [float(v) for v in self.query(message).split(',')]
+        return container(values)
+
+    def query_binary_values(
+            self, message, datatype='f', is_big_endian=False,
+            container=list):
+        self.transaction(len(message))
+        values = numpy.array(self.queryValues(message), dtype=datatype)
+        self.transaction(values.nbytes)
+        if container is numpy.array:
+            return values
+        return container(values)
+
+    def close(self):
+        self.output = False
@@ -0,0 +1,150 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Reader of the text files saved by PyPV: a header of "Key:<tab>value"
+# lines (some with more pairs on the same line, older files with a space
+# instead of the tab) ending with the "Voltage_V <tab>Current_mA" line,
+# followed by the voltage and current columns.
+
+from numpy import *
+import re
+
+# header keys as written by MainWindow.makeHeader, and by older versions,
+# with the names used for them in the metadata
+HEADER_KEYS = {
+        'User': 'user',
+        'Date': 'date',
+        'Time': 'time',
+        'Experiment': 'experiment',
+        'Device': 'device',
+        'Diode': 'diode',
+        'Forward or reverse': 'direction',
+        'Lowest Voltage (V)': 'minVoltage',
+        'Highest Voltage (V)': 'maxVoltage',
+        'Voltage Step (V)': 'stepV',
+        'Compliance (A)': 'compliance',
+        'Scale (A)': 'scale',
+        'Current Ranges': 'currentRanges',
+        'Voltage of maximum power point (V)': 'voltageMaxPower',
+        'Current density of MPP (mA/cm2)': 'currentMaxPowerDensity',
+        'Integration Time': 'integrationTime',
+        'Scan Speed (V/s)': 'scanSpeed',
+        'Delay Time (s)': 'delayTime',
+        'ShutterDelayOff (s)': 'preDelayOff',
+        'ShutterDelayOn (s)': 'preDelayOn',
+        'Pre Delay Time (s)': 'preDelay',
+        'Serie Resistance (Ohm)': 'seriesResistance',
+        'Parallel Resistance (Ohm)': 'parallelResistance',
+        'Diode Fit Rs (Ohm)': 'fitSeriesResistance',
+        'Rsh (Ohm)': 'fitShuntResistance',
+        'Ideality Factor': 'idealityFactor',
+        'I0 (A)': 'saturationCurrent',
+        'Cell Area (cm2)': 'cellArea',
+        'Irradiance (mW/cm2)': 'irradiance',
+        'Jsc (mA/cm2)': 'jscDensity',
+        'Voc (V)': 'voc',
+        'Fill factor': 'ff',
+        'Efficiency (%)': 'efficiency',
+        'Hysteresis Index': 'hysteresisIndex',
+        'PCE Hysteresis Index': 'pceHysteresisIndex'}
+# values kept as text, the other ones are converted to numbers if possible
+TEXT_KEYS = (
+        'user', 'date', 'time', 'experiment', 'device', 'diode',
+        'direction', 'currentRanges')
+DATA_HEADER = b'Voltage_V'
+# the current column is in mA
+CURRENT_UNIT = 1e-3
+
+SEPARATORS = re.compile(r'\t| {2,}')
+PAIR = re.compile(r'^(.*?[:?])\s*(.*)$')
+
+
+def convertValue(key, value):
+    if key in TEXT_KEYS:
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        if value in ('False', 'None'):
+            return None
+        return value
+
+
+def parseHeader(lines):
+    """ metadata dict from the header lines, unknown keys are kept as
+    they are written """
+    metadata = {}
+    for line in lines:
+        key = None
+        for token in SEPARATORS.split(line.strip()):
+            token = token.strip()
+            if not token:
+                continue
+            if key is not None:
+                metadata[key] = token
+                key = None
+                continue
+            match = PAIR.match(token)
+            if match is None:
+                continue
+            name = match.group(1)[:-1].strip()
+            key = HEADER_KEYS.get(name, name)
+            if match.group(2):
+                metadata[key] = match.group(2).strip()
+                key = None
+    return dict(
+            (key, convertValue(key, value))
+            for key, value in metadata.items())
+
+
+def splitContent(content):
+    """ header lines and data block of a file content """
+    position = content.find(b'\n' + DATA_HEADER)
+    if position < 0:
+        raise ValueError("Not a PyPV measurement file")
+    dataStart = content.find(b'\n', position + 1)
+    if dataStart < 0:
+        dataStart = len(content)
+    header = content[:dataStart].decode('latin-1').splitlines()
+    return header, content[dataStart:]
+
+
+def parseData(block):
+    """ voltage and current (in A) arrays of the data block, parsed in a
+    single pass """
+    values = fromstring(block, sep=' ')
+    if len(values) % 2:
+        raise ValueError("Odd number of values in the data block")
+    values = values.reshape(-1, 2)
+    return values[:, 0], values[:, 1] * CURRENT_UNIT
+
+
+def readMeasurement(fileName):
+    """ reads a PyPV measurement file, returns its metadata and the
+    voltage and current arrays """
+    with open(fileName, 'rb') as f:
+        content = f.read()
+    header, block = splitContent(content)
+    voltage, current = parseData(block)
+    return parseHeader(header), voltage, current
+
+
+def isMeasurementFile(fileName):
+    """ quick check of the first bytes of a file """
+    with open(fileName, 'rb') as f:
+        start = f.read(200)
+    return b'PyPV software' in start
@@ -0,0 +1,359 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from numpy import *
+import threading
+import time
+
+import Keithley2400
+import CurrentRanging
+import MppTracking
+import TimeSeries
+import VICurves
+
+# adaptive sweeps: the points are stepV apart within ADAPTIVE_HALF_WIDTH
+# (V, at least three steps) of the expected MPP and Voc and
+# ADAPTIVE_COARSE_FACTOR times stepV apart elsewhere. Without a previous
+# curve the Voc is measured quickly and the MPP voltage is expected at
+# EXPECTED_MPP_RATIO times the Voc.
+ADAPTIVE_HALF_WIDTH = 0.06
+ADAPTIVE_COARSE_FACTOR = 4
+EXPECTED_MPP_RATIO = 0.8
+# Voc monitor: readings kept for the rolling trace and s between two
+# updates of the display
+MONITOR_POINTS = 600
+MONITOR_INTERVAL = 0.1
+
+
+class MeasurementJobs():
+    """ The sequences of instrument operations run as jobs, free from Qt so
+    that they can also be run directly, as by the headless runner.
+
+    With streamChunkPoints the I-V sweeps are streamed and showPoints is
+    called with the points measured so far after each chunk;
+    abortOnCompliance is passed to K2400.streamList. While tracking the
+    maximum power point showTrack is called with the decimated trace
+    (columns of time, voltage, current and power), while monitoring the
+    Voc with the last readings (columns of time and voltage). The stop event
+    interrupts pauses and measurements, name prefixes the progress
+    messages. Without smu the Keithley is opened by the connectInstrument
+    job. """
+    def __init__(
+            self, smu=None, streamChunkPoints=0, abortOnCompliance=0,
+            name=""):
+        self.streamChunkPoints = streamChunkPoints
+        self.abortOnCompliance = abortOnCompliance
+        self.name = name
+        self.stopEvent = threading.Event()
+        self.setSmu(smu)
+
+    def setSmu(self, smu):
+        self.smu = smu
+        if smu is not None:
+            smu.cancelCheck = self.stopEvent.is_set
+
+    def cancel(self):
+        """ stops the running job, the following ones are stopped as well
+        until clearStop is called """
+        self.stopEvent.set()
+
+    def clearStop(self):
+        self.stopEvent.clear()
+
+    def report(self, text):
+        print(self.name + text)
+
+    def showPoints(self, voltage, current):
+        pass
+
+    def showTrack(self, trace):
+        pass
+
+    def pause(self, seconds):
+        """ sleep interrupted by Stop """
+        if self.stopEvent.wait(seconds):
+            raise Keithley2400.MeasurementAborted("Measurement stopped")
+
+    # jobs
+
+    def connectInstrument(self, address, dataFormat, simulated):
+        """ opens the Keithley, done as a job so that the VISA lookup does
+        not hold the caller """
+        self.report("Connecting to the Keithley %d" % address)
+        self.setSmu(Keithley2400.K2400(
+                address, dataFormat=dataFormat, simulated=simulated))
+        self.report("Keithley %d connected" % address)
+
+    def welcome(self):
+        self.smu.text("Welcome to PyPV")
+        self.smu.subtext("")
+        self.smu.shutterClose()
+        self.pause(2)
+        self.smu.setlocal()
+
+    def subtext(self, text):
+        self.smu.subtext(text)
+
+    def measureIV(self, parameters):
+        """ voltage and current of the sweep, and a dict with the timing
+        (time in s spent in the shutter delays and in the sweep) and the
+        description of the current ranges, if predicted
+
+        With the adaptive parameter the voltages are a list dense around
+        the expected MPP and Voc, which can be given as expectedVoc and
+        expectedVoltageMaxPower parameters. With the predictRange parameter
+        and no scale the current ranges are fixed, predicted from the
+        previousCurve parameter or from a pre-scan. """
+        start = time.time()
+        self.smu.reset()
+        if parameters['preDelayOff']:
+            subtext = "Shutter Delay Off %s s" % str(parameters['preDelayOff'])
+            self.report(subtext)
+            self.smu.subtext(subtext)
+            self.pause(parameters['preDelayOff'])
+
+        self.smu.shutterOpen()
+        try:
+            if parameters['preDelayOn']:
+                subtext = (
+                        "Shutter Delay On %s s" %
+                        str(parameters['preDelayOn']))
+                self.report(subtext)
+                self.smu.subtext(subtext)
+                self.pause(parameters['preDelayOn'])
+            self.smu.removetext()
+            self.smu.removesubtext()
+
+            self.report("Measuring")
+            sweepStart = time.time()
+            if parameters['reverse']:
+                sweep = (
+                        parameters['endV'], parameters['startV'],
+                        -parameters['stepV'])
+            else:
+                sweep = (
+                        parameters['startV'], parameters['endV'],
+                        parameters['stepV'])
+            settings = (
+                    parameters['compliance'], parameters['scale'],
+                    parameters['integrationTime'], parameters['delayTime'])
+            voltages = None
+            ranges = None
+            if parameters.get('adaptive'):
+                voltages = self.adaptiveVoltages(parameters)
+            if parameters.get('predictRange') and not parameters['scale']:
+                if voltages is None:
+                    voltages = Keithley2400.K2400.sweepVoltages(*sweep)
+                ranges = self.predictRanges(parameters, voltages)
+            if voltages is not None:
+                if self.streamChunkPoints:
+                    data = self.collectReadings(self.smu.streamList(
+                            voltages, *settings,
+                            chunkPoints=self.streamChunkPoints,
+                            abortOnCompliance=self.abortOnCompliance,
+                            ranges=ranges))
+                else:
+                    data = self.smu.measureListIV(
+                            voltages, *settings, ranges=ranges)
+            elif self.streamChunkPoints:
+                data = self.collectReadings(self.smu.streamIV(
+                        *(sweep + settings),
+                        chunkPoints=self.streamChunkPoints,
+                        abortOnCompliance=self.abortOnCompliance))
+            else:
+                data = self.smu.measureIV(*(sweep + settings))
+        except Keithley2400.MeasurementAborted as e:
+            self.report(str(e))
+            self.smu.subtext(str(e))
+            raise
+        finally:
+            # on any error too, the cell is not left under the light
+            self.smu.shutterClose()
+        self.report("Measurement completed")
+        details = {
+                'timing': {
+                        'shutterTime': sweepStart - start,
+                        'sweepTime': time.time() - sweepStart},
+                'currentRanges': None}
+        if ranges is not None:
+            details['currentRanges'] = CurrentRanging.describeRanges(
+                    data['voltage'], data['range'])
+        return array(data['voltage']), array(data['current']), details
+
+    def predictRanges(self, parameters, voltages):
+        """ current range of each voltage """
+        previous = parameters.get('previousCurve')
+        if previous is None:
+            prescan = self.smu.measureListIV(
+                    linspace(
+                            voltages.min(), voltages.max(),
+                            CurrentRanging.PRESCAN_POINTS),
+                    parameters['compliance'], False,
+                    CurrentRanging.PRESCAN_INTEGRATION_TIME, 0, beep=False)
+            previous = prescan['voltage'], prescan['current']
+            self.report("Current ranges from a pre-scan")
+        return CurrentRanging.rangeSchedule(
+                CurrentRanging.predictCurrents(voltages, *previous),
+                parameters['compliance'])
+
+    def adaptiveVoltages(self, parameters):
+        voc = parameters.get('expectedVoc')
+        voltageMaxPower = parameters.get('expectedVoltageMaxPower')
+        if voc is None:
+            # the light is already on
+            voc = self.smu.measureVoltage(
+                    3, 10.0, 0, 1, statistics=('mean',))['voltage']['mean']
+            self.report("Expected Voc %.3g V" % voc)
+        if voltageMaxPower is None:
+            voltageMaxPower = voc * EXPECTED_MPP_RATIO
+        stepV = abs(parameters['stepV'])
+        voltages = VICurves.adaptiveVoltages(
+                parameters['startV'], parameters['endV'], stepV,
+                stepV * ADAPTIVE_COARSE_FACTOR, (voltageMaxPower, voc),
+                max(ADAPTIVE_HALF_WIDTH, 3 * stepV))
+        if parameters['reverse']:
+            voltages = voltages[::-1]
+        return voltages
+
+    def collectReadings(self, stream):
+        """ concatenates the readings of a stream, showing the points
+        measured so far after each chunk """
+        voltage = array([])
+        current = array([])
+        ranges = array([])
+        for readings in stream:
+            voltage = concatenate((voltage, readings['voltage']))
+            current = concatenate((current, readings['current']))
+            ranges = concatenate((ranges, readings['range']))
+            self.showPoints(voltage, current)
+        return {'voltage': voltage, 'current': current, 'range': ranges}
+
+    def trackMpp(self, parameters, fileName, header=()):
+        """ holds the illuminated cell at its maximum power point, by
+        perturb and observe of stepV within the sweep range starting from
+        the voltageMaxPower parameter, until Stop or for the duration
+        parameter (s) if not 0. Every point is written to fileName;
+        returns the decimated trace and the number of points. """
+        tracker = MppTracking.PerturbObserve(
+                parameters['voltageMaxPower'], parameters['stepV'],
+                min(parameters['startV'], parameters['endV']),
+                max(parameters['startV'], parameters['endV']))
+        trace = TimeSeries.DecimatedTrace(
+                MppTracking.VIEW_POINTS, len(MppTracking.TRACK_COLUMNS))
+        writer = TimeSeries.SeriesWriter(
+                fileName, MppTracking.TRACK_COLUMNS, header,
+                MppTracking.CHUNK_POINTS, MppTracking.COLUMN_MULTIPLIERS)
+        duration = parameters.get('duration', 0)
+        self.smu.reset()
+        self.smu.shutterOpen()
+        try:
+            self.smu.text("Tracking MPP")
+            self.report("Tracking the maximum power point")
+            self.smu.startBias(
+                    tracker.voltage, parameters['compliance'],
+                    parameters['scale'], parameters['integrationTime'],
+                    parameters['delayTime'])
+            start = time.time()
+            lastView = start
+            while not self.stopEvent.is_set():
+                voltage = tracker.voltage
+                readings = self.smu.readBias(voltage)
+                now = time.time()
+                current = readings['current'][0]
+                # the current flows into the cell, negative when generating
+                power = - voltage * current
+                row = (now - start, voltage, current, power)
+                writer.append(row)
+                trace.append(row)
+                tracker.nextVoltage(power)
+                if now - lastView >= MppTracking.VIEW_INTERVAL:
+                    self.showTrack(trace.data())
+                    lastView = now
+                if duration and now - start >= duration:
+                    break
+        finally:
+            self.smu.stopBias()
+            self.smu.shutterClose()
+            self.smu.removetext()
+            writer.close()
+        self.smu.beep()
+        self.report("MPP tracking of %d points saved in %s" % (
+                writer.points, fileName))
+        return trace.data(), writer.points
+
+    def monitorVoc(self, integrationTime, averageCount):
+        """ reads continuously the Voc of the illuminated cell until Stop,
+        the instrument being configured once and averaging averageCount
+        conversions per reading; returns the last reading """
+        readings = TimeSeries.RingBuffer(MONITOR_POINTS, 2)
+        self.smu.reset()
+        self.smu.removetext()
+        self.smu.removesubtext()
+        self.smu.shutterOpen()
+        try:
+            self.smu.startVoltageMonitor(10.0, integrationTime, averageCount)
+            self.report("Monitoring the Voc")
+            start = time.time()
+            lastView = 0
+            while not self.stopEvent.is_set():
+                voltage = self.smu.readVoltageMonitor()['voltage'][0]
+                now = time.time()
+                readings.append((now - start, voltage))
+                if now - lastView >= MONITOR_INTERVAL:
+                    self.showTrack(readings.data())
+                    lastView = now
+        finally:
+            self.smu.stopVoltageMonitor()
+            self.smu.shutterClose()
+        self.report("Voc monitor stopped")
+        if not len(readings):
+            return None
+        return readings.data()[1][-1]
+
+    def measureVoc(self):
+        self.smu.reset()
+        self.smu.removetext()
+        self.smu.removesubtext()
+        self.smu.shutterOpen()
+        try:
+            measurements = self.smu.measureVoltage(
+                    5, 10.0, 0, 5, statistics=('mean',))
+        finally:
+            self.smu.shutterClose()
+        return measurements['voltage']['mean']
+
+    def displayDiode(self, device, diode):
+        self.smu.reset()
+        self.smu.removetext()
+        self.smu.removesubtext()
+
+        text = "Select diode " + diode
+        self.report(text)
+        self.smu.text(text)
+        subtext = "Device " + device
+        self.smu.subtext(subtext)
+        self.pause(0.7)
+        d = 0
+        while(d < int(diode)):
+            self.smu.beep2()
+            self.pause(0.35)
+            d += 1
+        self.pause(0.5)
+        self.smu.beep()
+        self.pause(0.2)
+        self.smu.beep()
+        self.pause(1)
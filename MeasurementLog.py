@@ -0,0 +1,202 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Log of the measurements as JSON lines, one record per event with its
+# time and event name, e.g.
+# {"event": "save", "file": "...", "time": "...", "voc": 0.77, ...}
+# The file is kept open by a single writer, the records are written by a
+# background thread and synced to disk at most every SYNC_INTERVAL.
+#
+# Summary of a log: python2 MeasurementLog.py [--by user experiment] log
+
+from Queue import Queue, Empty
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+
+LOG_FILE = "measurements_log.jsonl"
+# seconds between two fsync of the log, the records are anyway passed to
+# the operating system as soon as they are written
+SYNC_INTERVAL = 5.0
+
+
+def jsonValue(value):
+    """ numpy numbers and other values unknown to json """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class MeasurementLog():
+    """ single writer of the log file, without background the records are
+    written by log itself """
+    def __init__(
+            self, fileName=LOG_FILE, background=True,
+            syncInterval=SYNC_INTERVAL):
+        self.fileName = fileName
+        self.syncInterval = syncInterval
+        self.file = open(fileName, 'a')
+        self.lastSync = time.time()
+        self.unsynced = False
+        if background:
+            self.records = Queue()
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+        else:
+            self.records = None
+
+    def log(self, event, **fields):
+        record = {
+                'time': datetime.datetime.now().isoformat(),
+                'event': event}
+        record.update(fields)
+        line = json.dumps(record, sort_keys=True, default=jsonValue)
+        if self.records is not None:
+            self.records.put(line)
+        else:
+            self.write([line])
+
+    def write(self, lines):
+        self.file.write("".join(line + "\n" for line in lines))
+        self.file.flush()
+        self.unsynced = True
+        if time.time() - self.lastSync >= self.syncInterval:
+            self.sync()
+
+    def sync(self):
+        if self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = False
+        self.lastSync = time.time()
+
+    def run(self):
+        """ writes the queued records in batches, syncing also the last
+        batch within syncInterval """
+        while True:
+            try:
+                lines = [self.records.get(timeout=self.syncInterval)]
+            except Empty:
+                self.sync()
+                continue
+            while True:
+                try:
+                    lines.append(self.records.get_nowait())
+                except Empty:
+                    break
+            if None in lines:
+                self.write(lines[:lines.index(None)])
+                return
+            self.write(lines)
+
+    def close(self):
+        """ writes the pending records and closes the file """
+        if self.records is not None:
+            self.records.put(None)
+            self.thread.join()
+        self.sync()
+        self.file.close()
+
+
+def readLog(fileName=LOG_FILE, event=None):
+    """ the records of the log, only the ones of event if given; lines
+    not parsed (e.g. cut by a crash) are skipped """
+    # the records are written with sorted keys, so lines of other events
+    # are skipped without parsing them
+    pattern = None
+    if event is not None:
+        pattern = '"event": %s' % json.dumps(event)
+    with open(fileName) as f:
+        for line in f:
+            if pattern is not None and pattern not in line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if event is None or record.get('event') == event:
+                yield record
+
+
+SUMMARY_FIELDS = ('efficiency', 'voc', 'jscDensity', 'ff', 'sweepTime')
+
+
+def summarise(records, by=('user', 'experiment'), fields=SUMMARY_FIELDS):
+    """ number of records and mean and maximum of the fields for each
+    group of records with the same values of the by keys, in one pass """
+    groups = {}
+    for record in records:
+        key = tuple(record.get(name) for name in by)
+        group = groups.setdefault(key, {'count': 0})
+        group['count'] += 1
+        for field in fields:
+            value = record.get(field)
+            if not isinstance(value, (int, float)):
+                continue
+            total, count, maximum = group.get(field, (0.0, 0, value))
+            group[field] = (total + value, count + 1, max(maximum, value))
+    summary = []
+    for key in sorted(groups):
+        group = groups[key]
+        row = dict(zip(by, key))
+        row['count'] = group['count']
+        for field in fields:
+            if field in group:
+                total, count, maximum = group[field]
+                row[field + 'Mean'] = total / count
+                row[field + 'Max'] = maximum
+        summary.append(row)
+    return summary
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+            description="Summary of the saved measurements of a PyPV log")
+    parser.add_argument(
+            'log', nargs='?', default=LOG_FILE,
+            help="log file (default %s)" % LOG_FILE)
+    parser.add_argument(
+            '--by', nargs='+', default=['user', 'experiment'],
+            help="fields grouping the measurements (default user "
+            "experiment)")
+    parser.add_argument(
+            '--event', default='save',
+            help="event of the records summarised (default save)")
+    options = parser.parse_args(arguments)
+
+    summary = summarise(readLog(options.log, options.event), options.by)
+    columns = list(options.by) + ['count']
+    for field in SUMMARY_FIELDS:
+        columns += [field + 'Mean', field + 'Max']
+    print("\t".join(columns))
+    for row in summary:
+        values = []
+        for column in columns:
+            value = row.get(column)
+            if isinstance(value, float):
+                values.append("%.4g" % value)
+            else:
+                values.append("" if value is None else str(value))
+        print("\t".join(values))
+
+
+if __name__ == '__main__':
+    main()
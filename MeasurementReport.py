@@ -0,0 +1,420 @@
+# PyPV
+#
+# Copyright (C) 2015 Daniel Fernandez Pinto
+#               2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Analysis, file header, file names, text files and logs of a measurement,
+# shared by the GUI and the headless runner and free from Qt.
+# The functions take the measurement as an object with the attributes
+# used by MainWindow: voltage and current (in A) of the curve, the sweep
+# parameters (startV, endV, stepV, compliance, scale, integrationTime,
+# delayTime, preDelayOff, preDelayOn, reverse, cellArea), date and
+# scanSpeed, and they set or read the results as attributes of it.
+
+from numpy import *
+import datetime
+import os
+
+import VICurves
+import DiodeFit
+
+CURRENT_POSITIVE = 0
+IRRADIANCE_UNIT_MULTIPLIER = 0.001
+CURRENT_UNIT_MULTIPLIER = 1000
+# columns of the entries of a measurements list file, as in
+# list-example.txt, optionally followed by the index of the instrument
+LIST_COLUMNS = (
+        'User', 'Experiment', 'StartV', 'EndV', 'StepV', 'Compliance',
+        'Scale-Index', 'IntegrationTime', 'CellArea', 'AutoScale',
+        'Irradiance', 'Device', 'Diode', 'Reverse', 'AutoSaveImages',
+        'PreDelayOff', 'PreDelayOn', 'WaitBeforeNext')
+LIST_INTEGER_COLUMNS = (6, 9, 12, 13, 14, 17)
+LIST_NUMBER_COLUMNS = (2, 3, 4, 5, 7, 8, 10, 15, 16)
+
+
+def checkListEntry(conf):
+    """ raises ValueError describing the first column of a list entry
+    that listParameters and listIdentification could not read """
+    if len(conf) not in (len(LIST_COLUMNS), len(LIST_COLUMNS) + 1):
+        raise ValueError("%d columns instead of %d (%s)" % (
+                len(conf), len(LIST_COLUMNS), " ".join(LIST_COLUMNS)))
+    for columns, convert, kind in (
+            (LIST_INTEGER_COLUMNS, int, "an integer"),
+            (LIST_NUMBER_COLUMNS, float, "a number")):
+        for i in columns:
+            try:
+                convert(conf[i])
+            except ValueError:
+                raise ValueError("%s is %s, not %s" % (
+                        LIST_COLUMNS[i], conf[i], kind))
+
+
+def listParameters(conf, scaleValues, delayTime):
+    """ sweep parameters of an entry of a measurements list file, the
+    scale column is an index in scaleValues, the delay is not in the
+    list """
+    if int(conf[9]):
+        scale = False
+    else:
+        scale = float(scaleValues[int(conf[6])])
+    return {
+            'startV': float(conf[2]),
+            'endV': float(conf[3]),
+            'reverse': int(int(conf[13]) != 0),
+            'stepV': float(conf[4]),
+            'compliance': float(conf[5]),
+            'scale': scale,
+            'integrationTime': float(conf[7]),
+            'delayTime': float(delayTime),
+            'cellArea': float(conf[8]),
+            'preDelayOff': float(conf[15]),
+            'preDelayOn': float(conf[16])}
+
+
+def listIdentification(conf):
+    """ user, experiment, device, diode, cellArea and irradiance of a
+    list entry, as MainWindow.getDeviceIdentification reads them """
+    return (
+            str(conf[0]), str(conf[1]), str(conf[11]), str(int(conf[12])),
+            str(conf[8]), str(conf[10]))
+
+
+def analyse(m):
+    """ extracts the figures of merit of the curve, returns the Voc as a
+    number """
+    (m.maxPower, m.jsc, voc, ff, m.voltageMaxPower,
+        m.currentMaxPower) = VICurves.extractdata(
+            m.voltage, m.current * (CURRENT_POSITIVE * 2 - 1))
+    m.voc = "%.4g" % (voc)
+    m.ff = "%.3g" % (ff)
+    m.jscDensity = "%.4g" % (
+            m.jsc * CURRENT_UNIT_MULTIPLIER / m.cellArea)
+    m.currentMaxPowerDensity = "%.4g" % (
+            m.currentMaxPower * CURRENT_UNIT_MULTIPLIER / m.cellArea)
+    if m.reverse:
+        m.reverseText = "reverse"
+    else:
+        m.reverseText = "forward"
+    m.maxVoltage = m.voltage.max()
+    m.minVoltage = m.voltage.min()
+    # a new curve, its dark data is computed when first needed
+    m.darkData = None
+    return voc
+
+
+def isVocReached(m, voc):
+    """ False if the scan didn't pass by the Voc """
+    return not (
+            voc < m.minVoltage or
+            voc > m.maxVoltage or
+            m.current[0] / abs(m.current[0]) ==
+            m.current[-1] / abs(m.current[-1]))
+
+
+def setAdaptiveSweep(parameters, irradiance, expected=None):
+    """ makes the sweep of an illuminated cell adaptive, expected is the
+    (Voc, MPP voltage) of the previous curve of the diode, if known """
+    if not float(irradiance):
+        return
+    parameters['adaptive'] = 1
+    if expected is not None:
+        (parameters['expectedVoc'],
+            parameters['expectedVoltageMaxPower']) = expected
+
+
+def setPredictedRanging(parameters, previousCurve=None):
+    """ makes the current ranges of an autoscaled sweep predicted, from
+    the (voltage, current) of the previous curve of the diode under the
+    same light, if known """
+    parameters['predictRange'] = 1
+    parameters['previousCurve'] = previousCurve
+
+
+def curveKey(device, diode, irradiance):
+    """ key of the previous curves of a diode, dark and light apart """
+    return str(device), str(diode), float(irradiance) != 0
+
+
+def expectedPoints(m, voc, irradiance):
+    """ (Voc, MPP voltage) of the curve for the next adaptive sweep of the
+    diode, None if the curve is dark or does not reach the Voc """
+    if not float(irradiance) or not isVocReached(m, voc):
+        return None
+    return float(voc), float(m.voltageMaxPower)
+
+
+def calcEfficiency(maxPower, cellArea, irradiance):
+    if float(irradiance):
+        return "%.3f" % float("%.4g" % (100 * (
+                (float(maxPower) / float(cellArea)) /
+                (float(irradiance) * IRRADIANCE_UNIT_MULTIPLIER))))
+    return "0"
+
+
+def calcDarkData(m, compliance):
+    """ resistances and diode fit of the curve, as numbers """
+    current = m.current * (CURRENT_POSITIVE * 2 - 1)
+    parallelResistance = VICurves.calcParallelResistance(m.voltage, current)
+    seriesResistance = VICurves.calcSeriesResistance(
+            m.voltage, current, compliance, m.reverse)
+    diodeFit = DiodeFit.fitCurve(m.voltage, current, compliance=compliance)
+    return {
+            'seriesResistance': seriesResistance,
+            'parallelResistance': parallelResistance,
+            'diodeFit': diodeFit}
+
+
+def measurementDarkData(m):
+    """ dark data of the analysed curve, the diode fit is done once per
+    measurement and reused by all its headers and records """
+    if getattr(m, 'darkData', None) is None:
+        m.darkData = calcDarkData(m, float(m.compliance))
+    return m.darkData
+
+
+def formatFitValue(valueFormat, value):
+    """ a diode fit parameter, "NotFound" when the fit did not determine
+    it (nan), as the series resistance """
+    if isnan(value):
+        return "NotFound"
+    return valueFormat % value
+
+
+def formatDarkData(darkData):
+    diodeFit = darkData['diodeFit']
+    return (
+            "Serie Resistance (Ohm):	" +
+            str(darkData['seriesResistance']) +
+            "	Parallel Resistance (Ohm):	" +
+            str(darkData['parallelResistance']) +
+            "	Diode Fit Rs (Ohm):	" +
+            formatFitValue("%.4g", diodeFit['seriesResistance']) +
+            "	Rsh (Ohm):	" +
+            formatFitValue("%.4g", diodeFit['shuntResistance']) +
+            "	Ideality Factor:	" +
+            formatFitValue("%.3g", diodeFit['idealityFactor']) +
+            "	I0 (A):	" +
+            formatFitValue("%.3g", diodeFit['saturationCurrent']))
+
+
+def formatHysteresis(hysteresisIndex, pceHysteresisIndex):
+    """ header line of the hysteresis indices of a reverse curve, see
+    Hysteresis.py """
+    return "Hysteresis Index:	%s	PCE Hysteresis Index:	%s" % tuple(
+            "None" if value is None else "%.3g" % value
+            for value in (hysteresisIndex, pceHysteresisIndex))
+
+
+def makeHeader(m, user, experiment, device, diode, cellArea, irradiance):
+    darkOutput = formatDarkData(measurementDarkData(m))
+    if getattr(m, 'currentRanges', None):
+        rangesText = "	Current Ranges:	" + m.currentRanges
+    else:
+        rangesText = ""
+    # the hysteresis indices, set on the reverse curve of a pair
+    hysteresis = getattr(m, 'hysteresis', None)
+    if hysteresis is not None:
+        hysteresisLines = (formatHysteresis(*hysteresis),)
+    else:
+        hysteresisLines = ()
+    return (
+            "PyPV software (Gr. E. Palomares, ICIQ) - Voltage-Current "
+            "measurement Report", "User:	" +
+            user, "Date:	" + str(m.date) + "    Time: " +
+            str(datetime.datetime.now().strftime("%H:%M:%S")),
+            "Experiment:	" + experiment, "Device:	" + device,
+            "Diode:	" + diode, "Forward or reverse? " + m.reverseText,
+            "Lowest Voltage (V):	" + str(m.minVoltage),
+            "Highest Voltage (V): " + str(m.maxVoltage),
+            "Voltage Step (V):	" + str(m.stepV), "Compliance (A):	" +
+            str(m.compliance), "Scale (A):	" + str(m.scale) + rangesText,
+            "Voltage of maximum power point (V):	" +
+            str(m.voltageMaxPower) +
+            "	Current density of MPP (mA/cm2):	" +
+            str(m.currentMaxPowerDensity), "Integration Time:	" +
+            str(m.integrationTime) + "	Scan Speed (V/s):	" +
+            str(m.scanSpeed), "Delay Time (s):	" +
+            str(m.delayTime) + "	ShutterDelayOff (s):	" +
+            str(m.preDelayOff) + "	ShutterDelayOn (s):	" +
+            str(m.preDelayOn), darkOutput, "Cell Area (cm2):	" +
+            cellArea, "Irradiance (mW/cm2):	" + irradiance,
+            "Jsc (mA/cm2):	" + str(m.jscDensity), "Voc (V):	" +
+            str(m.voc), "Fill factor:	" + str(m.ff),
+            "Efficiency (%):	" + str(m.efficiency)) + hysteresisLines + (
+            "Voltage_V \tCurrent_mA",)
+
+
+def makeAutoName(experiment, device, diode, irradiance, reverseText):
+    if float(irradiance) == 0:
+        fileName = (
+                experiment + "-" + device + "-" + diode + "-dark-" +
+                reverseText)
+    else:
+        if float(irradiance) == 100:
+            fileName = (
+                    experiment + "-" + device + "-" + diode + "-" +
+                    reverseText)
+        else:
+            fileName = (
+                    experiment + "-" + device + "-" + diode + "-" +
+                    str(float(irradiance)/100) + "sun-" +
+                    reverseText)
+    return fileName
+
+
+def freeFileName(fileName):
+    """ fileName with the first free -2, -3... suffix """
+    base, extension = os.path.splitext(fileName)
+    number = 2
+    while os.path.exists("%s-%d%s" % (base, number, extension)):
+        number += 1
+    return "%s-%d%s" % (base, number, extension)
+
+
+def seriesFileName(directory, experiment, device, diode, irradiance, kind):
+    """ free name of the file of a series of measurements of the diode
+    (e.g. kind "mpp"), in directory which is created if needed """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    fileName = os.path.join(directory, makeAutoName(
+            experiment, device, diode, irradiance, kind) + ".txt")
+    if os.path.exists(fileName):
+        fileName = freeFileName(fileName)
+    return fileName
+
+
+def dataColumns(m):
+    """ voltage and current (in mA) columns as saved in the files """
+    return transpose((m.voltage, m.current * CURRENT_UNIT_MULTIPLIER))
+
+
+def saveText(
+        m, fileName, user, experiment, device, diode, cellArea,
+        irradiance):
+    with open(fileName, 'w') as f_handle:
+        savetxt(f_handle, makeHeader(
+                m, user, experiment, device, diode, cellArea,
+                irradiance), fmt='%s')
+        savetxt(f_handle, dataColumns(m), fmt='%g \t%g')
+
+
+def appendLog(lines, fileName):
+    with open(fileName, 'a') as f_handle:
+        savetxt(f_handle, lines, fmt='%s')
+
+
+def logRecord(m, user, experiment, device, diode):
+    """ fields of the log record of a saved measurement, with the timing
+    of its steps in s (m.timing) """
+    record = {
+            'user': str(user), 'experiment': str(experiment),
+            'device': str(device), 'diode': str(diode),
+            'direction': m.reverseText,
+            'jscDensity': float(m.jscDensity), 'voc': float(m.voc),
+            'ff': float(m.ff), 'efficiency': float(m.efficiency),
+            'integrationTime': float(m.integrationTime),
+            'delayTime': float(m.delayTime),
+            'irradiance': float(m.irradiance),
+            'points': len(m.voltage)}
+    record.update(getattr(m, 'timing', {}))
+    return record
+
+
+def resultRecord(m, fileName, user, experiment, device, diode, cellArea):
+    """ the results of a saved measurement for the results database """
+    result = logRecord(m, user, experiment, device, diode)
+    result.update(
+            file=fileName, date=str(m.date),
+            time=datetime.datetime.now().strftime("%H:%M:%S"),
+            cellArea=float(cellArea),
+            voltageMaxPower=float(m.voltageMaxPower),
+            scanSpeed=float(m.scanSpeed))
+    darkData = measurementDarkData(m)
+    for key in ('seriesResistance', 'parallelResistance'):
+        try:
+            result[key] = float(darkData[key])
+        except ValueError:
+            # "NotFound"
+            result[key] = None
+    (result['hysteresisIndex'], result['pceHysteresisIndex']) = (
+            getattr(m, 'hysteresis', None) or (None, None))
+    return result
+
+
+def measurementsFileName(m, directory, experiment):
+    return os.path.join(
+            directory,
+            "iv_measurements-" + str(experiment) + "-" + str(m.date) +
+            ".txt")
+
+
+def appendMeasurementsFile(m, fileName, experiment, device, diode):
+    """ adds the results to the table of the measurements of the day,
+    creating it with its header if needed """
+    if not os.path.exists(fileName):
+        appendLog((
+                "exp	device	diode	rev/fwd	Jsc	Voc	FF	"
+                "efficiency	intTime	delay	irradiance", ""), fileName)
+    appendLog((
+            str(experiment) + "	" +
+            str(device) +
+            "	" + str(diode) + "	" + str(m.reverseText) +
+            "	" + str(m.jscDensity) + "	" + str(m.voc) +
+            "	" + str(m.ff) + "	" + str(m.efficiency) +
+            "	" + str(m.integrationTime) + "	" +
+            str(m.delayTime) + "	" + str(m.irradiance), ""), fileName)
+
+
+def storeRecord(
+        m, store, fileName, user, experiment, device, diode, cellArea,
+        irradiance):
+    """ appends the curve and the content of its header to the
+    measurement store, the series resistance can be "NotFound" as in
+    the header and the diode fit parameters not determined are None """
+    darkData = measurementDarkData(m)
+    diodeFit = dict(
+            (key, None if isnan(value) else value)
+            for key, value in darkData['diodeFit'].items())
+    if m.scale:
+        scale = float(m.scale)
+    else:
+        scale = None
+    return store.append(
+            m.voltage, m.current,
+            fileName=fileName, user=str(user),
+            experiment=str(experiment), device=str(device),
+            diode=str(diode), direction=m.reverseText,
+            date=str(m.date),
+            time=datetime.datetime.now().strftime("%H:%M:%S"),
+            cellArea=float(cellArea), irradiance=float(irradiance),
+            startV=float(m.startV), endV=float(m.endV),
+            stepV=float(m.stepV), compliance=float(m.compliance),
+            scale=scale, integrationTime=float(m.integrationTime),
+            delayTime=float(m.delayTime),
+            preDelayOff=float(m.preDelayOff),
+            preDelayOn=float(m.preDelayOn),
+            scanSpeed=float(m.scanSpeed),
+            jscDensity=float(m.jscDensity), voc=float(m.voc),
+            ff=float(m.ff), efficiency=float(m.efficiency),
+            voltageMaxPower=float(m.voltageMaxPower),
+            currentMaxPowerDensity=float(m.currentMaxPowerDensity),
+            seriesResistance=darkData['seriesResistance'],
+            parallelResistance=darkData['parallelResistance'],
+            fitSeriesResistance=diodeFit['seriesResistance'],
+            fitShuntResistance=diodeFit['shuntResistance'],
+            idealityFactor=diodeFit['idealityFactor'],
+            saturationCurrent=diodeFit['saturationCurrent'],
+            diodeFitConverged=diodeFit['converged'])
@@ -0,0 +1,109 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from PyQt4.QtCore import *
+import itertools
+
+import MeasurementWorker
+
+
+class MeasurementScheduler(QObject):
+    """ Runs the jobs on several Keithleys at once, each one with its own
+    VISA session and its own MeasurementWorker thread, so that a transfer
+    or a sweep on one instrument does not hold the others.
+
+    Job ids are unique across the instruments and the signals of all the
+    workers are forwarded by the scheduler signals, so the results can be
+    collected in any order. Devices are assigned to instruments in the
+    order they are first met, unless the instrument is given.
+
+    The instruments are opened by connectInstruments, so that the window
+    can be shown while the VISA resources are looked up. """
+
+    jobFinished = pyqtSignal(int, object, object)
+    progress = pyqtSignal(str)
+    points = pyqtSignal(int, object, object)
+    track = pyqtSignal(int, object)
+
+    def __init__(
+            self, addresses=(24,), dataFormat='ASCII', simulated=False,
+            streamChunkPoints=0, abortOnCompliance=0):
+        QObject.__init__(self)
+        self.addresses = tuple(addresses)
+        self.dataFormat = dataFormat
+        self.simulated = simulated
+        self.jobIds = itertools.count(1)
+        self.workers = []
+        for address in self.addresses:
+            if len(self.addresses) > 1:
+                name = "SMU %s: " % str(address)
+            else:
+                name = ""
+            worker = MeasurementWorker.MeasurementWorker(
+                    None, streamChunkPoints, abortOnCompliance, self.jobIds,
+                    name)
+            worker.jobFinished.connect(self.jobFinished)
+            worker.progress.connect(self.progress)
+            worker.points.connect(self.points)
+            worker.track.connect(self.track)
+            self.workers.append(worker)
+        self.deviceInstruments = {}
+
+    def connectInstruments(self):
+        """ opens the Keithleys on their threads, returns the job ids, the
+        jobs submitted later run once the connection is done """
+        return [
+                worker.submit(
+                        'connectInstrument', address, self.dataFormat,
+                        self.simulated)
+                for worker, address in zip(self.workers, self.addresses)]
+
+    def __len__(self):
+        return len(self.workers)
+
+    def assign(self, device, instrument=None):
+        """ instrument measuring device, a new device goes to the next
+        instrument in turn """
+        if instrument is not None:
+            self.deviceInstruments[device] = int(instrument) % len(self)
+        elif device not in self.deviceInstruments:
+            self.deviceInstruments[device] = (
+                    len(self.deviceInstruments) % len(self))
+        return self.deviceInstruments[device]
+
+    def submit(self, name, *args):
+        """ submits a job to the first instrument """
+        return self.submitTo(0, name, *args)
+
+    def submitTo(self, instrument, name, *args):
+        return self.workers[instrument].submit(name, *args)
+
+    def broadcast(self, name, *args):
+        """ submits a job to every instrument, returns the job ids """
+        return [worker.submit(name, *args) for worker in self.workers]
+
+    def cancel(self):
+        for worker in self.workers:
+            worker.cancel()
+
+    def clearStop(self):
+        for worker in self.workers:
+            worker.clearStop()
+
+    def quit(self):
+        for worker in self.workers:
+            worker.quit()
@@ -0,0 +1,130 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Append-only binary store of the measured curves. A store is a directory
+# with two columns, voltage.f64 and current.f64, holding the points of
+# all the curves one after the other as little endian float64, and
+# index.jsonl, with one JSON record per curve: its metadata plus the
+# offset and the length of its points in the columns. The data is written
+# before its record, so an interrupted append leaves only unreferenced
+# points. Curves are read as memory mapped views on the columns.
+
+from numpy import *
+import json
+import os
+
+COLUMNS = ('voltage', 'current')
+DATA_TYPE = dtype('<f8')
+INDEX_FILE = 'index.jsonl'
+
+
+class MeasurementStore():
+    """ Append-only store of curves and their metadata, with lookup by
+    any metadata key """
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.records = []
+        # record positions by key and value, for the lookups
+        self.keyIndex = {}
+        self.maps = {}
+        indexName = os.path.join(directory, INDEX_FILE)
+        if os.path.isfile(indexName):
+            with open(indexName) as f:
+                for line in f:
+                    if line.strip():
+                        self.addRecord(json.loads(line))
+
+    def columnName(self, column):
+        return os.path.join(self.directory, column + '.f64')
+
+    def addRecord(self, record):
+        position = len(self.records)
+        self.records.append(record)
+        for key, value in record.items():
+            try:
+                self.keyIndex.setdefault(key, {}).setdefault(
+                        value, []).append(position)
+            except TypeError:
+                # unhashable values (e.g. lists) can't be looked up
+                pass
+
+    def append(self, voltage, current, **metadata):
+        """ stores a curve with its metadata, returns its record """
+        voltage = asarray(voltage, dtype=DATA_TYPE)
+        current = asarray(current, dtype=DATA_TYPE)
+        if voltage.shape != current.shape:
+            raise ValueError("Voltage and current lengths differ")
+        offsets = []
+        for column, values in zip(COLUMNS, (voltage, current)):
+            with open(self.columnName(column), 'ab') as f:
+                f.seek(0, os.SEEK_END)
+                offsets.append(f.tell() // DATA_TYPE.itemsize)
+                values.tofile(f)
+        if offsets[0] != offsets[1]:
+            raise IOError("Columns of store %s are misaligned" % (
+                    self.directory))
+        record = dict(metadata)
+        record['id'] = len(self.records)
+        record['offset'] = offsets[0]
+        record['length'] = len(voltage)
+        with open(os.path.join(self.directory, INDEX_FILE), 'a') as f:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+        self.addRecord(record)
+        return record
+
+    def find(self, **criteria):
+        """ records whose metadata equals all the given key values, in the
+        order they were stored """
+        positions = None
+        for key, value in criteria.items():
+            matches = set(self.keyIndex.get(key, {}).get(value, ()))
+            if positions is None:
+                positions = matches
+            else:
+                positions &= matches
+        if positions is None:
+            return list(self.records)
+        return [self.records[p] for p in sorted(positions)]
+
+    def columnMap(self, column, end):
+        """ memory map of a column covering at least end points """
+        columnMap = self.maps.get(column)
+        if columnMap is None or len(columnMap) < end:
+            columnMap = memmap(
+                    self.columnName(column), dtype=DATA_TYPE, mode='r')
+            self.maps[column] = columnMap
+        return columnMap
+
+    def curve(self, record):
+        """ voltage and current of a record, as read-only memory mapped
+        arrays """
+        start = record['offset']
+        end = start + record['length']
+        if not record['length']:
+            return zeros(0, DATA_TYPE), zeros(0, DATA_TYPE)
+        return tuple(
+                self.columnMap(column, end)[start:end]
+                for column in COLUMNS)
+
+    def curves(self, **criteria):
+        """ generates the records matching the criteria with their
+        curves """
+        for record in self.find(**criteria):
+            voltage, current = self.curve(record)
+            yield record, voltage, current
@@ -0,0 +1,95 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from PyQt4.QtCore import *
+from Queue import Queue
+import itertools
+
+import MeasurementJobs
+
+
+class MeasurementWorker(QObject, MeasurementJobs.MeasurementJobs):
+    """ Owns the Keithley and runs on its own thread the jobs submitted by
+    the GUI, one at a time in submission order. A job is the name of one
+    of the MeasurementJobs methods with its arguments, its result or
+    exception is sent back through the jobFinished signal. The Keithley
+    can be opened on the thread by a connectInstrument job.
+
+    The points of the streamed sweeps are sent through the points signal
+    with the id of their job, the trace of the maximum power point
+    tracking through the track signal. Workers sharing the jobIds counter give
+    unique job ids. """
+
+    jobFinished = pyqtSignal(int, object, object)
+    progress = pyqtSignal(str)
+    points = pyqtSignal(int, object, object)
+    track = pyqtSignal(int, object)
+
+    def __init__(
+            self, smu=None, streamChunkPoints=0, abortOnCompliance=0,
+            jobIds=None, name=""):
+        QObject.__init__(self)
+        MeasurementJobs.MeasurementJobs.__init__(
+                self, smu, streamChunkPoints, abortOnCompliance, name)
+        if jobIds is None:
+            jobIds = itertools.count(1)
+        self.jobIds = jobIds
+        self.currentJobId = 0
+        self.jobs = Queue()
+
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.run)
+        self.thread.start()
+
+    def submit(self, name, *args):
+        jobId = next(self.jobIds)
+        self.jobs.put((jobId, name, args))
+        return jobId
+
+    def quit(self):
+        self.jobs.put(None)
+        self.thread.quit()
+        self.thread.wait()
+
+    @pyqtSlot()
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            jobId, name, args = job
+            self.currentJobId = jobId
+            try:
+                if self.smu is None and name != 'connectInstrument':
+                    raise IOError("Keithley not connected")
+                result = getattr(self, name)(*args)
+                error = None
+            except Exception as e:
+                result = None
+                error = e
+            self.jobFinished.emit(jobId, result, error)
+
+    def report(self, text):
+        MeasurementJobs.MeasurementJobs.report(self, text)
+        self.progress.emit(self.name + text)
+
+    def showPoints(self, voltage, current):
+        self.points.emit(self.currentJobId, voltage, current)
+
+    def showTrack(self, trace):
+        self.track.emit(self.currentJobId, trace)
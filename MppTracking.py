@@ -0,0 +1,92 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Maximum power point tracking of an illuminated cell. The source voltage
+# is moved by perturb and observe starting from the MPP voltage of the
+# last curve; every point (time, voltage, current, power) is written to a
+# text file in chunks (TimeSeries.SeriesWriter), while the display gets a
+# decimated trace of fixed size (TimeSeries.DecimatedTrace), so the memory
+# used does not grow with the tracking time.
+
+from numpy import *
+
+# points written to the file at a time
+CHUNK_POINTS = 200
+# points of the trace shown while tracking, and s between two updates
+VIEW_POINTS = 2000
+VIEW_INTERVAL = 0.5
+# columns of the file, the current and the power are saved in mA and mW
+TRACK_COLUMNS = ('Time_s', 'Voltage_V', 'Current_mA', 'Power_mW')
+COLUMN_MULTIPLIERS = array((1, 1, 1000, 1000))
+
+
+class PerturbObserve():
+    """ perturb and observe: the voltage keeps moving by step in the same
+    direction while the power increases and turns back when it decreases,
+    staying within minVoltage and maxVoltage """
+    def __init__(self, voltage, step, minVoltage=-inf, maxVoltage=inf):
+        self.voltage = voltage
+        self.step = abs(step)
+        self.minVoltage = minVoltage
+        self.maxVoltage = maxVoltage
+        self.direction = 1
+        self.lastPower = None
+
+    def nextVoltage(self, power):
+        """ voltage to source after measuring power at self.voltage """
+        if self.lastPower is not None and power < self.lastPower:
+            self.direction = - self.direction
+        self.lastPower = power
+        voltage = self.voltage + self.direction * self.step
+        if not self.minVoltage <= voltage <= self.maxVoltage:
+            self.direction = - self.direction
+            voltage = self.voltage + self.direction * self.step
+        self.voltage = voltage
+        return voltage
+
+
+def trackHeader(
+        parameters, date, user, experiment, device, diode, cellArea,
+        irradiance):
+    """ header of the tracking file, from the trackMpp parameters """
+    return (
+            "PyPV software (Gr. E. Palomares, ICIQ) - Maximum power point "
+            "tracking Report", "User:	" + user,
+            "Date:	" + str(date), "Experiment:	" + experiment,
+            "Device:	" + device, "Diode:	" + diode,
+            "Initial Voltage (V):	" + str(parameters['voltageMaxPower']),
+            "Perturbation (V):	" + str(parameters['stepV']),
+            "Compliance (A):	" + str(parameters['compliance']),
+            "Scale (A):	" + str(parameters['scale']),
+            "Integration Time:	" + str(parameters['integrationTime']),
+            "Delay Time (s):	" + str(parameters['delayTime']),
+            "Cell Area (cm2):	" + cellArea,
+            "Irradiance (mW/cm2):	" + irradiance)
+
+
+def trackRecord(trace, points, user, experiment, device, diode, irradiance):
+    """ fields of the log record of a tracking, with its duration (s) and
+    last power (W) """
+    record = {
+            'user': str(user), 'experiment': str(experiment),
+            'device': str(device), 'diode': str(diode),
+            'irradiance': float(irradiance), 'points': points,
+            'duration': 0.0, 'power': 0.0}
+    if len(trace[0]):
+        record['duration'] = float(trace[0][-1])
+        record['power'] = float(trace[3][-1])
+    return record
@@ -0,0 +1,283 @@
+# PyPV
+#
+# Copyright (C) 2015 Daniel Fernandez Pinto
+#               2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg
+from numpy import *
+from collections import deque
+import os
+
+# fraction of the data span added around the curves when rescaling
+AXES_MARGIN = 0.05
+
+
+def drawGraph(
+        fig, imageName, voltage, adjCurrent, voltageMaxPower,
+        currentMaxPower, Voc, printVoc, Jsc, JscDensity, FF, efficiency):
+    fig.suptitle(imageName, fontsize=14, fontweight='bold')
+    ax = fig.add_subplot(111)
+    fig.subplots_adjust(top=0.85)
+    ax.set_xlabel('Voltage (V)')
+    ax.set_ylabel('Current (mA)')
+    ax.plot(voltage, adjCurrent)
+    ax.plot(voltageMaxPower, currentMaxPower, 'ro')
+    if printVoc:
+        ax.plot(float(Voc), 0, 'r+')
+    ax.plot(0, Jsc, 'r+')
+    ax.axhline(0, color='k')
+    ax.axvline(0, color='k')
+    ymin, ymax = ax.get_ylim()
+    ax.set_yticks(
+            arange(
+                    int(min(minimum(adjCurrent, -2)) * 2),
+                    int(max(maximum(adjCurrent, 2)) * 2), 0.5),
+            minor='True')
+    ax.yaxis.grid(True, which='minor')
+    ax.set_ylim(ymin, ymax)
+    xmin, xmax = ax.get_xlim()
+    ax.set_xticks(arange(-20, 20, 0.2), minor='True')
+    ax.xaxis.grid(True, which='minor')
+    ax.set_xlim(xmin, xmax)
+
+    ax.text(
+            0.05, 0.05, makeLegend(Voc, JscDensity, FF, efficiency),
+            verticalalignment='bottom', horizontalalignment='left',
+            transform=ax.transAxes, fontsize=14,
+            bbox=dict(facecolor='pink', alpha=0.9, pad=10))
+
+
+def makeLegend(Voc, JscDensity, FF, efficiency):
+    return (
+            "Voc " + Voc + " V\nJsc " + JscDensity + " mA/cm2\nFF " + FF +
+            "\nEfficiency " + efficiency + " %")
+
+
+def saveGraph(directory, imageName, *args):
+    """ renders the graph of a curve in a png file, in process and without
+    pyplot """
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    drawGraph(fig, imageName, *args)
+    fig.savefig(os.path.join(directory, imageName) + ".png")
+
+
+class IVPlotCanvas(FigureCanvasQTAgg):
+    """ Persistent I-V plot embedded in the main window.
+
+    The last maxCurves curves are overlaid, the newest in full color. The
+    curve lines, the markers and the legend are animated artists updated
+    by blitting over a cached background, the whole figure is redrawn only
+    when the axes limits have to change. """
+    def __init__(self, parent=None, maxCurves=5):
+        self.fig = Figure()
+        FigureCanvasQTAgg.__init__(self, self.fig)
+        self.setParent(parent)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_xlabel('Voltage (V)')
+        self.ax.set_ylabel('Current (mA)')
+        self.ax.axhline(0, color='k')
+        self.ax.axvline(0, color='k')
+        self.ax.grid(True)
+        self.title = self.fig.suptitle('', fontsize=12, fontweight='bold')
+        self.maxCurves = maxCurves
+        self.curves = deque()
+        self.maxPowerMarker, = self.ax.plot([], [], 'ro', animated=True)
+        self.pointMarkers, = self.ax.plot([], [], 'r+', animated=True)
+        self.legend = self.ax.text(
+                0.05, 0.05, '', verticalalignment='bottom',
+                horizontalalignment='left', transform=self.ax.transAxes,
+                fontsize=11, animated=True,
+                bbox=dict(facecolor='pink', alpha=0.9, pad=6))
+        self.legend.set_visible(False)
+        # curves being streamed by the key identifying their measurement
+        self.liveCurves = {}
+        self.background = None
+        self.mpl_connect('draw_event', self.onDraw)
+
+    def dynamicArtists(self):
+        return (
+                list(self.curves) +
+                [self.maxPowerMarker, self.pointMarkers, self.legend])
+
+    def onDraw(self, event):
+        # a full draw skips the animated artists, cache it and add them
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        for artist in self.dynamicArtists():
+            self.ax.draw_artist(artist)
+
+    def refresh(self):
+        """ redraws only the animated artists over the cached background """
+        if self.background is None:
+            self.draw()
+            return
+        self.restore_region(self.background)
+        for artist in self.dynamicArtists():
+            self.ax.draw_artist(artist)
+        self.blit(self.fig.bbox)
+
+    def newCurve(self):
+        """ line for a new curve, reusing the oldest one when the maximum
+        number of overlaid curves is reached """
+        if len(self.curves) >= self.maxCurves:
+            line = self.curves.popleft()
+            line.set_data([], [])
+            for key, liveCurve in self.liveCurves.items():
+                if liveCurve is line:
+                    del self.liveCurves[key]
+        else:
+            line, = self.ax.plot([], [], animated=True)
+        self.curves.append(line)
+        self.recolor()
+        return line
+
+    def recolor(self):
+        count = len(self.curves)
+        for i, curve in enumerate(self.curves):
+            # older curves fade out
+            curve.set_alpha(0.25 + 0.75 * (i + 1.0) / count)
+            curve.set_color('b' if i == count - 1 else '0.5')
+            curve.set_zorder(i + 2)
+
+    def fitLimits(self):
+        """ adapts the axes to the overlaid curves, returns True if they
+        were changed """
+        changed = False
+        for index, getLimits, setLimits in (
+                (0, self.ax.get_xlim, self.ax.set_xlim),
+                (1, self.ax.get_ylim, self.ax.set_ylim)):
+            values = concatenate([
+                    asarray(curve.get_data()[index], dtype=float)
+                    for curve in self.curves] + [zeros(1)])
+            values = values[isfinite(values)]
+            low, high = values.min(), values.max()
+            margin = max(high - low, 1e-3) * AXES_MARGIN
+            limits = (low - margin, high + margin)
+            if tuple(getLimits()) != limits:
+                setLimits(*limits)
+                changed = True
+        return changed
+
+    def streamCurve(self, key, voltage, adjCurrent):
+        """ shows the points measured so far of the measurement identified
+        by key, a new key starts a new curve """
+        if key not in self.liveCurves:
+            self.liveCurves[key] = self.newCurve()
+        self.updateCurve(self.liveCurves[key], voltage, adjCurrent)
+
+    def showCurve(
+            self, imageName, voltage, adjCurrent, voltageMaxPower,
+            currentMaxPower, Voc, printVoc, Jsc, JscDensity, FF,
+            efficiency, key=None):
+        """ overlays a measured curve with its maximum power point, Jsc,
+        Voc and the legend of its parameters, replacing its streamed
+        points if key is the one they were shown with """
+        if key in self.liveCurves:
+            # the final curve becomes the newest one
+            line = self.liveCurves.pop(key)
+            self.curves.remove(line)
+            self.curves.append(line)
+            self.recolor()
+        else:
+            line = self.newCurve()
+        self.updateCurve(line, voltage, adjCurrent, redraw=False)
+        self.maxPowerMarker.set_data([voltageMaxPower], [currentMaxPower])
+        if printVoc:
+            self.pointMarkers.set_data([float(Voc), 0], [0, Jsc])
+        else:
+            self.pointMarkers.set_data([0], [Jsc])
+        self.legend.set_text(makeLegend(Voc, JscDensity, FF, efficiency))
+        self.legend.set_visible(True)
+        self.title.set_text(imageName)
+        # the title is not animated, it needs a full draw
+        self.draw_idle()
+
+    def updateCurve(self, line, voltage, adjCurrent, redraw=True):
+        """ replaces the data of a curve, blitting unless the axes have to
+        be rescaled """
+        line.set_data(voltage, adjCurrent)
+        if self.fitLimits() or not redraw:
+            self.draw_idle()
+        else:
+            self.refresh()
+
+
+class StabilityPlotCanvas(FigureCanvasQTAgg):
+    """ figures of merit of a stability measurement against time, the
+    mean of the downsampled sweeps as a line within their minimum and
+    maximum """
+    def __init__(self, parent=None):
+        self.fig = Figure()
+        FigureCanvasQTAgg.__init__(self, self.fig)
+        self.setParent(parent)
+        self.axes = [self.fig.add_subplot(2, 2, i + 1) for i in range(4)]
+        for ax, label in zip(self.axes, (
+                'Jsc (mA/cm2)', 'Voc (V)', 'FF', 'Efficiency (%)')):
+            ax.set_ylabel(label)
+            ax.grid(True)
+        for ax in self.axes[2:]:
+            ax.set_xlabel('Time (h)')
+        self.title = self.fig.suptitle('', fontsize=12, fontweight='bold')
+
+    def showHistory(self, title, mean, low, high):
+        """ mean, low and high are columns of time (s), Jsc, Voc, FF and
+        efficiency """
+        self.title.set_text(title)
+        hours = mean[0] / 3600
+        for i, ax in enumerate(self.axes):
+            # few artists, redrawn once per sweep
+            for artist in ax.lines + ax.collections:
+                artist.remove()
+            ax.fill_between(
+                    hours, low[i + 1], high[i + 1], color='b', alpha=0.2,
+                    linewidth=0)
+            ax.plot(hours, mean[i + 1], 'b.-')
+            ax.relim()
+            ax.autoscale_view()
+        self.draw_idle()
+
+
+class TrackPlotCanvas(FigureCanvasQTAgg):
+    """ power and voltage of the maximum power point tracking, or voltage
+    only of the Voc monitor, against time, redrawn from the trace at every
+    update """
+    def __init__(self, parent=None):
+        self.fig = Figure()
+        FigureCanvasQTAgg.__init__(self, self.fig)
+        self.setParent(parent)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_xlabel('Time (s)')
+        self.ax.set_ylabel('Power (mW)')
+        self.ax.grid(True)
+        self.voltageAx = self.ax.twinx()
+        self.voltageAx.set_ylabel('Voltage (V)')
+        self.powerLine, = self.ax.plot([], [], 'b')
+        self.voltageLine, = self.voltageAx.plot([], [], 'r', alpha=0.5)
+        self.title = self.fig.suptitle('', fontsize=12, fontweight='bold')
+
+    def showTrack(self, title, time, voltage, power=None):
+        self.title.set_text(title)
+        if power is None:
+            self.powerLine.set_data([], [])
+        else:
+            self.powerLine.set_data(time, power)
+        self.voltageLine.set_data(time, voltage)
+        for ax in (self.ax, self.voltageAx):
+            ax.relim()
+            ax.autoscale_view()
+        self.draw_idle()
@@ -19,6 +19,8 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+# imported first, the startup times are measured from here
+import StartupTiming
 import sys
 
 # import PyQt4 QtCore and QtGui modules
@@ -26,6 +28,7 @@ from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
 from mainwindow import MainWindow
+StartupTiming.mark("imports")
 
 if __name__ == '__main__':
 
@@ -35,8 +38,10 @@ if __name__ == '__main__':
 
     # create widget
     w = MainWindow()
+    StartupTiming.mark("window created")
     w.setWindowTitle('PyPV - https://github.com/ilario/pypv')
     w.show()
+    StartupTiming.mark("window shown")
 
     # connection
     QObject.connect(app, SIGNAL('lastWindowClosed()'), app, SLOT('quit()'))
@@ -0,0 +1,244 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# SQLite database of the results extracted from the saved measurements,
+# one row per saved file (saving again the same file updates its row).
+# The rows are dictionaries with the COLUMNS keys, e.g.
+#   results = ResultsDatabase.ResultsDatabase()
+#   results.query(experiment='ig40', orderBy='efficiency DESC', limit=1)
+#   results.summary(('device', 'direction'), experiment='ig40')
+#
+# Summary from the command line:
+#   python2 ResultsDatabase.py --experiment ig40 --by device
+
+import argparse
+import sqlite3
+
+DATABASE_FILE = "measurement_results.sqlite"
+# column name and type, in the table order
+COLUMNS = (
+        ('file', 'TEXT UNIQUE'),
+        ('date', 'TEXT'),
+        ('time', 'TEXT'),
+        ('user', 'TEXT'),
+        ('experiment', 'TEXT'),
+        ('device', 'TEXT'),
+        ('diode', 'TEXT'),
+        ('direction', 'TEXT'),
+        ('irradiance', 'REAL'),
+        ('cellArea', 'REAL'),
+        ('jscDensity', 'REAL'),
+        ('voc', 'REAL'),
+        ('ff', 'REAL'),
+        ('efficiency', 'REAL'),
+        ('voltageMaxPower', 'REAL'),
+        ('integrationTime', 'REAL'),
+        ('delayTime', 'REAL'),
+        ('scanSpeed', 'REAL'),
+        ('seriesResistance', 'REAL'),
+        ('parallelResistance', 'REAL'),
+        ('points', 'INTEGER'),
+        ('hysteresisIndex', 'REAL'),
+        ('pceHysteresisIndex', 'REAL'))
+COLUMN_NAMES = tuple(name for name, columnType in COLUMNS)
+INDEXED_COLUMNS = ('user', 'experiment', 'device', 'diode', 'date')
+# figures of merit of the summaries
+SUMMARY_FIELDS = ('jscDensity', 'voc', 'ff', 'efficiency')
+
+
+def checkColumns(names):
+    """ the names used in the queries are checked, as they cannot be
+    passed as parameters """
+    for name in names:
+        if name not in COLUMN_NAMES:
+            raise ValueError("Unknown column %s" % name)
+
+
+def whereClause(criteria):
+    """ SQL condition and parameters of criteria: column=value, or
+    column=(values) for any of the values """
+    checkColumns(criteria)
+    conditions = []
+    parameters = []
+    for name in sorted(criteria):
+        value = criteria[name]
+        if isinstance(value, (list, tuple, set)):
+            conditions.append('"%s" IN (%s)' % (
+                    name, ", ".join("?" * len(value))))
+            parameters.extend(value)
+        else:
+            conditions.append('"%s" = ?' % name)
+            parameters.append(value)
+    if not conditions:
+        return "", parameters
+    return " WHERE " + " AND ".join(conditions), parameters
+
+
+class ResultsDatabase():
+    """ results table with the query and summary functions used by the
+    GUI and by the reports """
+    def __init__(self, fileName=DATABASE_FILE):
+        self.fileName = fileName
+        self.connection = sqlite3.connect(fileName)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS results '
+                    '(id INTEGER PRIMARY KEY, %s)' % ", ".join(
+                            '"%s" %s' % column for column in COLUMNS))
+            # the columns added after the database was created
+            existing = [
+                    row['name'] for row in self.connection.execute(
+                            'PRAGMA table_info(results)')]
+            for name, columnType in COLUMNS:
+                if name not in existing:
+                    self.connection.execute(
+                            'ALTER TABLE results ADD COLUMN "%s" %s' % (
+                                    name, columnType))
+            for name in INDEXED_COLUMNS:
+                self.connection.execute(
+                        'CREATE INDEX IF NOT EXISTS results_%s '
+                        'ON results ("%s")' % (name, name))
+
+    def close(self):
+        self.connection.close()
+
+    def insert(self, **result):
+        self.insertMany((result,))
+
+    def insertMany(self, results):
+        """ inserts the results in a single transaction, the keys which
+        are not columns are ignored. The row of a file already in the
+        table is updated, keeping the values of the columns missing from
+        its result (e.g. the ones written by other programs). """
+        groups = {}
+        for result in results:
+            names = tuple(name for name in COLUMN_NAMES if name in result)
+            groups.setdefault(names, []).append(result)
+        with self.connection:
+            for names, rows in groups.items():
+                # an upsert, written for the SQLite versions without
+                # ON CONFLICT DO UPDATE
+                self.connection.executemany(
+                        'INSERT OR IGNORE INTO results ("file") VALUES (?)',
+                        ((row['file'],) for row in rows))
+                self.updateRows(rows, names)
+
+    def updateMany(self, results, names):
+        """ sets the names columns of the rows of the files of the
+        results, in a single transaction """
+        checkColumns(names)
+        with self.connection:
+            self.updateRows(results, names)
+
+    def updateRows(self, results, names):
+        statement = 'UPDATE results SET %s WHERE "file" = ?' % ", ".join(
+                '"%s" = ?' % name for name in names)
+        self.connection.executemany(statement, (
+                tuple(result.get(name) for name in names) +
+                (result['file'],) for result in results))
+
+    def query(self, orderBy='id', limit=None, **criteria):
+        """ the results matching criteria, orderBy is a column name
+        optionally followed by DESC """
+        where, parameters = whereClause(criteria)
+        order = orderBy.split()
+        if order[0] != 'id':
+            checkColumns(order[:1])
+        if order[1:] not in ([], ['ASC'], ['DESC']):
+            raise ValueError("Unknown order %s" % orderBy)
+        statement = 'SELECT * FROM results%s ORDER BY "%s" %s' % (
+                where, order[0], " ".join(order[1:]))
+        if limit is not None:
+            statement += " LIMIT %d" % int(limit)
+        return [
+                dict(row) for row in
+                self.connection.execute(statement, parameters)]
+
+    def summary(self, groupBy=('experiment',), **criteria):
+        """ number of results and mean and maximum of the figures of merit
+        for each group of results with the same groupBy values """
+        checkColumns(groupBy)
+        where, parameters = whereClause(criteria)
+        groups = ", ".join('"%s"' % name for name in groupBy)
+        fields = ", ".join(
+                'AVG("%s") AS %sMean, MAX("%s") AS %sMax' % (
+                        (field, field) * 2)
+                for field in SUMMARY_FIELDS)
+        statement = (
+                'SELECT %s, COUNT(*) AS count, %s FROM results%s '
+                'GROUP BY %s ORDER BY %s' % (
+                        groups, fields, where, groups, groups))
+        return [
+                dict(row) for row in
+                self.connection.execute(statement, parameters)]
+
+    def best(self, field='efficiency', **criteria):
+        """ the result with the highest field, None if nothing matches """
+        results = self.query(orderBy=field + ' DESC', limit=1, **criteria)
+        if results:
+            return results[0]
+        return None
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+            description="Summary of the results of the saved measurements")
+    parser.add_argument(
+            '--database', default=DATABASE_FILE,
+            help="database file (default %s)" % DATABASE_FILE)
+    for name in INDEXED_COLUMNS:
+        parser.add_argument(
+                '--' + name, nargs='+', help="only the results of this %s "
+                "(or of any of these)" % name)
+    parser.add_argument(
+            '--by', nargs='+', default=['experiment'],
+            help="fields grouping the results (default experiment)")
+    parser.add_argument(
+            '--best', action='store_true',
+            help="print the file of highest efficiency instead")
+    options = parser.parse_args(arguments)
+
+    criteria = {}
+    for name in INDEXED_COLUMNS:
+        values = getattr(options, name)
+        if values:
+            criteria[name] = values
+    results = ResultsDatabase(options.database)
+    if options.best:
+        best = results.best(**criteria)
+        if best is not None:
+            print("%s\t%.4g" % (best['file'], best['efficiency']))
+        return
+    rows = results.summary(options.by, **criteria)
+    columns = list(options.by) + ['count']
+    for field in SUMMARY_FIELDS:
+        columns += [field + 'Mean', field + 'Max']
+    print("\t".join(columns))
+    for row in rows:
+        values = []
+        for column in columns:
+            value = row[column]
+            if isinstance(value, float):
+                values.append("%.4g" % value)
+            else:
+                values.append("" if value is None else unicode(value))
+        print("\t".join(values))
+
+
+if __name__ == '__main__':
+    main()
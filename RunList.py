@@ -0,0 +1,436 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Runs a measurements list file, as the "Run List" button of the GUI does,
+# without Qt nor a display. The files and the logs written are the same
+# as the ones of the GUI autosave, the questions the GUI would ask are
+# answered by the command line options.
+#
+# Usage: python2 RunList.py [options] list-file
+
+from numpy import *
+import argparse
+import datetime
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+
+import Keithley2400
+import MeasurementJobs
+import MeasurementLog
+import MeasurementReport
+import MeasurementStore
+import MppTracking
+import ResultsDatabase
+import Stability
+
+UI_FILE = 'mainwindow.ui'
+
+
+class ListMeasurement():
+    """ a measurement of the list, with the attributes used by
+    MeasurementReport """
+    def __init__(self, parameters, date, scanSpeed, irradiance):
+        for key, value in parameters.items():
+            setattr(self, key, value)
+        self.date = date
+        self.scanSpeed = scanSpeed
+        self.irradiance = float(irradiance)
+
+
+def readScaleValues(uiFile=UI_FILE):
+    """ the current ranges of the scale combo box of the GUI, indexed by
+    the scale column of the list files """
+    tree = ElementTree.parse(uiFile)
+    for widget in tree.iter('widget'):
+        if widget.get('name') == 'scale_combo':
+            return [
+                    item.find('property/string').text
+                    for item in widget.findall('item')]
+    raise ValueError("No scale_combo in %s" % uiFile)
+
+
+def readList(listFile):
+    """ entries of a list file, after its header line, as lists of
+    strings; raises ValueError naming the first line that can't be
+    measured """
+    entries = []
+    with open(listFile) as f:
+        for number, line in enumerate(f, 1):
+            if number == 1 or not line.strip():
+                continue
+            entry = line.split()
+            try:
+                MeasurementReport.checkListEntry(entry)
+            except ValueError as e:
+                raise ValueError("%s, line %d: %s" % (listFile, number, e))
+            entries.append(entry)
+    return entries
+
+
+class ListRunner():
+    """ measures the entries of a list with one instrument, taking the
+    decisions from the options """
+    def __init__(self, jobs, options):
+        self.jobs = jobs
+        self.options = options
+        self.date = datetime.date.today()
+        self.scaleValues = readScaleValues(options.ui_file)
+        if options.store:
+            self.store = MeasurementStore.MeasurementStore(options.store)
+        else:
+            self.store = None
+        if options.results:
+            self.results = ResultsDatabase.ResultsDatabase(options.results)
+        else:
+            self.results = None
+        # (Voc, MPP voltage) of the last illuminated curve of each
+        # (device, diode), for the adaptive sweeps, and last curve of each
+        # diode, dark and light apart, for the predictive ranging
+        self.expectedPoints = {}
+        self.previousCurves = {}
+        self.errors = 0
+
+    def run(self, listFile, conf):
+        """ measures the entries conf (see readList) of listFile """
+        self.log = MeasurementLog.MeasurementLog()
+        self.log.log('start', date=str(self.date), listFile=listFile)
+        try:
+            for i, entry in enumerate(conf):
+                print("Entry %d of %d" % (i + 1, len(conf)))
+                try:
+                    self.runEntry(entry)
+                except Keithley2400.MeasurementAborted as e:
+                    print(e)
+                    self.errors += 1
+                    if self.options.on_abort == 'stop':
+                        break
+                if int(entry[17]) and not self.blockEnd():
+                    break
+            self.jobs.subtext("Measurements list completed")
+        except KeyboardInterrupt:
+            print("Interrupted, switching off the output")
+            self.jobs.smu.ctrl.write(":ABOR; :OUTP OFF; *CLS")
+            self.jobs.smu.shutterClose()
+            raise
+        finally:
+            self.jobs.smu.setlocal()
+            self.log.close()
+            if self.results is not None:
+                self.results.close()
+
+    def blockEnd(self):
+        """ the GUI asks whether to continue with the next block """
+        policy = self.options.at_block_end
+        if policy == 'pause':
+            self.jobs.subtext("Waiting for user interaction")
+            raw_input("Block of measurements completed, press Enter to "
+                      "continue with the next ones ")
+            return True
+        return policy == 'continue'
+
+    def runEntry(self, entry):
+        parameters = MeasurementReport.listParameters(
+                entry, self.scaleValues, self.options.delay)
+        (user, experiment, device, diode, cellArea,
+            irradiance) = MeasurementReport.listIdentification(entry)
+        if parameters['startV'] * parameters['endV'] > 0:
+            print("The scan range does not cross zero voltage")
+            if self.options.non_crossing_scan == 'skip':
+                return
+
+        if not self.options.no_display:
+            self.jobs.displayDiode(device, diode)
+        if self.options.stability_sweeps:
+            self.runStability(
+                    parameters, user, experiment, device, diode, cellArea,
+                    irradiance)
+            return
+        m = self.measure(
+                parameters, user, experiment, device, diode, cellArea,
+                irradiance)
+        self.save(m, user, experiment, device, diode, cellArea, irradiance,
+                  int(entry[14]))
+        if self.options.track_mpp and float(irradiance):
+            self.trackMpp(
+                    parameters, m, user, experiment, device, diode, cellArea,
+                    irradiance)
+
+    def measure(
+            self, parameters, user, experiment, device, diode, cellArea,
+            irradiance):
+        """ sweeps and analyses an entry, saved in last_measurement.txt """
+        if self.options.adaptive:
+            MeasurementReport.setAdaptiveSweep(
+                    parameters, irradiance,
+                    self.expectedPoints.get((device, diode)))
+        key = MeasurementReport.curveKey(device, diode, irradiance)
+        if self.options.predict_range:
+            MeasurementReport.setPredictedRanging(
+                    parameters, self.previousCurves.get(key))
+
+        voltage, current, details = self.jobs.measureIV(parameters)
+        start = time.time()
+
+        scanSpeed = "%.3g" % self.jobs.smu.scanSpeed(
+                parameters['stepV'], parameters['integrationTime'],
+                parameters['delayTime'])
+        m = ListMeasurement(parameters, self.date, scanSpeed, irradiance)
+        m.voltage, m.current = voltage, current
+        m.timing = details['timing']
+        m.currentRanges = details['currentRanges']
+        voc = MeasurementReport.analyse(m)
+        m.efficiency = MeasurementReport.calcEfficiency(
+                m.maxPower, cellArea, irradiance)
+        savetxt('last_measurement_raw.txt', MeasurementReport.dataColumns(m))
+        MeasurementReport.saveText(
+                m, 'last_measurement.txt', user, experiment, device, diode,
+                cellArea, irradiance)
+        m.timing['analysisTime'] = time.time() - start
+        expected = MeasurementReport.expectedPoints(m, voc, irradiance)
+        if expected is not None:
+            self.expectedPoints[(device, diode)] = expected
+        self.previousCurves[key] = (voltage, current)
+        if float(irradiance) and not MeasurementReport.isVocReached(m, voc):
+            print("Warning: this scan didn't pass by the Voc")
+        return m
+
+    def runStability(
+            self, parameters, user, experiment, device, diode, cellArea,
+            irradiance):
+        """ sweeps the entry --stability-sweeps times, every
+        --stability-interval s, recording the sweeps in the stability
+        files instead of a file each """
+        interval = self.options.stability_interval
+        fileName = MeasurementReport.seriesFileName(
+                os.path.join(user, str(self.date)), experiment, device,
+                diode, irradiance, "stability")
+        run = Stability.StabilityRun(
+                fileName, interval, Stability.stabilityHeader(
+                        parameters, self.date, user, experiment, device,
+                        diode, cellArea, irradiance, interval))
+        try:
+            while run.sweeps < self.options.stability_sweeps:
+                time.sleep(run.waitTime())
+                run.startSweep()
+                row = run.add(self.measure(
+                        dict(parameters), user, experiment, device, diode,
+                        cellArea, irradiance))
+                print("Sweep %d\t%s" % (
+                        run.sweeps, "\t".join("%.4g" % v for v in row)))
+        finally:
+            run.close()
+            self.log.log(
+                    'stability', file=fileName,
+                    **Stability.stabilityRecord(
+                            run, user, experiment, device, diode,
+                            irradiance))
+        print("Stability measurement saved in " + fileName)
+
+    def trackMpp(
+            self, parameters, m, user, experiment, device, diode, cellArea,
+            irradiance):
+        """ tracks the maximum power point from the one of the curve just
+        measured, for the --track-mpp time """
+        parameters = dict(parameters)
+        parameters['voltageMaxPower'] = m.voltageMaxPower
+        parameters['duration'] = self.options.track_mpp
+        fileName = MeasurementReport.seriesFileName(
+                os.path.join(user, str(self.date)), experiment, device,
+                diode, irradiance, "mpp")
+        trace, points = self.jobs.trackMpp(
+                parameters, fileName, MppTracking.trackHeader(
+                        parameters, self.date, user, experiment, device,
+                        diode, cellArea, irradiance))
+        self.log.log('mppTracking', file=fileName, **MppTracking.trackRecord(
+                trace, points, user, experiment, device, diode, irradiance))
+
+    def save(
+            self, m, user, experiment, device, diode, cellArea, irradiance,
+            saveImage):
+        """ the autosave of the GUI """
+        directory = os.path.join(user, str(self.date))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        fileName = os.path.join(directory, MeasurementReport.makeAutoName(
+                experiment, device, diode, irradiance, m.reverseText) +
+                ".txt")
+        if os.path.exists(fileName):
+            policy = self.options.existing_file
+            if policy == 'skip':
+                print("Not saved, file %s already exists" % fileName)
+                return
+            if policy == 'rename':
+                fileName = MeasurementReport.freeFileName(fileName)
+
+        try:
+            start = time.time()
+            if not self.options.no_text_files:
+                MeasurementReport.saveText(
+                        m, fileName, user, experiment, device, diode,
+                        cellArea, irradiance)
+            if self.store is not None:
+                MeasurementReport.storeRecord(
+                        m, self.store, fileName, user, experiment, device,
+                        diode, cellArea, irradiance)
+            m.timing['saveTime'] = time.time() - start
+            print("Measurement saved in " + fileName)
+            if self.results is not None:
+                self.results.insert(**MeasurementReport.resultRecord(
+                        m, fileName, user, experiment, device, diode,
+                        cellArea))
+            self.log.log(
+                    'save', mode='runList', file=fileName,
+                    **MeasurementReport.logRecord(
+                            m, user, experiment, device, diode))
+            MeasurementReport.appendMeasurementsFile(
+                    m, MeasurementReport.measurementsFileName(
+                            m, directory, experiment),
+                    experiment, device, diode)
+        except IOError as e:
+            print("Error while saving: %s" % e)
+            self.errors += 1
+            return
+        print("\t".join((
+                device, diode, m.reverseText, m.jscDensity[0:5],
+                m.voc[0:5], m.ff[0:4], m.efficiency[0:5])))
+
+        if saveImage and self.options.images:
+            # matplotlib is loaded only when the images are required
+            import PlotCanvas
+            PlotCanvas.saveGraph(
+                    directory, os.path.basename(fileName)[:-4], m.voltage,
+                    - m.current * MeasurementReport.CURRENT_UNIT_MULTIPLIER,
+                    m.voltageMaxPower,
+                    m.currentMaxPower *
+                    MeasurementReport.CURRENT_UNIT_MULTIPLIER,
+                    m.voc, float(irradiance) != 0,
+                    m.jsc * MeasurementReport.CURRENT_UNIT_MULTIPLIER,
+                    m.jscDensity, m.ff, m.efficiency)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+            description="Measure the entries of a PyPV list file without "
+            "the graphical interface")
+    parser.add_argument('listFile', help="measurements list file")
+    parser.add_argument(
+            '--address', type=int, default=24,
+            help="GPIB address of the Keithley (default 24)")
+    parser.add_argument(
+            '--simulated', action='store_true',
+            help="measure on a simulated Keithley")
+    parser.add_argument(
+            '--data-format', default='DREAL',
+            choices=sorted(Keithley2400.DATA_FORMATS),
+            help="trace buffer transfer format (default DREAL, SREAL is "
+            "faster but keeps only about 7 digits)")
+    parser.add_argument(
+            '--delay', type=float, default=0.0,
+            help="delay time of each point in s, not part of the list "
+            "(default 0)")
+    parser.add_argument(
+            '--stream-chunk', type=int, default=0,
+            help="stream the sweeps in chunks of this many points")
+    parser.add_argument(
+            '--abort-on-compliance', type=int, default=0,
+            help="abort a streamed sweep after this many consecutive "
+            "points in compliance")
+    parser.add_argument(
+            '--adaptive', action='store_true',
+            help="sweep the illuminated cells with fewer points, dense "
+            "around the expected MPP and Voc")
+    parser.add_argument(
+            '--predict-range', action='store_true',
+            help="with autoscale, use fixed current ranges predicted from "
+            "the previous curve of the diode or from a quick pre-scan")
+    parser.add_argument(
+            '--track-mpp', type=float, default=0,
+            help="after each illuminated entry, track its maximum power "
+            "point for this many s")
+    parser.add_argument(
+            '--stability-sweeps', type=int, default=0,
+            help="sweep each entry this many times in a stability "
+            "measurement, saved in a single file")
+    parser.add_argument(
+            '--stability-interval', type=float, default=60.0,
+            help="s between the starts of the stability sweeps (default "
+            "60)")
+    parser.add_argument(
+            '--non-crossing-scan', default='measure',
+            choices=('measure', 'skip'),
+            help="entries whose scan range does not cross zero voltage "
+            "(default measure)")
+    parser.add_argument(
+            '--existing-file', default='overwrite',
+            choices=('overwrite', 'rename', 'skip'),
+            help="when the file of a measurement already exists (default "
+            "overwrite)")
+    parser.add_argument(
+            '--at-block-end', default='continue',
+            choices=('continue', 'pause', 'stop'),
+            help="after an entry with WaitBeforeNext set (default "
+            "continue)")
+    parser.add_argument(
+            '--on-abort', default='continue', choices=('continue', 'stop'),
+            help="after an aborted measurement (default continue)")
+    parser.add_argument(
+            '--no-display', action='store_true',
+            help="do not show the diode to be connected on the Keithley")
+    parser.add_argument(
+            '--images', action='store_true',
+            help="save the images of the entries with AutoSaveImages set, "
+            "requires matplotlib")
+    parser.add_argument(
+            '--no-text-files', action='store_true',
+            help="do not save the curves as text files")
+    parser.add_argument(
+            '--store', default='measurement_store',
+            help="measurement store folder, empty for none (default "
+            "measurement_store)")
+    parser.add_argument(
+            '--results', default=ResultsDatabase.DATABASE_FILE,
+            help="results database, empty for none (default %s)" % (
+                    ResultsDatabase.DATABASE_FILE))
+    parser.add_argument(
+            '--ui-file', default=UI_FILE,
+            help="GUI file defining the scale values (default %s)" % (
+                    UI_FILE))
+    options = parser.parse_args(arguments)
+
+    # the whole list is checked before anything is measured
+    try:
+        entries = readList(options.listFile)
+    except (IOError, ValueError) as e:
+        parser.error(str(e))
+    try:
+        smu = Keithley2400.K2400(
+                options.address, dataFormat=options.data_format,
+                simulated=options.simulated)
+    except ImportError as e:
+        # no VISA, only the simulated Keithley can be used
+        parser.error("%s, install PyVISA or use --simulated" % e)
+    jobs = MeasurementJobs.MeasurementJobs(
+            smu, options.stream_chunk, options.abort_on_compliance)
+    runner = ListRunner(jobs, options)
+    runner.run(options.listFile, entries)
+    return 1 if runner.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Stability measurements: the I-V sweep of a cell repeated at a fixed
+# interval, for days. Instead of a text file and a table row per sweep,
+# the figures of merit of every sweep are appended to a single file as
+# soon as the sweep is analysed and the curves to a second one, while the
+# memory keeps only a TimeSeries.DownsampledSeries of the figures of
+# merit: the last RECENT_POINTS sweeps and the older ones in at most
+# MAX_BINS bins of minimum, maximum and mean.
+
+from numpy import *
+import time
+
+import TimeSeries
+
+STABILITY_COLUMNS = ('Time_s', 'Jsc_mA/cm2', 'Voc_V', 'FF', 'PCE_%')
+CURVE_COLUMNS = ('Sweep', 'Voltage_V', 'Current_mA')
+RECENT_POINTS = 500
+MAX_BINS = 500
+# sweeps per bin at first, doubled every time the bins are merged
+BIN_POINTS = 4
+
+
+def curvesFileName(fileName):
+    """ file of the curves of the stability file fileName """
+    base, extension = fileName.rsplit('.', 1)
+    return base + "-curves." + extension
+
+
+class StabilityRun():
+    """ schedule and records of a stability measurement whose sweeps start
+    every interval s """
+    def __init__(self, fileName, interval, header=()):
+        self.fileName = fileName
+        self.interval = interval
+        self.writer = TimeSeries.SeriesWriter(
+                fileName, STABILITY_COLUMNS, header)
+        self.curvesFile = open(curvesFileName(fileName), 'w')
+        savetxt(self.curvesFile, list(header) + ["\t".join(CURVE_COLUMNS)],
+                fmt='%s')
+        self.history = TimeSeries.DownsampledSeries(
+                len(STABILITY_COLUMNS), RECENT_POINTS, MAX_BINS, BIN_POINTS)
+        self.start = time.time()
+        self.sweepStart = self.start
+        self.sweeps = 0
+
+    def waitTime(self):
+        """ s before the next sweep is due, 0 if it is late """
+        return max(
+                0.0, self.start + self.sweeps * self.interval - time.time())
+
+    def startSweep(self):
+        self.sweepStart = time.time()
+
+    def add(self, m):
+        """ records the analysed sweep m, with the attributes set by
+        MeasurementReport.analyse and the efficiency, returns its row """
+        row = (
+                self.sweepStart - self.start, float(m.jscDensity),
+                float(m.voc), float(m.ff), float(m.efficiency))
+        self.writer.append(row)
+        self.history.append(row)
+        savetxt(
+                self.curvesFile, transpose((
+                        ones(len(m.voltage)) * self.sweeps, m.voltage,
+                        m.current * 1000)), fmt='%g', delimiter='\t')
+        self.curvesFile.flush()
+        self.sweeps += 1
+        return row
+
+    def close(self):
+        self.writer.close()
+        self.curvesFile.close()
+
+
+def stabilityHeader(
+        parameters, date, user, experiment, device, diode, cellArea,
+        irradiance, interval):
+    """ header of the stability files, from the sweep parameters """
+    if parameters['reverse']:
+        reverseText = "reverse"
+    else:
+        reverseText = "forward"
+    return (
+            "PyPV software (Gr. E. Palomares, ICIQ) - Stability "
+            "measurement Report", "User:	" + user,
+            "Date:	" + str(date), "Experiment:	" + experiment,
+            "Device:	" + device, "Diode:	" + diode,
+            "Forward or reverse? " + reverseText,
+            "Lowest Voltage (V):	" + str(parameters['startV']),
+            "Highest Voltage (V): " + str(parameters['endV']),
+            "Voltage Step (V):	" + str(parameters['stepV']),
+            "Compliance (A):	" + str(parameters['compliance']),
+            "Scale (A):	" + str(parameters['scale']),
+            "Integration Time:	" + str(parameters['integrationTime']),
+            "Delay Time (s):	" + str(parameters['delayTime']),
+            "Sweep Interval (s):	" + str(interval),
+            "Cell Area (cm2):	" + cellArea,
+            "Irradiance (mW/cm2):	" + irradiance)
+
+
+def stabilityRecord(run, user, experiment, device, diode, irradiance):
+    """ fields of the log record of a stability measurement, with the
+    figures of merit of its last sweep """
+    record = {
+            'user': str(user), 'experiment': str(experiment),
+            'device': str(device), 'diode': str(diode),
+            'irradiance': float(irradiance), 'sweeps': run.sweeps,
+            'interval': run.interval,
+            'curvesFile': curvesFileName(run.fileName)}
+    if len(run.history):
+        last = run.history.recent.data()[:, -1]
+        for name, value in zip(
+                ('duration', 'jscDensity', 'voc', 'ff', 'efficiency'),
+                last):
+            record[name] = float(value)
+    return record
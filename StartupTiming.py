@@ -0,0 +1,47 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Times of the startup steps, measured from the import of this module
+# (the first one done by PyPV.py). The report is printed and appended as
+# a line to STARTUP_LOG_FILE, so that slower startups can be spotted.
+
+import datetime
+import time
+
+STARTUP_LOG_FILE = "startup_times.txt"
+
+start = time.time()
+marks = []
+
+
+def mark(step):
+    """ records the time elapsed until the end of step """
+    marks.append((step, time.time() - start))
+
+
+def report(fileName=STARTUP_LOG_FILE):
+    print("Startup times (s):")
+    for step, elapsed in marks:
+        print("  %-24s %6.2f" % (step, elapsed))
+    line = "\t".join(
+            [datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")] +
+            ["%s %.2f" % (step, elapsed) for step, elapsed in marks])
+    try:
+        with open(fileName, 'a') as f:
+            f.write(line + "\n")
+    except IOError as e:
+        print("Cannot write the startup times: %s" % e)
@@ -0,0 +1,174 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Fixed size buffers of the rows of a time series (time first, then the
+# measured values) for the displays of the long measurements: their
+# memory is allocated once, whatever the number of rows appended. The
+# rows are saved as they come by a SeriesWriter.
+
+from numpy import *
+
+
+class RingBuffer():
+    """ the last maxPoints rows appended """
+    def __init__(self, maxPoints, columns):
+        self.rows = zeros((maxPoints, columns))
+        self.count = 0
+        self.next = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row):
+        self.rows[self.next] = row
+        self.next = (self.next + 1) % len(self.rows)
+        self.count = min(self.count + 1, len(self.rows))
+
+    def data(self):
+        """ copy of the rows kept, oldest first, as columns """
+        if self.count < len(self.rows):
+            return self.rows[:self.count].T.copy()
+        return roll(self.rows, - self.next, axis=0).T
+
+
+class SeriesWriter():
+    """ text file of the rows, written and flushed every chunkPoints rows
+    from a preallocated chunk, the columns are multiplied by multipliers
+    (e.g. for saving in mA) """
+    def __init__(
+            self, fileName, columns, header=(), chunkPoints=1,
+            multipliers=None):
+        self.fileName = fileName
+        self.file = open(fileName, 'w')
+        savetxt(self.file, list(header) + ["\t".join(columns)], fmt='%s')
+        self.chunk = zeros((chunkPoints, len(columns)))
+        if multipliers is None:
+            multipliers = ones(len(columns))
+        self.multipliers = asarray(multipliers)
+        self.count = 0
+        self.points = 0
+
+    def append(self, row):
+        self.chunk[self.count] = row
+        self.count += 1
+        self.points += 1
+        if self.count == len(self.chunk):
+            self.flush()
+
+    def flush(self):
+        savetxt(
+                self.file, self.chunk[:self.count] * self.multipliers,
+                fmt='%g', delimiter='\t')
+        self.file.flush()
+        self.count = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class DecimatedTrace():
+    """ at most maxPoints of the rows appended, evenly spaced: when it is
+    full every other row is dropped and the next rows are kept twice as
+    sparsely """
+    def __init__(self, maxPoints, columns):
+        self.rows = zeros((maxPoints - maxPoints % 2, columns))
+        self.count = 0
+        self.stride = 1
+        self.appended = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row):
+        if self.appended % self.stride == 0:
+            if self.count == len(self.rows):
+                half = len(self.rows) // 2
+                self.rows[:half] = self.rows[::2]
+                self.count = half
+                self.stride *= 2
+            if self.appended % self.stride == 0:
+                self.rows[self.count] = row
+                self.count += 1
+        self.appended += 1
+
+    def data(self):
+        """ copy of the rows kept, as columns """
+        return self.rows[:self.count].T.copy()
+
+
+class DownsampledSeries():
+    """ the last recentPoints rows as they are and the older ones in at
+    most maxBins bins of binPoints rows, with the minimum, maximum and
+    mean of each column. When the bins are full adjacent bins are merged
+    in pairs, so the older rows get coarser while the memory used stays
+    the same. """
+    def __init__(self, columns, recentPoints, maxBins, binPoints):
+        self.recent = RingBuffer(recentPoints, columns)
+        maxBins -= maxBins % 2
+        self.minimum = zeros((maxBins, columns))
+        self.maximum = zeros((maxBins, columns))
+        self.total = zeros((maxBins, columns))
+        self.counts = zeros(maxBins, dtype=int)
+        self.bins = 0
+        self.binPoints = binPoints
+
+    def __len__(self):
+        return int(self.counts[:self.bins].sum()) + len(self.recent)
+
+    def append(self, row):
+        if len(self.recent) == len(self.recent.rows):
+            # the oldest recent row is going to be overwritten
+            self.addToBins(self.recent.rows[self.recent.next].copy())
+        self.recent.append(row)
+
+    def addToBins(self, row):
+        if not self.bins or self.counts[self.bins - 1] >= self.binPoints:
+            if self.bins == len(self.counts):
+                self.mergeBins()
+            self.minimum[self.bins] = row
+            self.maximum[self.bins] = row
+            self.total[self.bins] = 0
+            self.counts[self.bins] = 0
+            self.bins += 1
+        last = self.bins - 1
+        self.minimum[last] = minimum(self.minimum[last], row)
+        self.maximum[last] = maximum(self.maximum[last], row)
+        self.total[last] += row
+        self.counts[last] += 1
+
+    def mergeBins(self):
+        half = len(self.counts) // 2
+        self.minimum[:half] = minimum(
+                self.minimum[0::2], self.minimum[1::2])
+        self.maximum[:half] = maximum(
+                self.maximum[0::2], self.maximum[1::2])
+        self.total[:half] = self.total[0::2] + self.total[1::2]
+        self.counts[:half] = self.counts[0::2] + self.counts[1::2]
+        self.bins = half
+        self.binPoints *= 2
+
+    def data(self):
+        """ mean, minimum and maximum of the bins followed by the recent
+        rows (for which they are the same), as columns """
+        recent = self.recent.data()
+        counts = self.counts[:self.bins, newaxis]
+        binned = (
+                self.total[:self.bins] / counts,
+                self.minimum[:self.bins], self.maximum[:self.bins])
+        return tuple(
+                concatenate((values.T, recent), axis=1) for values in binned)
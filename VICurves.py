@@ -57,30 +57,69 @@ def calcVoc(voltage, current):
     return voc
 
 
-def calcSeriesResistance(voltage, current, compliance, reverse):
+def adaptiveVoltages(startV, endV, fineStep, coarseStep, centers, halfWidth):
+    """ voltages from startV to endV, in this order, spaced by coarseStep
+    and by fineStep within halfWidth of the centers (e.g. the expected
+    MPP and Voc voltages), including 0 V when in range """
+    low, high = min(startV, endV), max(startV, endV)
+    grids = [arange(low, high, coarseStep), [low, high]]
+    if low < 0 < high:
+        grids.append([0.0])
+    for center in centers:
+        if center is None:
+            continue
+        start = max(low, center - halfWidth)
+        stop = min(high, center + halfWidth)
+        if start < stop:
+            grids.append(arange(start, stop, fineStep))
+            grids.append([stop])
+    voltages = unique(around(concatenate(grids), 6))
+    # points closer than half a fine step to the previous one are merged,
+    # the last one is replaced by the end of the range
+    voltages = voltages[concatenate(([True], diff(voltages) >= fineStep / 2))]
+    voltages[-1] = high
+    if endV < startV:
+        voltages = voltages[::-1]
+    return voltages
+
+
+def calcSeriesResistance(
+        voltage, current, compliance, reverse, fitQuality=False):
+    """ series resistance from the slope of the last five points of the
+    curve strictly decreasing and not in compliance, trimming the curve
+    two points at a time while the sixth from the end is not positive.
+    With fitQuality returns also the R squared of that linear fit. """
     seriesResistance = "NotFound"
+    rSquared = "NotFound"
+    voltage = asarray(voltage, dtype=float)
+    current = asarray(current, dtype=float)
     if reverse:
         current = current[::-1]
         voltage = voltage[::-1]
 
-    while len(voltage) > 6:
-        length = len(voltage)
-        if current[length - 6] > 0:
-            break
-        if (
-                (current[length - 5] > current[length - 4]) &
-                (current[length - 4] > current[length - 3]) &
-                (current[length - 3] > current[length - 2]) &
-                (current[length - 2] > current[length - 1]) &
-                (current[length - 1] > - compliance)):
-            voltageSR = voltage[length-5:length]
-            currentSR = current[length-5:length]
-            fitSR = polyfit(voltageSR, currentSR, 1)
-            seriesResistance = - 1 / fitSR[0]
-            break
-        else:
-            current = current[0:length - 2]
-            voltage = voltage[0:length - 2]
+    # candidate curve lengths, in the order the trimming would try them
+    ends = arange(len(current), 6, -2)
+    if len(ends):
+        decreasing = current[:-1] > current[1:]
+        fourDecreasing = convolve(decreasing, ones(4), 'valid') == 4
+        qualifies = (
+                fourDecreasing[ends - 5] & (current[ends - 1] > - compliance))
+        stops = current[ends - 6] > 0
+        decided = qualifies | stops
+        if decided.any():
+            first = decided.argmax()
+            if not stops[first]:
+                end = ends[first]
+                voltageSR = voltage[end-5:end]
+                currentSR = current[end-5:end]
+                fitSR = polyfit(voltageSR, currentSR, 1)
+                seriesResistance = - 1 / fitSR[0]
+                residuals = currentSR - polyval(fitSR, voltageSR)
+                deviations = currentSR - currentSR.mean()
+                rSquared = 1 - (
+                        (residuals ** 2).sum() / (deviations ** 2).sum())
+    if fitQuality:
+        return seriesResistance, rSquared
     return seriesResistance
 
 
@@ -93,3 +132,96 @@ def calcParallelResistance(voltage, current):
     fitPR = polyfit(voltagePR, currentPR, 1)
     parallelResistance = - 1 / fitPR[0]
     return parallelResistance
+
+
+def stackCurves(curves):
+    """ pads a list of 1-D arrays of different lengths in a 2-D array,
+    returns the array and the lengths """
+    lengths = array([len(curve) for curve in curves], dtype=int)
+    stacked = zeros((len(curves), lengths.max()))
+    for i, curve in enumerate(curves):
+        stacked[i, :lengths[i]] = curve
+    return stacked, lengths
+
+
+def extractdataBatch(voltage, current, lengths=None):
+    """ extractdata for many curves at once
+
+    voltage and current are 2-D arrays with one curve per row, the first
+    lengths[i] points of row i being valid, or lists of 1-D arrays.
+    Returns arrays of maxPower, jsc, voc, ff, voltageMaxPower and
+    currentMaxPower. """
+    if lengths is None and not (
+            isinstance(voltage, ndarray) and voltage.ndim == 2):
+        voltage, lengths = stackCurves(voltage)
+        current, lengths = stackCurves(current)
+    voltage = asarray(voltage, dtype=float)
+    current = asarray(current, dtype=float)
+    if lengths is None:
+        lengths = ones(len(voltage), dtype=int) * voltage.shape[1]
+    lengths = asarray(lengths, dtype=int)
+    valid = arange(voltage.shape[1]) < lengths[:, newaxis]
+    voltage = where(valid, voltage, 0)
+    current = where(valid, current, 0)
+
+    maxPower, voltageMaxPower, currentMaxPower = calcPowerBatch(
+            voltage, current, valid)
+    jsc = calcJscBatch(voltage, current, valid)
+    voc = calcVocBatch(voltage, current, valid)
+    ff = maxPower / (jsc * voc)
+    return maxPower, jsc, voc, ff, voltageMaxPower, currentMaxPower
+
+
+def calcPowerBatch(voltage, current, valid):
+    power = where(valid, voltage * current, -inf)
+    indexMaxPower = power.argmax(axis=1)
+    rows = arange(len(power))
+    maxPower = power[rows, indexMaxPower]
+    voltageMaxPower = voltage[rows, indexMaxPower]
+    currentMaxPower = current[rows, indexMaxPower]
+    return maxPower, voltageMaxPower, currentMaxPower
+
+
+def calcJscBatch(voltage, current, valid):
+    return quadraticInterceptBatch(voltage, current, valid)
+
+
+def calcVocBatch(voltage, current, valid):
+    return quadraticInterceptBatch(current, voltage, valid)
+
+
+def quadraticInterceptBatch(x, y, valid, halfWidth=3):
+    """ value at x = 0 of the parabolas fitted, as in calcJsc and calcVoc,
+    on the points around the point of each row where x is nearest to zero,
+    solving all the least squares problems together, nan for the rows
+    without a parabola """
+    position = where(valid, abs(x), inf).argmin(axis=1)
+    lengths = valid.sum(axis=1)
+    start = maximum(position - halfWidth, 0)
+    stop = minimum(position + halfWidth, lengths)
+    index = arange(x.shape[1])
+    window = (index >= start[:, newaxis]) & (index < stop[:, newaxis])
+    weight = window.astype(float)
+    count = weight.sum(axis=1)
+
+    # center and scale x in each window to keep the normal equations
+    # well conditioned
+    center = (x * weight).sum(axis=1) / count
+    scale = where(window, abs(x - center[:, newaxis]), 0).max(axis=1)
+    scale[scale == 0] = 1
+    t = (x - center[:, newaxis]) / scale[:, newaxis]
+    basis = array([t ** 2, t, ones_like(t)]) * weight
+    normal = einsum('irp,jrp->rij', basis, basis)
+    rightHandSide = einsum('irp,rp->ri', basis, y)
+    # the windows with less than three distinct x (e.g. a current clipped
+    # at the compliance, or too few points) define no parabola, they get
+    # nan instead of stopping the solution of the other ones
+    degenerate = linalg.matrix_rank(normal) < 3
+    normal[degenerate] = eye(3)
+    coefficients = linalg.solve(normal, rightHandSide[..., newaxis])[..., 0]
+    t0 = - center / scale
+    intercept = (
+            coefficients[:, 0] * t0 ** 2 + coefficients[:, 1] * t0 +
+            coefficients[:, 2])
+    intercept[degenerate] = nan
+    return intercept
@@ -16,73 +16,83 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt4 import uic
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
-import matplotlib.pyplot as plt
 from numpy import *
 import os
 import unicodedata
-import VICurves
-from time import sleep
+from time import sleep, time
 import datetime
-from multiprocessing import Process
+from collections import deque
 
+import Hysteresis
 import Keithley2400
+import MeasurementScheduler
+import MeasurementStore
+import MeasurementFile
+import MeasurementReport
+import MeasurementLog
+import MppTracking
+import ResultsDatabase
+import Stability
+import CompiledUi
+import StartupTiming
 TEST_MODE = False   # for test mode comment out also "import Keithley2400"
+# measure a simulated diode through the Keithley2400 code, no VISA needed
+SIMULATED_INSTRUMENT = False
 
 
-(Ui_MainWindow, QMainWindow) = uic.loadUiType('mainwindow.ui')
+(Ui_MainWindow, QMainWindow) = CompiledUi.loadUiType('mainwindow.ui')
 
 NUM_CURRENT_POINTS = 3
-CURRENT_POSITIVE = 0
-IRRADIANCE_UNIT_MULTIPLIER = 0.001
-
-
-def plot_graph(
-        imageName, voltage, adjCurrent, voltageMaxPower,
-        currentMaxPower, Voc, printVoc, Jsc, JscDensity, FF, efficiency,
-        saveImage, directory):
-    fig = plt.figure(imageName)
-    fig.suptitle(imageName, fontsize=14, fontweight='bold')
-    ax = fig.add_subplot(111)
-    fig.subplots_adjust(top=0.85)
-    ax.set_xlabel('Voltage (V)')
-    ax.set_ylabel('Current (mA)')
-    ax.plot(voltage, adjCurrent)
-    ax.plot(voltageMaxPower, currentMaxPower, 'ro')
-    if printVoc:
-        ax.plot(Voc, 0, 'r+')
-    ax.plot(0, Jsc, 'r+')
-    ax.axhline(0, color='k')
-    ax.axvline(0, color='k')
-    ymin, ymax = plt.ylim()
-    ax.set_yticks(
-            arange(
-                    int(min(minimum(adjCurrent, -2)) * 2),
-                    int(max(maximum(adjCurrent, 2)) * 2), 0.5),
-            minor='True')
-    ax.yaxis.grid(True, which='minor')
-    ax.set_ylim(ymin, ymax)
-    xmin, xmax = plt.xlim()
-    ax.set_xticks(arange(-20, 20, 0.2), minor='True')
-    ax.xaxis.grid(True, which='minor')
-    ax.set_xlim(xmin, xmax)
-
-    legend = (
-            "Voc " + Voc + " V\nJsc " + JscDensity + " mA/cm2\nFF " + FF +
-            "\nEfficiency " + efficiency + " %")
-    ax.text(
-            0.05, 0.05, legend, verticalalignment='bottom',
-            horizontalalignment='left', transform=ax.transAxes, fontsize=14,
-            bbox=dict(facecolor='pink', alpha=0.9, pad=10))
-
-    if saveImage:
-        imageNameWithDirectory = os.path.join(directory, imageName)
-        plt.savefig(imageNameWithDirectory + ".png")
-        plt.close()
-    else:
-        plt.show()
+CURRENT_POSITIVE = MeasurementReport.CURRENT_POSITIVE
+# trace buffer transfer format: 'ASCII', or 'DREAL'/'SREAL' for binary,
+# SREAL is the fastest but keeps only about 7 significant digits
+SMU_DATA_FORMAT = 'DREAL'
+# GPIB addresses of the Keithleys, list entries are spread over them by
+# the optional instrument column or by device, single measurements use
+# the first one
+SMU_ADDRESSES = (24,)
+# list entries acquired ahead while the previous ones are being processed
+LIST_PIPELINE_DEPTH = 2
+# directory of the binary store where the saved curves are appended with
+# their metadata (see MeasurementStore.py), None disables it
+MEASUREMENT_STORE_DIRECTORY = 'measurement_store'
+# save each curve also as a text file in <user>/<date>/ when autosaving
+SAVE_TEXT_FILES = True
+# SQLite database of the results of the saved curves, today's ones are
+# shown in the table at startup, None disables it
+RESULTS_DATABASE_FILE = ResultsDatabase.DATABASE_FILE
+# results table columns: database column and format
+TABLE_COLUMNS = (
+        ('device', '%s'), ('diode', '%s'), ('direction', '%s'),
+        ('jscDensity', '%.4g'), ('voc', '%.4g'), ('ff', '%.3g'),
+        ('efficiency', '%.4g'), ('integrationTime', '%g'),
+        ('delayTime', '%g'), ('irradiance', '%g'),
+        ('hysteresisIndex', '%.3g'))
+# curves overlaid in the embedded plot and width given to it
+PLOT_OVERLAID_CURVES = 5
+PLOT_DOCK_WIDTH = 500
+# I-V sweeps streamed in chunks of this many points (at most 100) so that
+# the plot and the LCDs follow the sweep, 0 reads the whole sweep at once
+STREAM_CHUNK_POINTS = 10
+# abort a streamed sweep after this many consecutive points in
+# compliance (e.g. a shorted cell), 0 never aborts
+ABORT_ON_COMPLIANCE_POINTS = 0
+# illuminated cells swept with fewer points, dense around the MPP and the
+# Voc of the previous curve of the diode (or of a quick Voc measurement)
+ADAPTIVE_SWEEP = False
+# with autoscale, fixed current ranges predicted from the previous curve
+# of the diode (or from a quick pre-scan) instead of the autorange
+PREDICTIVE_RANGING = False
+# s of maximum power point tracking, 0 tracks until Stop is pressed
+MPP_TRACKING_DURATION = 0
+# "Measure Voc" monitor: integration time (in NPLC) of the readings and
+# number of readings averaged by the Keithley for each displayed value
+VOC_MONITOR_INTEGRATION_TIME = 1
+VOC_MONITOR_AVERAGE = 5
+# default s between the starts of the sweeps of a stability measurement
+STABILITY_INTERVAL = 60
 
 
 class MainWindow (QMainWindow):
@@ -90,9 +100,6 @@ class MainWindow (QMainWindow):
 
     def __init__(self, parent=None):
 
-        if not TEST_MODE:
-            print("Checking if Keithley is connected...")
-
         QMainWindow.__init__(self, parent)
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
@@ -112,6 +119,9 @@ class MainWindow (QMainWindow):
         self.connect(
                 self.ui.stopButton, SIGNAL('clicked()'),
                 SLOT('clickStop()'))
+        self.connect(
+                self.ui.trackMppButton, SIGNAL('clicked()'),
+                SLOT('clickTrackMpp()'))
         self.connect(
                 self.ui.saveAsButton, SIGNAL('clicked()'),
                 SLOT('clickSaveAs()'))
@@ -121,6 +131,9 @@ class MainWindow (QMainWindow):
         self.connect(
                 self.ui.runListButton, SIGNAL('clicked()'),
                 SLOT('clickRunList()'))
+        self.connect(
+                self.ui.stabilityButton, SIGNAL('clicked()'),
+                SLOT('clickStability()'))
         self.connect(
                 self.ui.runAutoMeasureButton, SIGNAL('clicked()'),
                 SLOT('clickAutoMeasure()'))
@@ -138,31 +151,134 @@ class MainWindow (QMainWindow):
                 SLOT('calcScanSpeed()'))
 
         self.isTriggerOpen = False
+        # instrument jobs results by job id, the event loops waiting for
+        # them and the ids of the jobs nobody waits for
+        self.jobResults = {}
+        self.jobLoops = []
+        self.unwaitedJobs = set()
+        # id of the sweep job being waited for, its streamed points are
+        # shown on the LCDs too
+        self.measureJobId = None
+        # time in s spent in the steps of the last measurement, logged
+        self.timing = {}
+        # (Voc, MPP voltage) of the last illuminated curve of each
+        # (device, diode), for the adaptive sweeps
+        self.expectedPoints = {}
+        # last curve of each diode, dark and light apart, and the current
+        # ranges of the last measurement, for the predictive ranging
+        self.previousCurves = {}
+        self.currentRanges = None
+        # the Keithleys are opened on the worker threads once the window
+        # is shown, the jobs submitted meanwhile wait for the connection
+        self.connectJobs = set()
         if not TEST_MODE:
-            self.smu = Keithley2400.K2400()
-            self.smu.text("Welcome to PyPV")
-            self.smu.subtext("")
-            self.smu.shutterClose()
-            sleep(2)
-            self.smu.setlocal()
+            self.scheduler = MeasurementScheduler.MeasurementScheduler(
+                    SMU_ADDRESSES, SMU_DATA_FORMAT, SIMULATED_INSTRUMENT,
+                    STREAM_CHUNK_POINTS, ABORT_ON_COMPLIANCE_POINTS)
+            self.scheduler.jobFinished.connect(self.jobFinished)
+            self.scheduler.progress.connect(self.showProgress)
+            self.scheduler.points.connect(self.showPoints)
+            self.scheduler.track.connect(self.showTrack)
+            QTimer.singleShot(0, self.connectInstruments)
+        else:
+            QTimer.singleShot(0, StartupTiming.report)
         self.currentUnitMultiplier = 1000
-        self.ui.data_table.setColumnCount(10)
+        self.ui.data_table.setColumnCount(len(TABLE_COLUMNS))
         labels = (
                 'Device', 'Diode', 'Reverse?', 'Jsc', 'Voc', 'FF',
-                'efficiency', 'int time', 'delay', 'irradiance')
+                'efficiency', 'int time', 'delay', 'irradiance',
+                'hysteresis')
         self.ui.data_table.setHorizontalHeaderLabels(labels)
         self.date = datetime.date.today()
         self.showImage = 1
-        self.currentImagePid = 0
-        self.terminateCurrentImage = 0
+        # the canvas, and matplotlib with it, is loaded with the first curve
+        self.plotCanvas = None
+        self.plotDock = QDockWidget("I-V curves", self)
+        self.plotDock.setObjectName("plotDock")
+        self.plotDock.setWidget(QLabel("No curves yet"))
+        self.addDockWidget(Qt.RightDockWidgetArea, self.plotDock)
+        # the maximum power point tracking and the Voc monitor get their
+        # own dock when started
+        self.trackCanvas = None
+        self.trackTitle = ""
+        self.monitorJobId = None
+        self.stabilityCanvas = None
+        self.resize(self.width() + PLOT_DOCK_WIDTH, self.height())
+
+        if MEASUREMENT_STORE_DIRECTORY:
+            self.store = MeasurementStore.MeasurementStore(
+                    MEASUREMENT_STORE_DIRECTORY)
+        else:
+            self.store = None
+        self.tableFiles = []
+        if RESULTS_DATABASE_FILE:
+            self.results = ResultsDatabase.ResultsDatabase(
+                    RESULTS_DATABASE_FILE)
+            self.loadTable(self.results.query(date=str(self.date)))
+        else:
+            self.results = None
 
         self.unsavedData = False
-        logHeader = self.date, ""
-        with open("measurements_log.txt", 'a') as f_handle:
-            savetxt(f_handle, logHeader, fmt='%s')
+        self.log = MeasurementLog.MeasurementLog()
+        self.log.log('start', date=str(self.date))
 
         self.calcScanSpeed()
 
+    @pyqtSlot()
+    def connectInstruments(self):
+        print("Checking if Keithley is connected...")
+        self.connectJobs.update(self.scheduler.connectInstruments())
+        self.unwaitedJobs.update(self.scheduler.broadcast('welcome'))
+
+    def instrumentConnected(self, error):
+        if error is not None:
+            QMessageBox.warning(
+                    self, "Keithley not connected",
+                    "The Keithley could not be opened: %s" % str(error),
+                    QMessageBox.Ok, QMessageBox.Ok)
+        if not self.connectJobs:
+            StartupTiming.mark("instruments connected")
+            StartupTiming.report()
+
+    def getPlotCanvas(self):
+        if self.plotCanvas is None:
+            import PlotCanvas
+            self.plotCanvas = PlotCanvas.IVPlotCanvas(
+                    self, PLOT_OVERLAID_CURVES)
+            self.plotDock.setWidget(self.plotCanvas)
+        return self.plotCanvas
+
+    def getTrackCanvas(self):
+        if self.trackCanvas is None:
+            import PlotCanvas
+            self.trackCanvas = PlotCanvas.TrackPlotCanvas(self)
+            trackDock = QDockWidget("Tracking", self)
+            trackDock.setObjectName("trackDock")
+            trackDock.setWidget(self.trackCanvas)
+            self.tabifyDockWidget(self.plotDock, trackDock)
+            trackDock.raise_()
+        return self.trackCanvas
+
+    def getStabilityCanvas(self):
+        if self.stabilityCanvas is None:
+            import PlotCanvas
+            self.stabilityCanvas = PlotCanvas.StabilityPlotCanvas(self)
+            stabilityDock = QDockWidget("Stability", self)
+            stabilityDock.setObjectName("stabilityDock")
+            stabilityDock.setWidget(self.stabilityCanvas)
+            self.tabifyDockWidget(self.plotDock, stabilityDock)
+            stabilityDock.raise_()
+        return self.stabilityCanvas
+
+    def closeEvent(self, event):
+        if not TEST_MODE:
+            self.scheduler.cancel()
+            self.scheduler.quit()
+        self.log.close()
+        if self.results is not None:
+            self.results.close()
+        QMainWindow.closeEvent(self, event)
+
     def applyConf(self, conf, extendedConf):
         self.ui.user_edit.setText(str(conf[0]))
         self.ui.experiment_edit.setText(str(conf[1]))
@@ -181,8 +297,8 @@ class MainWindow (QMainWindow):
             self.ui.diode_spin.setValue(int(conf[12]))
             self.ui.reverse_check.setCheckState(int(conf[13]))
             self.ui.autoSaveImages_check.setCheckState(int(conf[14]))
-            self.ui.preDelayOff_edit.setText(int(conf[15]))
-            self.ui.preDelayOn_edit.setText(int(conf[16]))
+            self.ui.preDelayOff_edit.setText(str(conf[15]))
+            self.ui.preDelayOn_edit.setText(str(conf[16]))
 
     def __del__(self):
         print("Saving conf...")
@@ -207,29 +323,19 @@ class MainWindow (QMainWindow):
 
     @pyqtSlot()
     def clickMeasure_IV(self):
+        """ measures and shows a curve, returns True if it was measured """
         self.ui.LCD_Jsc.setDigitCount(5)
         self.ui.LCD_Voc.setDigitCount(5)
         self.ui.LCD_PCE.setDigitCount(5)
         self.ui.LCD_FF.setDigitCount(5)
 
-        try:
-            self.startV = float(self.ui.startV_edit.text())
-            self.endV = float(self.ui.endV_edit.text())
-            self.reverse = int(self.ui.reverse_check.isChecked())
-            self.stepV = float(self.ui.stepV_edit.text())
-            self.compliance = float(self.ui.compliance_edit.text())
-            autoScale = int(self.ui.autoScale_check.isChecked())
-            if autoScale:
-                self.scale = False
-            else:
-                self.scale = float(self.ui.scale_combo.currentText())
-            self.integrationTime = float(self.ui.integrationTime_edit.text())
-            self.delayTime = float(self.ui.delayTime_edit.text())
-            self.cellArea = float(self.ui.cellArea_edit.text())
-            self.preDelayOff = float(self.ui.preDelayOff_edit.text())
-            self.preDelayOn = float(self.ui.preDelayOn_edit.text())
-        except:
-            print "Values must be valid numbers"
+        parameters = self.getMeasurementParameters()
+        if parameters is None:
+            return False
+        (user, experiment, device, diode, cellArea,
+            irradiance) = self.getDeviceIdentification()
+        self.prepareSweep(parameters, device, diode, irradiance)
+        self.applyParameters(parameters)
 
         if self.unsavedData:
             unsavedAnswer = QMessageBox.warning(
@@ -240,7 +346,71 @@ class MainWindow (QMainWindow):
             if unsavedAnswer == QMessageBox.Yes:
                 self.unsavedData = False
 
-        endVstartV = self.startV * self.endV
+        crossingZero = self.confirmScanRange(parameters)
+
+        if crossingZero and not self.unsavedData:
+            if TEST_MODE:
+                testFile = "test/good-1-1-reverse.txt"
+                # testFile = "test/bad-1-1-forward.txt"
+                # testFile = "test/ugly-1-1-forward.txt"
+                metadata, self.voltage, self.current = (
+                        MeasurementFile.readMeasurement(testFile))
+                self.timing = {}
+                self.currentRanges = None
+            else:
+                self.isTriggerOpen = True
+                self.scheduler.clearStop()
+                self.measureJobId = self.scheduler.submit(
+                        'measureIV', parameters)
+                try:
+                    self.voltage, self.current, details = self.waitJob(
+                            self.measureJobId)
+                except Exception as e:
+                    self.measurementFailed(e)
+                    return False
+                self.timing = details['timing']
+                self.currentRanges = details['currentRanges']
+            self.processMeasurement()
+            return True
+        return False
+
+    def getMeasurementParameters(self):
+        """ reads the sweep parameters from the GUI fields """
+        try:
+            autoScale = int(self.ui.autoScale_check.isChecked())
+            if autoScale:
+                scale = False
+            else:
+                scale = float(self.ui.scale_combo.currentText())
+            parameters = {
+                    'startV': float(self.ui.startV_edit.text()),
+                    'endV': float(self.ui.endV_edit.text()),
+                    'reverse': int(self.ui.reverse_check.isChecked()),
+                    'stepV': float(self.ui.stepV_edit.text()),
+                    'compliance': float(self.ui.compliance_edit.text()),
+                    'scale': scale,
+                    'integrationTime': float(
+                            self.ui.integrationTime_edit.text()),
+                    'delayTime': float(self.ui.delayTime_edit.text()),
+                    'cellArea': float(self.ui.cellArea_edit.text()),
+                    'preDelayOff': float(self.ui.preDelayOff_edit.text()),
+                    'preDelayOn': float(self.ui.preDelayOn_edit.text())}
+        except ValueError:
+            print "Values must be valid numbers"
+            return None
+        return parameters
+
+    def getListParameters(self, conf):
+        """ sweep parameters of a list entry, as getMeasurementParameters
+        would read them after applyConf(conf, 1) """
+        scaleValues = [
+                self.ui.scale_combo.itemText(i)
+                for i in range(self.ui.scale_combo.count())]
+        return MeasurementReport.listParameters(
+                conf, scaleValues, self.ui.delayTime_edit.text())
+
+    def confirmScanRange(self, parameters):
+        endVstartV = parameters['startV'] * parameters['endV']
         if endVstartV <= 0:
             crossingZero = True
         else:
@@ -253,97 +423,64 @@ class MainWindow (QMainWindow):
                     QMessageBox.Yes | QMessageBox.Abort, QMessageBox.Yes)
             if crossingAnswer == QMessageBox.Yes:
                 crossingZero = True
+        return crossingZero
+
+    def prepareSweep(self, parameters, device, diode, irradiance):
+        """ adaptive sweep and predicted current ranges, as configured,
+        from the previous curves of the diode """
+        if ADAPTIVE_SWEEP:
+            MeasurementReport.setAdaptiveSweep(
+                    parameters, irradiance,
+                    self.expectedPoints.get((device, diode)))
+        if PREDICTIVE_RANGING:
+            MeasurementReport.setPredictedRanging(
+                    parameters, self.previousCurves.get(
+                            MeasurementReport.curveKey(
+                                    device, diode, irradiance)))
+
+    def applyParameters(self, parameters):
+        for key, value in parameters.items():
+            setattr(self, key, value)
+
+    def processMeasurement(self, warnings=True):
+        """ analyses and shows the measurement in self.voltage and
+        self.current, saving it in last_measurement.txt; without warnings
+        nothing waits for the user """
+        start = time()
+        data2 = self.voltage, self.current * self.currentUnitMultiplier
+        self.data3 = transpose(data2)
+
+        savetxt('last_measurement_raw.txt', self.data3)
+
+        self.unsavedData = True
+        self.setSaved(0)
+        # set by clickAutoMeasure on the reverse curve of a pair
+        self.hysteresis = None
+
+        tempVoc = MeasurementReport.analyse(self)
 
-        if crossingZero and not self.unsavedData:
-            if TEST_MODE:
-                testFile = "test/good-1-1-reverse.txt"
-                # testFile = "test/bad-1-1-forward.txt"
-                # testFile = "test/ugly-1-1-forward.txt"
-                self.voltage, self.current = loadtxt(
-                        testFile, skiprows=25,
-                        unpack=True)
-                self.current = self.current / self.currentUnitMultiplier
-            else:
-                self.smu.reset()
-                if self.preDelayOff:
-                    subtext = "Shutter Delay Off %s s" % str(self.preDelayOff)
-                    print subtext
-                    self.smu.subtext(subtext)
-                    sleep(self.preDelayOff)
-
-                self.smu.shutterOpen()
-                if self.preDelayOn:
-                    subtext = "Shutter Delay On %s s" % str(self.preDelayOn)
-                    print subtext
-                    self.smu.subtext(subtext)
-                    sleep(self.preDelayOn)
-                self.smu.removetext()
-                self.smu.removesubtext()
-
-                if self.reverse:
-                    data = self.smu.measureIV(
-                            self.endV, self.startV,
-                            -self.stepV, self.compliance,
-                            self.scale, self.integrationTime,
-                            self.delayTime)
-                else:
-                    data = self.smu.measureIV(
-                            self.startV, self.endV,
-                            self.stepV, self.compliance,
-                            self.scale, self.integrationTime,
-                            self.delayTime)
-                self.smu.shutterClose()
-                self.voltage, self.current = (
-                        array(data['voltage']),
-                        array(data['current']))
-
-            data2 = self.voltage, self.current * self.currentUnitMultiplier
-            self.data3 = transpose(data2)
-
-            savetxt('last_measurement_raw.txt', self.data3)
-
-            self.unsavedData = True
-            self.setSaved(0)
-
-            (self.maxPower, self.jsc, tempVoc, tempFf, self.voltageMaxPower,
-                self.currentMaxPower) = VICurves.extractdata(
-                    self.voltage, self.current * (CURRENT_POSITIVE * 2 - 1))
-            self.voc = "%.4g" % (tempVoc)
-            self.ff = "%.3g" % (tempFf)
-            self.jscDensity = "%.4g" % (self.jsc * self.currentUnitMultiplier /
-                                        self.cellArea)
-            self.currentMaxPowerDensity = "%.4g" % (
-                    self.currentMaxPower *
-                    self.currentUnitMultiplier /
-                    self.cellArea)
-
-            self.calcEfficiencyAndSetLCDs()
-
-            (user, experiment, device, diode, cellArea,
-                irradiance) = self.getDeviceIdentification()
-            if self.reverse:
-                self.reverseText = "reverse"
-            else:
-                self.reverseText = "forward"
-
-            self.maxVoltage = self.voltage.max()
-            self.minVoltage = self.voltage.min()
+        self.calcEfficiencyAndSetLCDs()
 
-            self.save(
-                    'last_measurement.txt', user, experiment, device, diode,
-                    cellArea, irradiance)
+        (user, experiment, device, diode, cellArea,
+            irradiance) = self.getDeviceIdentification()
 
-            if not float(irradiance):
+        self.save(
+                'last_measurement.txt', user, experiment, device, diode,
+                cellArea, irradiance)
+        self.timing['analysisTime'] = time() - start
+        expected = MeasurementReport.expectedPoints(self, tempVoc, irradiance)
+        if expected is not None:
+            self.expectedPoints[(device, diode)] = expected
+        self.previousCurves[MeasurementReport.curveKey(
+                device, diode, irradiance)] = (self.voltage, self.current)
+
+        if not float(irradiance):
+            self.printVoc = 0
+        else:
+            self.printVoc = 1
+            if not MeasurementReport.isVocReached(self, tempVoc):
                 self.printVoc = 0
-            else:
-                self.printVoc = 1
-                if (
-                        tempVoc < self.minVoltage or
-                        tempVoc > self.maxVoltage or
-                        self.current[0] /
-                        abs(self.current[0]) == self.current[-1] /
-                        abs(self.current[-1])):
-                    self.printVoc = 0
+                if warnings:
                     QMessageBox.warning(
                             self, "Voc not reached",
                             "This scan didn't pass by the Voc! You should "
@@ -351,33 +488,255 @@ class MainWindow (QMainWindow):
                             "range.",
                             QMessageBox.Ok, QMessageBox.Ok)
 
-            if self.showImage:
-                saveImage = 0
-                self.makeImage(saveImage, "")
+        if self.showImage:
+            saveImage = 0
+            self.makeImage(saveImage, "")
 
     @pyqtSlot()
     def clickMeasure_V(self):
-        self.isTriggerOpen = True
+        """ shows the Voc on the LCD and on a rolling trace until Stop """
         self.ui.LCD_Voc.setDigitCount(5)
-        while self.isTriggerOpen:
-            voltage = self.measure_V()
-            self.ui.LCD_Voc.display(voltage)
+        self.isTriggerOpen = True
+        self.scheduler.clearStop()
+        self.monitorJobId = self.scheduler.submit(
+                'monitorVoc', VOC_MONITOR_INTEGRATION_TIME,
+                VOC_MONITOR_AVERAGE)
+        try:
+            voltage = self.waitJob(self.monitorJobId)
+        except Exception as e:
+            self.measurementFailed(e)
+            return
+        finally:
+            self.monitorJobId = None
+        if voltage is not None:
+            self.ui.LCD_Voc.display("%.4g" % voltage)
             print(voltage)
-            QApplication.processEvents()
 
     def measure_V(self):
-        self.smu.reset()
-        self.smu.removetext()
-        self.smu.removesubtext()
-        self.smu.shutterOpen()
-        measurements = self.smu.measureVoltage(5, 10.0, 0, 5)
-        voltage = average(measurements["voltage"])
-        self.smu.shutterClose()
-        return voltage
+        return self.runJob('measureVoc')
+
+    @pyqtSlot()
+    def clickStability(self):
+        """ repeats the sweep at a fixed interval until Stop, the sweeps
+        being saved in the stability files and shown downsampled """
+        interval, accepted = QInputDialog.getDouble(
+                self, "Stability Measurement",
+                "Time between the starts of the sweeps (s):",
+                STABILITY_INTERVAL, 0, 1e6, 0)
+        if not accepted:
+            return
+        parameters = self.getMeasurementParameters()
+        if parameters is None or not self.confirmScanRange(parameters):
+            return
+        (user, experiment, device, diode, cellArea,
+            irradiance) = self.getDeviceIdentification()
+        fileName = MeasurementReport.seriesFileName(
+                os.path.join(user, str(self.date)), experiment, device,
+                diode, irradiance, "stability")
+        if not self.checkFileName(fileName):
+            return
+        run = Stability.StabilityRun(
+                fileName, interval, Stability.stabilityHeader(
+                        parameters, self.date, user, experiment, device,
+                        diode, cellArea, irradiance, interval))
+        title = os.path.basename(fileName)[:-4]
+        self.isTriggerOpen = True
+        self.scheduler.clearStop()
+        try:
+            while self.isTriggerOpen:
+                try:
+                    # the wait runs on the worker, so that Stop ends it
+                    self.runJob('pause', run.waitTime())
+                except Keithley2400.MeasurementAborted:
+                    break
+                sweepParameters = dict(parameters)
+                self.prepareSweep(sweepParameters, device, diode, irradiance)
+                self.applyParameters(sweepParameters)
+                run.startSweep()
+                self.measureJobId = self.scheduler.submit(
+                        'measureIV', sweepParameters)
+                try:
+                    self.voltage, self.current, details = self.waitJob(
+                            self.measureJobId)
+                except Exception as e:
+                    self.measurementFailed(e)
+                    break
+                self.timing = details['timing']
+                self.currentRanges = details['currentRanges']
+                self.processMeasurement(warnings=False)
+                run.add(self)
+                self.getStabilityCanvas().showHistory(
+                        title, *run.history.data())
+        finally:
+            run.close()
+            # the sweeps are in the stability files
+            self.unsavedData = False
+            self.log.log(
+                    'stability', file=fileName,
+                    **Stability.stabilityRecord(
+                            run, user, experiment, device, diode,
+                            irradiance))
+        print("Stability measurement of %d sweeps saved in %s" % (
+                run.sweeps, fileName))
+
+    @pyqtSlot()
+    def clickTrackMpp(self):
+        """ tracks the maximum power point starting from the one of the
+        last curve, saving the points next to the autosaved curves """
+        if getattr(self, "data3", None) is None:
+            QMessageBox.warning(
+                    self, "No data",
+                    "Measure a curve of the illuminated cell before "
+                    "tracking its maximum power point.",
+                    QMessageBox.Ok, QMessageBox.Ok)
+            return
+        parameters = self.getMeasurementParameters()
+        if parameters is None:
+            return
+        parameters['voltageMaxPower'] = self.voltageMaxPower
+        parameters['duration'] = MPP_TRACKING_DURATION
+        (user, experiment, device, diode, cellArea,
+            irradiance) = self.getDeviceIdentification()
+        fileName = MeasurementReport.seriesFileName(
+                os.path.join(user, str(self.date)), experiment, device,
+                diode, irradiance, "mpp")
+        if not self.checkFileName(fileName):
+            return
+        header = MppTracking.trackHeader(
+                parameters, self.date, user, experiment, device, diode,
+                cellArea, irradiance)
+        self.trackTitle = os.path.basename(fileName)[:-4]
+        self.isTriggerOpen = True
+        self.scheduler.clearStop()
+        jobId = self.scheduler.submit('trackMpp', parameters, fileName, header)
+        try:
+            trace, points = self.waitJob(jobId)
+        except Exception as e:
+            self.measurementFailed(e)
+            return
+        self.showTrack(jobId, trace)
+        self.log.log('mppTracking', file=fileName, **MppTracking.trackRecord(
+                trace, points, user, experiment, device, diode, irradiance))
+
+    @pyqtSlot(int, object)
+    def showTrack(self, jobId, trace):
+        """ shows the trace of the Voc monitor and its last reading, or
+        the decimated trace of the tracking and the efficiency of its last
+        point, on the LCD """
+        if not len(trace[0]):
+            return
+        if jobId == self.monitorJobId:
+            elapsed, voltage = trace
+            self.getTrackCanvas().showTrack("Voc", elapsed, voltage)
+            self.ui.LCD_Voc.display("%.4g" % voltage[-1])
+            return
+        elapsed, voltage, current, power = trace
+        self.getTrackCanvas().showTrack(
+                self.trackTitle, elapsed, voltage,
+                power * self.currentUnitMultiplier)
+        (user, experiment, device, diode, cellArea,
+            irradiance) = self.getDeviceIdentification()
+        self.ui.LCD_PCE.display(MeasurementReport.calcEfficiency(
+                power[-1], cellArea, irradiance)[0:5])
 
     @pyqtSlot()
     def clickStop(self):
         self.isTriggerOpen = False
+        if not TEST_MODE:
+            self.scheduler.cancel()
+
+    def measurementFailed(self, error):
+        """ reports a job which did not complete, the user is warned
+        unless it was stopped by the Stop button """
+        print(error)
+        if (
+                isinstance(error, Keithley2400.MeasurementAborted) and
+                not self.isTriggerOpen):
+            return
+        self.isTriggerOpen = False
+        QMessageBox.warning(
+                self, "Measurement failed",
+                "The measurement did not complete: %s" % error,
+                QMessageBox.Ok, QMessageBox.Ok)
+
+    def sendJob(self, name, *args):
+        """ submits a job to the first instrument without waiting """
+        jobId = self.scheduler.submit(name, *args)
+        self.unwaitedJobs.add(jobId)
+
+    def runJob(self, name, *args):
+        """ runs a job on the first instrument, the GUI keeps processing
+        its events until the job is finished """
+        return self.waitJob(self.scheduler.submit(name, *args))
+
+    def discardJob(self, jobId):
+        if jobId in self.jobResults:
+            del self.jobResults[jobId]
+        else:
+            self.unwaitedJobs.add(jobId)
+
+    def waitJob(self, jobId):
+        """ waits for a submitted job and returns its result """
+        self.setMeasureButtonsEnabled(False)
+        try:
+            while jobId not in self.jobResults:
+                loop = QEventLoop()
+                self.jobLoops.append(loop)
+                loop.exec_()
+                self.jobLoops.remove(loop)
+        finally:
+            if not self.jobLoops:
+                self.setMeasureButtonsEnabled(True)
+        result, error = self.jobResults.pop(jobId)
+        if error is not None:
+            raise error
+        return result
+
+    @pyqtSlot(int, object, object)
+    def jobFinished(self, jobId, result, error):
+        if jobId in self.connectJobs:
+            self.connectJobs.remove(jobId)
+            self.instrumentConnected(error)
+            return
+        if jobId in self.unwaitedJobs:
+            self.unwaitedJobs.remove(jobId)
+            if error is not None:
+                print(error)
+            return
+        self.jobResults[jobId] = (result, error)
+        for loop in self.jobLoops:
+            loop.quit()
+
+    @pyqtSlot(str)
+    def showProgress(self, text):
+        self.statusBar().showMessage(text)
+
+    @pyqtSlot(int, object, object)
+    def showPoints(self, jobId, voltage, current):
+        """ follows a streamed sweep on the plot and, for the sweep being
+        waited for, Jsc and Voc on the LCDs as soon as they are crossed """
+        current = current * (CURRENT_POSITIVE * 2 - 1)
+        self.getPlotCanvas().streamCurve(
+                jobId, voltage, current * self.currentUnitMultiplier)
+        if jobId != self.measureJobId or len(voltage) < 2:
+            return
+        order = argsort(voltage)
+        if voltage.min() <= 0 <= voltage.max():
+            jsc = interp(0, voltage[order], current[order])
+            cellArea = float(self.ui.cellArea_edit.text())
+            self.ui.LCD_Jsc.display("%.4g" % (
+                    jsc * self.currentUnitMultiplier / cellArea))
+        if current.min() <= 0 <= current.max():
+            order = argsort(current)
+            self.ui.LCD_Voc.display(
+                    "%.4g" % interp(0, current[order], voltage[order]))
+
+    def setMeasureButtonsEnabled(self, enabled):
+        for button in (
+                self.ui.runButton, self.ui.vocButton, self.ui.runListButton,
+                self.ui.runAutoMeasureButton, self.ui.trackMppButton,
+                self.ui.stabilityButton):
+            button.setEnabled(enabled)
 
     @pyqtSlot()
     def clickRunList(self):
@@ -386,24 +745,52 @@ class MainWindow (QMainWindow):
         if os.path.isfile(fileName):
             print(fileName)
             self.isTriggerOpen = True
+            self.scheduler.clearStop()
             conf = genfromtxt(str(fileName), skip_header=1, dtype='str')
             extendedConf = 1
             self.showImage = 1
-            self.terminateCurrentImage = 1
+            # the acquisitions of the next entries are queued on the
+            # instruments while the current one is analysed, saved and
+            # plotted, but never beyond an entry waiting for the user nor
+            # before the previous curve its sweep is prepared from. The
+            # results are processed in the list order.
+            pipelineDepth = LIST_PIPELINE_DEPTH * len(self.scheduler)
+            pending = deque()
+            nextEntry = 0
             for i in range(len(conf)):
-                self.applyConf(conf[i], extendedConf)
-                if not self.isTriggerOpen:
+                while (
+                        self.isTriggerOpen and nextEntry < len(conf) and
+                        len(pending) < pipelineDepth and
+                        (nextEntry == i or
+                         (not int(conf[nextEntry - 1][17]) and
+                          not self.isPreparedFromPending(
+                                  conf, nextEntry, i)))):
+                    pending.append(self.submitListEntry(conf[nextEntry]))
+                    nextEntry += 1
+                if not self.isTriggerOpen or not pending:
                     break
-                self.displayDiode()
-                self.clickMeasure_IV()
-                self.clickAutoSave()
+                parameters, jobIds = pending.popleft()
+                self.applyConf(conf[i], extendedConf)
+                if parameters is not None:
+                    self.measureJobId = jobIds[-1]
+                    try:
+                        for jobId in jobIds:
+                            result = self.waitJob(jobId)
+                    except Exception as e:
+                        self.measurementFailed(e)
+                        break
+                    if not self.isTriggerOpen:
+                        break
+                    if self.measureListEntry(parameters, result):
+                        self.clickAutoSave()
 
                 waitBeforeNext = int(conf[i][17])
                 if waitBeforeNext:
                     self.saveProblem = False
                     subtext = "Waiting for user interaction"
                     print subtext
-                    self.smu.subtext(subtext)
+                    self.unwaitedJobs.update(
+                            self.scheduler.broadcast('subtext', subtext))
                     continueWithNextAnswer = QMessageBox.question(
                             self, "Next measurements block",
                             "A block of measurements is completed, should "
@@ -411,17 +798,73 @@ class MainWindow (QMainWindow):
                             QMessageBox.Yes | QMessageBox.Abort,
                             QMessageBox.Yes)
                     if continueWithNextAnswer == QMessageBox.Abort:
-                        self.terminateCurrentImage = 0
-                        self.smu.subtext("Measurements list completed")
                         break
-            self.terminateCurrentImage = 0
-            self.smu.subtext("Measurements list completed")
+            for parameters, jobIds in pending:
+                for jobId in jobIds:
+                    self.discardJob(jobId)
+            self.unwaitedJobs.update(self.scheduler.broadcast(
+                    'subtext', "Measurements list completed"))
+
+    def isPreparedFromPending(self, conf, entry, first):
+        """ True if the sweep of the list entry is prepared from the
+        previous curve of its diode and a curve of the diode is among the
+        entries from first, not processed yet """
+        if not (ADAPTIVE_SWEEP or PREDICTIVE_RANGING):
+            return False
+        diodes = [(str(c[11]), str(int(c[12]))) for c in conf[first:entry]]
+        return (str(conf[entry][11]), str(int(conf[entry][12]))) in diodes
+
+    def submitListEntry(self, conf):
+        """ queues on its instrument the diode selection and the sweep of
+        a list entry, returns its parameters and the job ids
+
+        The optional column 18 of the entry gives the instrument, otherwise
+        all the entries of a device go to the same one. """
+        parameters = self.getListParameters(conf)
+        if not self.confirmScanRange(parameters):
+            return None, ()
+        self.prepareSweep(
+                parameters, str(conf[11]), str(int(conf[12])), conf[10])
+        if len(conf) > 18:
+            instrument = self.scheduler.assign(str(conf[11]), conf[18])
+        else:
+            instrument = self.scheduler.assign(str(conf[11]))
+        displayJob = self.scheduler.submitTo(
+                instrument, 'displayDiode', str(conf[11]),
+                str(int(conf[12])))
+        measureJob = self.scheduler.submitTo(
+                instrument, 'measureIV', parameters)
+        return parameters, (displayJob, measureJob)
+
+    def measureListEntry(self, parameters, result):
+        """ the part of clickMeasure_IV following the acquisition, for a
+        list entry already applied to the GUI, returns False if the user
+        chose not to replace an unsaved measurement """
+        self.ui.LCD_Jsc.setDigitCount(5)
+        self.ui.LCD_Voc.setDigitCount(5)
+        self.ui.LCD_PCE.setDigitCount(5)
+        self.ui.LCD_FF.setDigitCount(5)
+        self.applyParameters(parameters)
+        if self.unsavedData:
+            unsavedAnswer = QMessageBox.warning(
+                    self, "Unsaved Measurement",
+                    "There is an unsaved measurement. Do you really want to "
+                    "continue with next measurement?",
+                    QMessageBox.Yes | QMessageBox.Abort, QMessageBox.Yes)
+            if unsavedAnswer != QMessageBox.Yes:
+                return False
+            self.unsavedData = False
+        self.voltage, self.current, details = result
+        self.timing = details['timing']
+        self.currentRanges = details['currentRanges']
+        self.processMeasurement()
+        return True
 
     @pyqtSlot()
     def clickAutoMeasure(self):
         self.isTriggerOpen = True
+        self.scheduler.clearStop()
         self.showImage = 1
-        self.terminateCurrentImage = 1
         self.ui.LCD_Voc.setDigitCount(5)
 
         self.ui.reverse_check.setCheckState(0)
@@ -430,8 +873,11 @@ class MainWindow (QMainWindow):
         for i in (0, 1, 2, 3):
             self.ui.diode_spin.setValue(int(i) + 1)
             self.displayDiode()
-            voltage = self.measure_V()
-            self.smu.shutterClose()
+            try:
+                voltage = self.measure_V()
+            except Exception as e:
+                self.measurementFailed(e)
+                break
             if voltage < float(self.ui.startV_edit.text()):
                 lowVocAnswer = QMessageBox.warning(
                         self, "Voc lower than starting V",
@@ -447,44 +893,31 @@ class MainWindow (QMainWindow):
             maxVoltages[i] = max(0, float(approxVoltage)) + 0.2
             self.ui.endV_edit.setText(str(maxVoltages[i]))
 
+            # a curve not measured ends the run, so that nothing is saved
+            # or compared in its place
             self.ui.reverse_check.setCheckState(0)
-            QApplication.processEvents()
-            self.clickMeasure_IV()
+            if not self.clickMeasure_IV() or not self.isTriggerOpen:
+                break
             self.clickAutoSave()
-            QApplication.processEvents()
+            forward = self.voltage, self.current
             self.ui.reverse_check.setCheckState(1)
-            self.clickMeasure_IV()
+            if not self.clickMeasure_IV() or not self.isTriggerOpen:
+                break
+            if float(self.ui.irradiance_edit.text()):
+                self.hysteresis = Hysteresis.curveHysteresis(
+                        forward[0], forward[1], self.voltage, self.current)
             self.clickAutoSave()
-            QApplication.processEvents()
 
-        self.terminateCurrentImage = 0
-        self.smu.subtext("Measure completed")
+        self.sendJob('subtext', "Measure completed")
 
     def displayDiode(self):
-        QApplication.processEvents()
         (user, experiment, device, diode, cellArea,
             irradiance) = self.getDeviceIdentification()
-
-        self.smu.reset()
-        self.smu.removetext()
-        self.smu.removesubtext()
-
-        text = "Select diode " + diode
-        print text
-        self.smu.text(text)
-        subtext = "Device " + device
-        self.smu.subtext(subtext)
-        sleep(0.7)
-        d = 0
-        while(d < int(diode)):
-            self.smu.beep2()
-            sleep(0.35)
-            d += 1
-        sleep(0.5)
-        self.smu.beep()
-        sleep(0.2)
-        self.smu.beep()
-        sleep(1)
+        try:
+            self.runJob('displayDiode', device, diode)
+        except Exception as e:
+            # the failure of the measurement that follows is reported
+            print(e)
 
     @pyqtSlot()
     def clickSaveAs(self):
@@ -499,6 +932,7 @@ class MainWindow (QMainWindow):
                 self, 'Save VI Curve', suggestedFileName, 'Text files (*.txt)')
         if fileName:
             fileNameTxt = str(fileName)
+            start = time()
             self.save(
                     fileNameTxt, user, experiment, device, diode, cellArea,
                     irradiance)
@@ -507,14 +941,14 @@ class MainWindow (QMainWindow):
             self.unsavedData = False
             self.pastFileName = fileNameTxt
             print fileNameTxt
-            self.fillTable(device, diode)
-            self.fillLogFile(user, experiment, device, diode)
-
-        logContent = (
-                "SaveAs by " + str(user) + " experiment " +
-                str(experiment) + " in file " + str(fileName), "")
-        with open("measurements_log.txt", 'a') as f_handle:
-            savetxt(f_handle, logContent, fmt='%s')
+            self.storeMeasurement(
+                    fileNameTxt, user, experiment, device, diode, cellArea,
+                    irradiance)
+            self.timing['saveTime'] = time() - start
+            self.fillResults(
+                    fileNameTxt, user, experiment, device, diode, cellArea)
+            self.fillLogFile(
+                    'saveAs', fileNameTxt, user, experiment, device, diode)
 
     @pyqtSlot()
     def clickAutoSave(self):
@@ -565,9 +999,15 @@ class MainWindow (QMainWindow):
                 self.saveProblem = False
 
             if not self.saveProblem:
-                self.save(
+                start = time()
+                if SAVE_TEXT_FILES:
+                    self.save(
+                            str(fileNameWithDirectory), user, experiment,
+                            device, diode, cellArea, irradiance)
+                self.storeMeasurement(
                         str(fileNameWithDirectory), user, experiment, device,
                         diode, cellArea, irradiance)
+                self.timing['saveTime'] = time() - start
                 self.setSaved(1)
 
                 autoSaveText = (
@@ -575,14 +1015,12 @@ class MainWindow (QMainWindow):
                 print(autoSaveText)
                 self.unsavedData = False
                 self.pastFileName = fileNameWithDirectory
-                logContent = (
-                        "AutoSave by " + user + " experiment " +
-                        experiment + " in file " + str(fileNameWithDirectory) +
-                        " including results:", "")
-                with open("measurements_log.txt", 'a') as f_handle:
-                    savetxt(f_handle, logContent, fmt='%s')
-                self.fillTable(device, diode)
-                self.fillLogFile(user, experiment, device, diode)
+                self.fillResults(
+                        str(fileNameWithDirectory), user, experiment, device,
+                        diode, cellArea)
+                self.fillLogFile(
+                        'autoSave', str(fileNameWithDirectory), user,
+                        experiment, device, diode)
                 self.fillMeasurementsFile(directory, experiment, device, diode)
                 if self.ui.autoSaveImages_check.isChecked():
                     saveImage = 1
@@ -619,51 +1057,30 @@ class MainWindow (QMainWindow):
             irradiance):
         # this handles also saving of last_measurement.txt
         if self.checkFileName(fileName):
-            with open(fileName, 'w') as f_handle:
-                savetxt(f_handle, self.makeHeader(
-                        user, experiment, device, diode, cellArea,
-                        irradiance), fmt='%s')
-            with open(fileName, 'a') as f_handle:
-                savetxt(f_handle, self.data3, fmt='%g \t%g')
+            MeasurementReport.saveText(
+                    self, fileName, user, experiment, device, diode,
+                    cellArea, irradiance)
 
     def makeImage(self, saveImage, directory):
         (user, experiment, device, diode, cellArea,
             irradiance) = self.getDeviceIdentification()
         imageName = self.makeAutoName(experiment, device, diode, irradiance)
-        if self.currentImagePid:
-            if self.terminateCurrentImage:
-                if not saveImage:
-                    self.currentImage.terminate()
-
-        p = Process(target=plot_graph, args=(
+        args = (
                 imageName, self.voltage,
                 - self.current * self.currentUnitMultiplier,
                 self.voltageMaxPower,
                 self.currentMaxPower * self.currentUnitMultiplier, self.voc,
                 self.printVoc, self.jsc * self.currentUnitMultiplier,
-                self.jscDensity, self.ff, self.efficiency, saveImage,
-                directory))
-        p.start()
-        if not saveImage:
-            self.currentImage = p
-            self.currentImagePid = int(p.pid)
+                self.jscDensity, self.ff, self.efficiency)
+        if saveImage:
+            import PlotCanvas
+            PlotCanvas.saveGraph(directory, *args)
+        else:
+            self.getPlotCanvas().showCurve(*args, key=self.measureJobId)
 
     def makeAutoName(self, experiment, device, diode, irradiance):
-        if float(irradiance) == 0:
-            fileName = (
-                    experiment + "-" + device + "-" + diode + "-dark-" +
-                    self.reverseText)
-        else:
-            if float(irradiance) == 100:
-                fileName = (
-                        experiment + "-" + device + "-" + diode + "-" +
-                        self.reverseText)
-            else:
-                fileName = (
-                        experiment + "-" + device + "-" + diode + "-" +
-                        str(float(irradiance)/100) + "sun-" +
-                        self.reverseText)
-        return fileName
+        return MeasurementReport.makeAutoName(
+                experiment, device, diode, irradiance, self.reverseText)
 
     def getDeviceIdentification(self):
         try:
@@ -687,19 +1104,13 @@ class MainWindow (QMainWindow):
                     QMessageBox.Ok)
         return user, experiment, device, diode, cellArea, irradiance
 
-    def getDarkData(self, irradiance, cellArea, compliance):
-        parallelResistance = VICurves.calcParallelResistance(
-                self.voltage, self.current * (CURRENT_POSITIVE * 2 - 1))
-
-        seriesResistance = VICurves.calcSeriesResistance(
-                self.voltage, self.current * (CURRENT_POSITIVE * 2 - 1),
-                compliance, self.reverse)
-
-        darkOutput = (
-                "Serie Resistance (Ohm):	" + str(seriesResistance) +
-                "	Parallel Resistance (Ohm):	" +
-                str(parallelResistance))
-        return darkOutput
+    def storeMeasurement(
+            self, fileName, user, experiment, device, diode, cellArea,
+            irradiance):
+        if self.store is not None:
+            MeasurementReport.storeRecord(
+                    self, self.store, fileName, user, experiment, device,
+                    diode, cellArea, irradiance)
 
     def setSaved(self, saved):
         if saved:
@@ -713,12 +1124,8 @@ class MainWindow (QMainWindow):
         self.irradiance = float(self.ui.irradiance_edit.text())
         (user, experiment, device, diode, cellArea,
             irradiance) = self.getDeviceIdentification()
-        if self.irradiance:
-            self.efficiency = "%.3f" % float("%.4g" % (100 * (
-                    (float(self.maxPower) / float(cellArea)) /
-                    (float(self.irradiance) * IRRADIANCE_UNIT_MULTIPLIER))))
-        else:
-            self.efficiency = "0"
+        self.efficiency = MeasurementReport.calcEfficiency(
+                self.maxPower, cellArea, self.irradiance)
 
         self.ui.LCD_Jsc.display(self.jscDensity[0:5])
         self.ui.LCD_Voc.display(self.voc[0:5])
@@ -733,92 +1140,63 @@ class MainWindow (QMainWindow):
             stepV = float(self.ui.stepV_edit.text())
             integrationTime = float(self.ui.integrationTime_edit.text())
             delayTime = float(self.ui.delayTime_edit.text())
-            self.scanSpeed = "%.3g" % (
-                    self.smu.scanSpeed(stepV, integrationTime, delayTime))
+            self.scanSpeed = "%.3g" % (Keithley2400.K2400.scanSpeed(
+                    stepV, integrationTime, delayTime))
             scanSpeedText = str(self.scanSpeed) + " V/s"
             self.ui.scanSpeed_label.setText(scanSpeedText)
 
-    def fillTable(self, device, diode):
-        self.ui.data_table.insertRow(0)
-        self.ui.data_table.setItem(0, 0, QTableWidgetItem(str(device)))
-        self.ui.data_table.setItem(0, 1, QTableWidgetItem(str(diode)))
-        self.ui.data_table.setItem(0, 2, QTableWidgetItem(self.reverseText))
-        self.ui.data_table.setItem(
-                0, 3, QTableWidgetItem(str(self.jscDensity[0:5])))
-        self.ui.data_table.setItem(0, 4, QTableWidgetItem(str(self.voc[0:5])))
-        self.ui.data_table.setItem(0, 5, QTableWidgetItem(str(self.ff[0:4])))
-        self.ui.data_table.setItem(
-                0, 6, QTableWidgetItem(str(self.efficiency[0:5])))
-        self.ui.data_table.setItem(
-                0, 7, QTableWidgetItem(str(self.integrationTime)))
-        self.ui.data_table.setItem(0, 8, QTableWidgetItem(str(self.delayTime)))
-        self.ui.data_table.setItem(
-                0, 9, QTableWidgetItem(str(self.irradiance)))
+    def fillResults(
+            self, fileName, user, experiment, device, diode, cellArea):
+        """ adds the results of the saved measurement to the database and
+        to the table """
+        result = MeasurementReport.resultRecord(
+                self, fileName, user, experiment, device, diode, cellArea)
+        if self.results is not None:
+            self.results.insert(**result)
+        self.fillTable(result)
+
+    def setTableRow(self, row, result):
+        for column, (key, valueFormat) in enumerate(TABLE_COLUMNS):
+            value = result.get(key)
+            if value is None:
+                text = ""
+            else:
+                text = valueFormat % value
+            self.ui.data_table.setItem(row, column, QTableWidgetItem(text))
+
+    def fillTable(self, result):
+        """ adds the result on top of the table, or replaces the row of
+        its file as the database does """
+        if result['file'] in self.tableFiles:
+            self.setTableRow(self.tableFiles.index(result['file']), result)
+        else:
+            self.ui.data_table.insertRow(0)
+            self.tableFiles.insert(0, result['file'])
+            self.setTableRow(0, result)
         self.ui.data_table.resizeColumnsToContents()
 
+    def loadTable(self, results):
+        """ shows the results in the table, the last one on top """
+        self.ui.data_table.setUpdatesEnabled(False)
+        self.ui.data_table.setRowCount(len(results))
+        # the file of each row of the table
+        self.tableFiles = [result['file'] for result in reversed(results)]
+        for row, result in enumerate(reversed(results)):
+            self.setTableRow(row, result)
+        self.ui.data_table.resizeColumnsToContents()
+        self.ui.data_table.setUpdatesEnabled(True)
+
     def fillMeasurementsFile(self, directory, experiment, device, diode):
-        measurementsFileName = (
-                "iv_measurements-" + str(experiment) + "-" +
-                str(self.date) + ".txt")
-        measurementsFileNameWithDirectory = os.path.join(
-                directory, measurementsFileName)
+        measurementsFileNameWithDirectory = (
+                MeasurementReport.measurementsFileName(
+                        self, directory, experiment))
         if self.checkFileName(measurementsFileNameWithDirectory):
-            if not os.path.exists(measurementsFileNameWithDirectory):
-                measurementsFileHeader = (
-                        "exp	device	diode	rev/fwd	Jsc	Voc	FF	"
-                        "efficiency	intTime	delay	irradiance", "")
-                with open(measurementsFileNameWithDirectory, 'w') as f_handle:
-                    savetxt(f_handle, measurementsFileHeader, fmt='%s')
-            if os.path.isfile(measurementsFileNameWithDirectory):
-                measurementsFileContent = (
-                        str(experiment) + "	" +
-                        str(device) +
-                        "	" + str(diode) + "	" + str(self.reverseText) +
-                        "	" + str(self.jscDensity) + "	" + str(self.voc) +
-                        "	" + str(self.ff) + "	" + str(self.efficiency) +
-                        "	" + str(self.integrationTime) + "	" +
-                        str(self.delayTime) + "	" + str(self.irradiance), "")
-                with open(measurementsFileNameWithDirectory, 'a') as f_handle:
-                    savetxt(f_handle, measurementsFileContent, fmt='%s')
-
-    def fillLogFile(self, user, experiment, device, diode):
-        logContent = (
-                str(user) + "	" + str(experiment) + "	" + str(device) +
-                "	" + str(diode) + "	" + str(self.reverseText) + "	" +
-                str(self.jscDensity) + "	" + str(self.voc) + "	" +
-                str(self.ff) + "	" + str(self.efficiency) + "	" +
-                str(self.integrationTime) + "	" + str(self.delayTime) + "	" +
-                str(self.irradiance), "")
-        with open("measurements_log.txt", 'a') as f_handle:
-            savetxt(f_handle, logContent, fmt='%s')
-
-    def makeHeader(
-            self, user, experiment, device, diode, cellArea,
-            irradiance):
-        darkOutput = self.getDarkData(
-                irradiance, cellArea, float(self.compliance))
-        return (
-                "PyPV software (Gr. E. Palomares, ICIQ) - Voltage-Current "
-                "measurement Report", "User:	" +
-                user, "Date:	" + str(self.date) + "    Time: " +
-                str(datetime.datetime.now().strftime("%H:%M:%S")),
-                "Experiment:	" + experiment, "Device:	" + device,
-                "Diode:	" + diode, "Forward or reverse? " + self.reverseText,
-                "Lowest Voltage (V):	" + str(self.minVoltage),
-                "Highest Voltage (V): " + str(self.maxVoltage),
-                "Voltage Step (V):	" + str(self.stepV), "Compliance (A):	" +
-                str(self.compliance), "Scale (A):	" + str(self.scale),
-                "Voltage of maximum power point (V):	" +
-                str(self.voltageMaxPower) +
-                "	Current density of MPP (mA/cm2):	" +
-                str(self.currentMaxPowerDensity), "Integration Time:	" +
-                str(self.integrationTime) + "	Scan Speed (V/s):	" +
-                str(self.scanSpeed), "Delay Time (s):	" +
-                str(self.delayTime) + "	ShutterDelayOff (s):	" +
-                str(self.preDelayOff) + "	ShutterDelayOn (s):	" +
-                str(self.preDelayOn), darkOutput, "Cell Area (cm2):	" +
-                cellArea, "Irradiance (mW/cm2):	" + irradiance,
-                "Jsc (mA/cm2):	" + str(self.jscDensity), "Voc (V):	" +
-                str(self.voc), "Fill factor:	" + str(self.ff),
-                "Efficiency (%):	" + str(self.efficiency),
-                "Voltage_V \tCurrent_mA")
+            MeasurementReport.appendMeasurementsFile(
+                    self, measurementsFileNameWithDirectory, experiment,
+                    device, diode)
+
+    def fillLogFile(self, mode, fileName, user, experiment, device, diode):
+        self.log.log(
+                'save', mode=mode, file=fileName,
+                **MeasurementReport.logRecord(
+                        self, user, experiment, device, diode))
@@ -0,0 +1,149 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression tests of BatchProcess: the rows of the files of this
+# directory agree with their headers, and the cache skips the files not
+# changed.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import BatchProcess
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEST_FILES = (
+        'bad-1-1-forward.txt', 'good-1-1-reverse.txt',
+        'ugly-1-1-forward.txt')
+
+
+class BatchProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileNames = []
+        for name in TEST_FILES:
+            fileName = os.path.join(self.directory, 'ilario', name)
+            if not os.path.isdir(os.path.dirname(fileName)):
+                os.makedirs(os.path.dirname(fileName))
+            shutil.copy(os.path.join(TEST_DIRECTORY, name), fileName)
+            self.fileNames.append(fileName)
+        with open(os.path.join(self.directory, 'notes.txt'), 'w') as f:
+            f.write("not a measurement\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testFind(self):
+        self.assertEqual(
+                BatchProcess.findMeasurementFiles([self.directory]),
+                sorted(self.fileNames))
+
+    def testRowMatchesHeader(self):
+        fileName, row, error = BatchProcess.processFile(self.fileNames[1])
+        self.assertEqual(error, None)
+        self.assertEqual(row['file'], fileName)
+        self.assertEqual(row['experiment'], 'good')
+        self.assertEqual(row['points'], 111)
+        self.assertAlmostEqual(row['jscDensity'], 21.31, delta=0.02)
+        self.assertAlmostEqual(row['voc'], 0.877, places=3)
+        self.assertAlmostEqual(row['ff'], 0.705, places=3)
+        self.assertAlmostEqual(row['efficiency'], 13.19, delta=0.02)
+
+    def testUnreadableFile(self):
+        fileName = os.path.join(self.directory, 'broken.txt')
+        with open(fileName, 'w') as f:
+            f.write("PyPV software\nUser:\tilario\n")
+        name, row, error = BatchProcess.processFile(fileName)
+        self.assertEqual(row, None)
+        self.assertTrue(error)
+
+    def testChunk(self):
+        """ a broken file and a curve clipped at the compliance in a
+        chunk leave the rows of the other files as alone """
+        broken = os.path.join(self.directory, 'broken.txt')
+        with open(broken, 'w') as f:
+            f.write("PyPV software\nUser:\tilario\n")
+        clipped = os.path.join(self.directory, 'clipped.txt')
+        with open(self.fileNames[1]) as f:
+            header = f.read().split('Voltage_V')[0]
+        with open(clipped, 'w') as f:
+            f.write(header + "Voltage_V \tCurrent_mA\n")
+            for i in range(20):
+                f.write("%g \t-10\n" % (i * 0.05))
+        outcomes = BatchProcess.processChunk(
+                [broken] + self.fileNames + [clipped])
+        self.assertEqual(
+                [fileName for fileName, row, error in outcomes],
+                [broken] + self.fileNames + [clipped])
+        self.assertEqual(outcomes[0][1], None)
+        self.assertTrue(outcomes[0][2])
+        for fileName, row, error in outcomes[1:4]:
+            self.assertEqual(
+                    (fileName, row, error),
+                    BatchProcess.processFile(fileName))
+        fileName, row, error = outcomes[-1]
+        self.assertEqual(error, None)
+        self.assertEqual(row['voc'], None)
+        self.assertEqual(row['points'], 20)
+
+    def testCache(self):
+        cache = {}
+        self.assertEqual(
+                BatchProcess.processFiles(self.fileNames, cache, 1),
+                (3, []))
+        self.assertEqual(sorted(cache), sorted(self.fileNames))
+        self.assertEqual(
+                BatchProcess.processFiles(self.fileNames, cache, 1),
+                (0, []))
+        # touched but not changed
+        stat = os.stat(self.fileNames[0])
+        os.utime(self.fileNames[0], (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(
+                BatchProcess.processFiles(self.fileNames, cache, 1),
+                (0, []))
+        # changed
+        with open(self.fileNames[0], 'a') as f:
+            f.write("0.31 \t-0.001\n")
+        self.assertEqual(
+                BatchProcess.processFiles(self.fileNames, cache, 1),
+                (1, []))
+        self.assertEqual(cache[self.fileNames[0]]['row']['points'], 37)
+
+    def testMain(self):
+        output = os.path.join(self.directory, 'summary.txt')
+        cacheName = os.path.join(self.directory, 'cache.json')
+        arguments = ['-o', output, '-j', '1', '--cache', cacheName,
+                     self.directory]
+        BatchProcess.main(arguments)
+        with open(output) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(
+                lines[0].split('\t'), list(BatchProcess.SUMMARY_COLUMNS))
+        self.assertEqual(
+                [line.split('\t')[0] for line in lines[1:]],
+                sorted(self.fileNames))
+        self.assertEqual(
+                sorted(BatchProcess.loadCache(cacheName)),
+                sorted(self.fileNames))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression tests of CurrentRanging: the ranges scheduled hold the
+# predicted currents and change only between long enough segments.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import unittest
+
+import CurrentRanging
+import Keithley2400Simulator
+
+
+def segments(ranges):
+    """ (start, stop, range) of the runs of equal ranges """
+    bounds = flatnonzero(diff(ranges)) + 1
+    starts = concatenate(([0], bounds))
+    stops = concatenate((bounds, [len(ranges)]))
+    return zip(starts, stops, ranges[starts])
+
+
+class RangeScheduleTest(unittest.TestCase):
+
+    def assertValidSchedule(self, predicted, compliance, ranges):
+        self.assertEqual(len(ranges), len(predicted))
+        for current, currentRange in zip(predicted, ranges):
+            # never a smaller range than the one for the point alone
+            self.assertTrue(
+                    currentRange >= CurrentRanging.rangeFor(
+                        current, compliance))
+        runs = segments(ranges)
+        for n, (start, stop, currentRange) in enumerate(runs):
+            # a short segment is kept only if its neighbours have smaller
+            # ranges
+            if stop - start < CurrentRanging.MIN_SEGMENT_POINTS:
+                for neighbour in runs[max(n - 1, 0):n] + runs[n + 1:n + 2]:
+                    self.assertTrue(neighbour[2] < currentRange)
+
+    def testDiodeCurve(self):
+        model = Keithley2400Simulator.DiodeModel()
+        voltages = arange(-0.1, 1.0, 0.01)
+        for illuminated in (True, False):
+            predicted = CurrentRanging.predictCurrents(
+                    voltages, voltages, model.current(voltages, illuminated))
+            ranges = CurrentRanging.rangeSchedule(predicted, 0.01)
+            self.assertValidSchedule(predicted, 0.01, ranges)
+            # the dark curve spans several ranges
+            if not illuminated:
+                self.assertTrue(len(segments(ranges)) > 2)
+
+    def testRandomCurrents(self):
+        generator = random.RandomState(8)
+        for i in range(200):
+            predicted = 10 ** generator.uniform(
+                    -9, -1, generator.randint(1, 60))
+            if i % 4 == 0:
+                predicted[generator.randint(len(predicted))] = inf
+            ranges = CurrentRanging.rangeSchedule(predicted, 0.01)
+            self.assertValidSchedule(predicted, 0.01, ranges)
+
+    def testShortSegmentMerged(self):
+        predicted = array([1e-4] * 10 + [1e-7] * 2 + [1e-4] * 10)
+        ranges = CurrentRanging.rangeSchedule(predicted, 0.01)
+        self.assertEqual(len(segments(ranges)), 1)
+        # a short segment with the largest range is kept
+        predicted = array([1e-7] * 10 + [1e-4] * 2 + [1e-7] * 10)
+        ranges = CurrentRanging.rangeSchedule(predicted, 0.01)
+        self.assertEqual(len(segments(ranges)), 3)
+
+
+class PredictCurrentsTest(unittest.TestCase):
+
+    def testNeighbours(self):
+        voltages = array([-0.2, 0.0, 0.05, 0.1, 0.3])
+        predicted = CurrentRanging.predictCurrents(
+                voltages, [0.0, 0.1, 0.2], [-1e-3, 2e-3, 1e-5])
+        self.assertEqual(predicted[0], inf)
+        self.assertEqual(predicted[-1], inf)
+        self.assertTrue(allclose(predicted[1:4], 2e-3))
+
+    def testDescribe(self):
+        self.assertEqual(
+                CurrentRanging.describeRanges(
+                    [-0.1, 0.0, 0.1, 0.2], [1e-5, 1e-5, 0, 0]),
+                "1e-05 A from -0.1 V, auto from 0.1 V")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression tests of DiodeFit: the parameters of curves computed by the
+# diode model of the simulator are found again, the parameters not
+# determined by a curve are nan instead of a bound or a starting value.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import os
+import unittest
+
+import DiodeFit
+import Keithley2400Simulator
+import MeasurementFile
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PARAMETERS = (
+        'saturationCurrent', 'idealityFactor', 'seriesResistance',
+        'shuntResistance')
+
+
+def randomModel(generator):
+    return Keithley2400Simulator.DiodeModel(
+            photoCurrent=generator.uniform(1e-3, 5e-3),
+            saturationCurrent=10 ** generator.uniform(-13, -8),
+            idealityFactor=generator.uniform(1.2, 2.2),
+            seriesResistance=10 ** generator.uniform(0, 1.5),
+            shuntResistance=10 ** generator.uniform(3.5, 5))
+
+
+def modelCurve(model, illuminated, generator, noise=1e-7):
+    """ voltage and current (photocurrent positive) from -0.1 V to a bit
+    beyond the open circuit voltage, with gaussian noise """
+    voltage = linspace(-0.1, 1.1, 121)
+    current = - model.current(voltage, illuminated)
+    current += generator.normal(0, noise, len(voltage))
+    return voltage, current
+
+
+class FitCurvesTest(unittest.TestCase):
+
+    def assertRecovered(self, fit, model, index=None):
+        for name in PARAMETERS:
+            value = fit[name] if index is None else fit[name][index]
+            if isnan(value):
+                continue
+            expected = getattr(model, name)
+            self.assertLess(
+                    abs(log(value / expected)), 0.2,
+                    "%s %g, model %g" % (name, value, expected))
+
+    def testExactCurve(self):
+        model = Keithley2400Simulator.DiodeModel()
+        voltage = linspace(-0.2, 1.2, 141)
+        for illuminated in (True, False):
+            fit = DiodeFit.fitCurve(
+                    voltage, - model.current(voltage, illuminated))
+            self.assertTrue(fit['converged'])
+            for name in PARAMETERS:
+                self.assertAlmostEqual(
+                        fit[name] / getattr(model, name), 1, places=6)
+            self.assertLess(fit['rmsError'], 1e-12)
+
+    def testManyCurves(self):
+        generator = random.RandomState(4)
+        for illuminated in (True, False):
+            models = [randomModel(generator) for i in range(40)]
+            curves = [
+                    modelCurve(model, illuminated, generator)
+                    for model in models]
+            fit = DiodeFit.fitCurves(
+                    [voltage for voltage, current in curves],
+                    [current for voltage, current in curves])
+            self.assertTrue(fit['converged'].mean() > 0.8)
+            # a converged curve has all its parameters
+            self.assertFalse(any(
+                    [isnan(fit[name][fit['converged']]).any()
+                     for name in PARAMETERS]))
+            # the residuals are the noise, relative to the highest current
+            self.assertTrue((fit['rmsError'] < 1e-3).all())
+            self.assertFalse((fit['shuntResistance'] > 1e7).any())
+            # most parameters are determined by these curves
+            self.assertTrue(isfinite(fit['idealityFactor']).mean() > 0.8)
+            for i, model in enumerate(models):
+                self.assertRecovered(fit, model, i)
+
+    def testSingleMatchesMany(self):
+        generator = random.RandomState(5)
+        curves = [
+                modelCurve(randomModel(generator), True, generator)
+                for i in range(5)]
+        many = DiodeFit.fitCurves(
+                [voltage for voltage, current in curves],
+                [current for voltage, current in curves])
+        for i, (voltage, current) in enumerate(curves):
+            single = DiodeFit.fitCurve(voltage, current)
+            self.assertEqual(single['converged'], many['converged'][i])
+            for name in PARAMETERS:
+                self.assertTrue(allclose(
+                        single[name], many[name][i], rtol=1e-6,
+                        equal_nan=True))
+
+    def testCompliance(self):
+        """ the points clipped at the compliance do not bend the fit """
+        model = Keithley2400Simulator.DiodeModel()
+        voltage = linspace(-0.1, 1.0, 111)
+        current = maximum(- model.current(voltage), - 0.01)
+        fit = DiodeFit.fitCurve(voltage, current, compliance=0.01)
+        self.assertTrue(fit['converged'])
+        self.assertRecovered(fit, model)
+        self.assertFalse(isnan(fit['idealityFactor']))
+
+    def testTooFewPoints(self):
+        fit = DiodeFit.fitCurve([0.0, 0.1, 0.2], [1e-3, 9e-4, 5e-4])
+        self.assertFalse(fit['converged'])
+        for name in PARAMETERS:
+            self.assertTrue(isnan(fit[name]))
+
+    def testDeadCells(self):
+        """ the curves without a diode give no diode parameters, neither
+        bounds nor starting values, and are not converged """
+        for name in ('bad-1-1-forward.txt', 'ugly-1-1-forward.txt'):
+            metadata, voltage, current = MeasurementFile.readMeasurement(
+                    os.path.join(TEST_DIRECTORY, name))
+            fit = DiodeFit.fitCurve(
+                    voltage, - current, compliance=metadata['compliance'])
+            self.assertFalse(fit['converged'])
+            for parameter in PARAMETERS:
+                self.assertTrue(isnan(fit[parameter]), parameter)
+
+    def testNoParameterAtBound(self):
+        """ the parameters of the good cell are fitted or nan, never at a
+        bound """
+        metadata, voltage, current = MeasurementFile.readMeasurement(
+                os.path.join(TEST_DIRECTORY, 'good-1-1-reverse.txt'))
+        fit = DiodeFit.fitCurve(
+                voltage, - current, compliance=metadata['compliance'])
+        bounds = exp(concatenate(
+                (DiodeFit.LOWER_BOUNDS[1:], DiodeFit.UPPER_BOUNDS[1:])))
+        for name in PARAMETERS:
+            self.assertFalse(
+                    isclose(fit[name], bounds, rtol=1e-2, atol=0).any())
+        self.assertAlmostEqual(fit['idealityFactor'], 2.15, delta=0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression tests of Hysteresis: the batch interpolation gives the one of
+# numpy on each curve, the curves are paired by diode and measurement
+# order, and the indices of known pairs.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import unittest
+
+import Hysteresis
+import MeasurementReport
+
+
+def illuminatedCurve(voltage, jsc, voc):
+    """ current as measured (photocurrent with the sign of the files) of
+    an ideal diode with a shunt """
+    nVt = 0.04
+    current = jsc - (jsc - voc / 1e4) * expm1(voltage / nVt) / expm1(
+            voc / nVt) - voltage / 1e4
+    return current * (MeasurementReport.CURRENT_POSITIVE * 2 - 1)
+
+
+class InterpolateBatchTest(unittest.TestCase):
+
+    def testMatchesInterp(self):
+        generator = random.RandomState(7)
+        lengths = generator.randint(2, 50, 20)
+        x = zeros((20, 50))
+        y = generator.normal(size=(20, 50))
+        grids = []
+        for i, length in enumerate(lengths):
+            points = sort(generator.uniform(-1, 1, length))
+            # the scans of both directions
+            if i % 2:
+                points = points[::-1]
+            x[i, :length] = points
+            grids.append(generator.uniform(points.min(), points.max(), 30))
+        grid = array(grids)
+        resampled = Hysteresis.interpolateBatch(grid, x, y, lengths)
+        for i, length in enumerate(lengths):
+            order = argsort(x[i, :length])
+            expected = interp(
+                    grid[i], x[i, :length][order], y[i, :length][order])
+            self.assertTrue(allclose(resampled[i], expected, atol=1e-12))
+
+
+class PairCurvesTest(unittest.TestCase):
+
+    def testPairs(self):
+        base = dict(
+                user='ilario', experiment='ig40', device='c6',
+                irradiance=100.0, date='2017-03-02')
+        metadatas = [
+                dict(base, diode='1', direction='forward', time='10:00:00'),
+                dict(base, diode='2', direction='forward', time='10:01:00'),
+                dict(base, diode='1', direction='reverse', time='10:00:30'),
+                dict(base, diode='1', direction='forward', time='10:05:00'),
+                dict(base, diode='1', direction='reverse', time='10:05:30'),
+                # dark curves are not paired
+                dict(base, diode='2', direction='reverse', time='10:01:30',
+                     irradiance=0.0),
+                dict(base, diode='3', direction='reverse', time='10:02:00')]
+        self.assertEqual(
+                Hysteresis.pairCurves(metadatas), [(0, 2), (3, 4)])
+
+    def testUnmatchedCurve(self):
+        base = dict(
+                user='ilario', experiment='ig40', device='c6', diode='1',
+                irradiance=100.0, date='2017-03-02')
+        metadatas = [
+                dict(base, direction='forward', time='10:00:00'),
+                dict(base, direction='reverse', time='10:01:00'),
+                # a reverse curve whose forward one was not saved
+                dict(base, direction='reverse', time='11:00:00'),
+                dict(base, direction='forward', time='11:05:00'),
+                dict(base, direction='reverse', time='11:06:00'),
+                # a forward curve whose reverse one was not saved
+                dict(base, direction='forward', time='12:00:00')]
+        self.assertEqual(
+                Hysteresis.pairCurves(metadatas), [(0, 1), (3, 4)])
+
+
+class HysteresisBatchTest(unittest.TestCase):
+
+    def testIndices(self):
+        voltage = linspace(-0.1, 1.0, 111)
+        reverse = illuminatedCurve(voltage, 5e-3, 0.9)
+        forward = illuminatedCurve(voltage, 5e-3, 0.8)
+        # reverse scans are saved from the highest voltage
+        areaIndex, pceIndex = Hysteresis.hysteresisBatch(
+                [voltage, voltage], [forward, reverse],
+                [voltage[::-1], voltage[::-1]],
+                [reverse[::-1], reverse[::-1]])
+        self.assertTrue(0.05 < areaIndex[0] < 0.2)
+        self.assertTrue(0.05 < pceIndex[0] < 0.3)
+        self.assertAlmostEqual(areaIndex[1], 0)
+        self.assertAlmostEqual(pceIndex[1], 0)
+
+    def testUndefined(self):
+        voltage = linspace(-0.1, 1.0, 111)
+        dead = zeros(len(voltage))
+        self.assertEqual(
+                Hysteresis.curveHysteresis(voltage, dead, voltage, dead),
+                (None, None))
+        # no common voltage range in the power quadrant
+        areaIndex, pceIndex = Hysteresis.curveHysteresis(
+                voltage[:5], dead[:5], voltage[:5],
+                illuminatedCurve(voltage[:5], 5e-3, 0.9))
+        self.assertEqual(areaIndex, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
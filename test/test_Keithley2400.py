@@ -0,0 +1,259 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests of the measurements of Keithley2400.K2400 on the simulated
+# instrument: the readings are the currents and voltages of its diode
+# model, in all the transfer formats, without VISA.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import time
+import unittest
+
+import Keithley2400
+
+INTEGRATION_TIME = 0.01
+COMPLIANCE = 0.01
+# relative precision of the readings in the transfer formats: ASCII
+# numbers are written with 12 digits, SREAL keeps about 7 and DREAL is
+# limited by the iterative solution of the model
+PRECISION = {'ASCII': 1e-11, 'SREAL': 1e-6, 'DREAL': 1e-12}
+
+
+def simulatedSmu(dataFormat='DREAL', noise=0.0):
+    smu = Keithley2400.K2400(dataFormat=dataFormat, simulated=True)
+    smu.ctrl.noise = noise
+    return smu
+
+
+def modelCurrent(smu, voltage, illuminated=False):
+    """ current of the simulated cell, clipped at the compliance as the
+    readings """
+    return clip(
+            smu.ctrl.model.current(voltage, illuminated), -COMPLIANCE,
+            COMPLIANCE)
+
+
+class MeasureIVTest(unittest.TestCase):
+
+    def testSweep(self):
+        for dataFormat, precision in PRECISION.items():
+            smu = simulatedSmu(dataFormat)
+            data = smu.measureIV(
+                    -0.1, 0.8, 0.01, COMPLIANCE, 0, INTEGRATION_TIME, 0)
+            voltage = asarray(data['voltage'])
+            current = asarray(data['current'])
+            self.assertEqual(len(voltage), 91)
+            self.assertTrue(allclose(
+                    voltage, smu.sweepVoltages(-0.1, 0.8, 0.01),
+                    rtol=0, atol=1e-6))
+            # dark, the shutter is closed
+            expected = modelCurrent(smu, voltage)
+            self.assertTrue(
+                    allclose(current, expected, rtol=precision, atol=1e-18),
+                    dataFormat)
+
+    def testReverseIlluminated(self):
+        smu = simulatedSmu()
+        smu.shutterOpen()
+        data = smu.measureIV(
+                1.0, -0.1, 0.05, COMPLIANCE, 0, INTEGRATION_TIME, 0)
+        voltage = data['voltage']
+        self.assertEqual(voltage[0], 1.0)
+        self.assertTrue((diff(voltage) < 0).all())
+        expected = modelCurrent(smu, voltage, True)
+        self.assertTrue(allclose(
+                data['current'], expected, rtol=PRECISION['DREAL']))
+        # the photocurrent flows out of the cell at short circuit
+        self.assertTrue(data['current'][-1] < 0)
+
+    def testCancel(self):
+        smu = simulatedSmu()
+        smu.cancelCheck = lambda: True
+        self.assertRaises(
+                Keithley2400.MeasurementAborted, smu.measureIV,
+                -0.1, 1.0, 0.01, COMPLIANCE, 0, INTEGRATION_TIME, 0)
+
+
+    def testTimeout(self):
+        smu = simulatedSmu()
+        smu.timeoutMargin = 0.3
+        # the operation complete never sets the status byte
+        outputDuringSweep = []
+
+        def lostCompletion():
+            outputDuringSweep.append(smu.ctrl.output)
+            return 0
+        smu.ctrl.read_stb = lostCompletion
+        startTime = time.time()
+        try:
+            smu.measureIV(-0.1, 0.1, 0.05, COMPLIANCE, 0, INTEGRATION_TIME, 0)
+        except Keithley2400.MeasurementAborted as e:
+            self.assertTrue("not completed" in str(e))
+        else:
+            self.fail("no timeout")
+        self.assertTrue(time.time() - startTime < 5.0)
+        self.assertTrue(outputDuringSweep and all(outputDuringSweep))
+        self.assertFalse(smu.ctrl.output)
+        self.assertTrue(smu.state is None)
+
+
+def recordWrites(smu, failures=0):
+    """ records the messages written to the simulator, the first failures
+    writes raise an IOError as a VISA timeout """
+    messages = []
+    write = smu.ctrl.write
+
+    def recordingWrite(message):
+        if len(messages) < failures:
+            messages.append(None)
+            raise IOError("VISA timeout")
+        messages.append(message)
+        return write(message)
+    smu.ctrl.write = recordingWrite
+    return messages
+
+
+def sentSetting(messages, header):
+    return len([
+            message for message in messages
+            if message and header + " " in message]) > 0
+
+
+class ConfigurationStateTest(unittest.TestCase):
+
+    def measure(self, smu):
+        return smu.measureIV(
+                -0.1, 0.1, 0.05, COMPLIANCE, 0, INTEGRATION_TIME, 0)
+
+    def testUnchangedSettingsSkipped(self):
+        smu = simulatedSmu()
+        smu.reset()
+        self.measure(smu)
+        messages = recordWrites(smu)
+        data = self.measure(smu)
+        self.assertEqual(len(data['voltage']), 5)
+        self.assertFalse(sentSetting(messages, ":SENS:CURR:PROT"))
+        self.assertFalse(sentSetting(messages, ":SOUR:VOLT:START"))
+        self.assertEqual(smu.state[":SENS:CURR:PROT"], "%lf" % COMPLIANCE)
+
+    def testResentAfterFailedWrite(self):
+        smu = simulatedSmu()
+        smu.reset()
+        messages = recordWrites(smu, failures=1)
+        self.assertRaises(IOError, self.measure, smu)
+        self.assertTrue(smu.state is None)
+        data = self.measure(smu)
+        self.assertEqual(len(data['voltage']), 5)
+        self.assertTrue(sentSetting(messages, ":SENS:CURR:PROT"))
+        self.assertTrue(sentSetting(messages, ":SOUR:VOLT:START"))
+        # the next reset restores a known configuration
+        written = len(messages)
+        smu.reset()
+        self.assertTrue(messages[written].startswith("*rst"))
+        self.assertEqual(smu.state, {})
+
+    def testFailedConfigureNotCached(self):
+        smu = simulatedSmu()
+        smu.reset()
+        recordWrites(smu, failures=1)
+        self.assertRaises(
+                IOError, smu.configure, [(":SENS:CURR:PROT", "0.1")])
+        self.assertTrue(smu.state is None)
+
+    def testCancelForgetsState(self):
+        smu = simulatedSmu()
+        smu.reset()
+        smu.cancelCheck = lambda: True
+        self.assertRaises(Keithley2400.MeasurementAborted, self.measure, smu)
+        self.assertTrue(smu.state is None)
+
+
+class MeasureListIVTest(unittest.TestCase):
+
+    def testChunks(self):
+        """ more points than the source list holds """
+        points = 2 * Keithley2400.MAX_LIST_POINTS + 37
+        voltages = linspace(-0.1, 1.0, points)
+        for dataFormat, precision in PRECISION.items():
+            smu = simulatedSmu(dataFormat)
+            data = smu.measureListIV(
+                    voltages, COMPLIANCE, 0, INTEGRATION_TIME, 0)
+            self.assertEqual(len(data['voltage']), points)
+            self.assertTrue(allclose(
+                    data['voltage'], voltages, rtol=0, atol=1e-6))
+            self.assertTrue(allclose(
+                    data['current'],
+                    modelCurrent(smu, data['voltage']),
+                    rtol=precision, atol=1e-18), dataFormat)
+            self.assertTrue((data['range'] == 0).all())
+
+    def testRanges(self):
+        """ a fixed range too low for its chunk is measured again with
+        autorange """
+        voltages = linspace(0.0, 0.9, 150)
+        ranges = concatenate((ones(50) * 1e-3, ones(100) * 1e-6))
+        smu = simulatedSmu()
+        data = smu.measureListIV(
+                voltages, COMPLIANCE, 0, INTEGRATION_TIME, 0,
+                ranges=ranges)
+        expected = modelCurrent(smu, data['voltage'])
+        self.assertTrue(allclose(
+                data['current'], expected, rtol=PRECISION['DREAL']))
+        self.assertEqual(data['range'][0], 1e-3)
+        self.assertEqual(data['range'][-1], 0)
+
+    def testAbortOnCompliance(self):
+        smu = simulatedSmu()
+        readings = smu.streamIV(
+                0.0, 3.0, 0.05, COMPLIANCE, 0, INTEGRATION_TIME, 0,
+                abortOnCompliance=3)
+        self.assertRaises(
+                Keithley2400.MeasurementAborted, list, readings)
+
+
+class MeasureVoltageTest(unittest.TestCase):
+
+    def testStatistics(self):
+        names = ('mean', 'std', 'min', 'max')
+        for dataFormat in PRECISION:
+            smu = simulatedSmu(dataFormat, noise=1e-4)
+            smu.shutterOpen()
+            data = smu.measureVoltage(
+                    50, 2.0, 0, INTEGRATION_TIME, statistics=names)
+            voltage = data['voltage']
+            self.assertEqual(sorted(voltage), sorted(names))
+            # the open circuit voltage of the model
+            self.assertAlmostEqual(
+                    voltage['mean'], smu.ctrl.model.voltage(0, True),
+                    delta=1e-4)
+            self.assertTrue(
+                    voltage['min'] <= voltage['mean'] <= voltage['max'])
+            self.assertTrue(0 < voltage['std'] < 1e-3)
+
+    def testReadings(self):
+        smu = simulatedSmu()
+        smu.shutterOpen()
+        data = smu.measureVoltage(10, 2.0, 0, INTEGRATION_TIME)
+        self.assertEqual(len(data['voltage']), 10)
+        self.assertTrue(allclose(
+                data['voltage'], smu.ctrl.model.voltage(0, True)))
+
+
+if __name__ == '__main__':
+    unittest.main()
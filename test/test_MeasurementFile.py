@@ -0,0 +1,128 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression tests of MeasurementFile on the files of this directory,
+# saved by older versions of PyPV, and on the header written now.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import os
+import shutil
+import tempfile
+import unittest
+
+import MeasurementFile
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# header lines as written by MeasurementReport.makeHeader
+HEADER = (
+        "PyPV software (Gr. E. Palomares, ICIQ) - Voltage-Current "
+        "measurement Report",
+        "User:\tilario",
+        "Date:\t2017-03-02    Time: 12:30:05",
+        "Experiment:\tig40", "Device:\tc6", "Diode:\t1",
+        "Forward or reverse? reverse",
+        "Compliance (A):\t0.01",
+        "Scale (A):\tFalse\tCurrent Ranges:\t0.0001@-0.1;0.01@0.6",
+        "Serie Resistance (Ohm):\tNotFound\tParallel Resistance (Ohm):\t"
+        "20722.9\tDiode Fit Rs (Ohm):\t15.67\tRsh (Ohm):\t2.004e+04\t"
+        "Ideality Factor:\t1.6\tI0 (A):\tNotFound",
+        "Jsc (mA/cm2):\t22.21",
+        "Voltage_V \tCurrent_mA")
+
+
+def dataFile(name):
+    return os.path.join(TEST_DIRECTORY, name)
+
+
+class ReadMeasurementTest(unittest.TestCase):
+
+    def testFiles(self):
+        for name, points, direction in (
+                ('bad-1-1-forward.txt', 36, 'forward'),
+                ('good-1-1-reverse.txt', 111, 'reverse'),
+                ('ugly-1-1-forward.txt', 111, 'forward')):
+            metadata, voltage, current = MeasurementFile.readMeasurement(
+                    dataFile(name))
+            self.assertEqual((len(voltage), len(current)), (points, points))
+            self.assertEqual(metadata['direction'], direction)
+            self.assertEqual(metadata['device'], '1')
+            self.assertEqual(metadata['compliance'], 0.01)
+            self.assertTrue(MeasurementFile.isMeasurementFile(
+                    dataFile(name)))
+
+    def testValues(self):
+        metadata, voltage, current = MeasurementFile.readMeasurement(
+                dataFile('good-1-1-reverse.txt'))
+        self.assertEqual(metadata['user'], 'ilario')
+        self.assertEqual(metadata['date'], '2015-05-21')
+        self.assertEqual(metadata['cellArea'], 0.25)
+        self.assertEqual(metadata['voc'], 0.877)
+        # the current is in A, the file in mA
+        self.assertEqual((voltage[0], current[0]), (1.0, 5.99217e-3))
+        self.assertEqual(voltage[-1], -0.1)
+
+    def testNotMeasurement(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, 'notes.txt')
+            with open(fileName, 'w') as f:
+                f.write("Voltage 1\n")
+            self.assertFalse(MeasurementFile.isMeasurementFile(fileName))
+            self.assertRaises(
+                    ValueError, MeasurementFile.readMeasurement, fileName)
+        finally:
+            shutil.rmtree(directory)
+
+
+class ParseTest(unittest.TestCase):
+
+    def testHeader(self):
+        metadata = MeasurementFile.parseHeader(HEADER)
+        self.assertEqual(metadata['user'], 'ilario')
+        self.assertEqual(metadata['date'], '2017-03-02')
+        self.assertEqual(metadata['time'], '12:30:05')
+        self.assertEqual(metadata['device'], 'c6')
+        self.assertEqual(metadata['diode'], '1')
+        self.assertEqual(metadata['direction'], 'reverse')
+        self.assertEqual(metadata['compliance'], 0.01)
+        self.assertEqual(metadata['scale'], None)
+        self.assertEqual(metadata['currentRanges'], '0.0001@-0.1;0.01@0.6')
+        self.assertEqual(metadata['seriesResistance'], 'NotFound')
+        self.assertEqual(metadata['parallelResistance'], 20722.9)
+        self.assertEqual(metadata['fitSeriesResistance'], 15.67)
+        self.assertEqual(metadata['fitShuntResistance'], 2.004e4)
+        self.assertEqual(metadata['idealityFactor'], 1.6)
+        self.assertEqual(metadata['saturationCurrent'], 'NotFound')
+        self.assertEqual(metadata['jscDensity'], 22.21)
+
+    def testContent(self):
+        content = (
+                "\n".join(HEADER).encode('latin-1') +
+                b"\n-0.1 \t-2.5\n0 \t-2.4\n0.1 \t-2.2\n")
+        header, block = MeasurementFile.splitContent(content)
+        self.assertEqual(header, list(HEADER))
+        voltage, current = MeasurementFile.parseData(block)
+        self.assertTrue(array_equal(voltage, [-0.1, 0, 0.1]))
+        self.assertTrue(allclose(current, [-2.5e-3, -2.4e-3, -2.2e-3]))
+        self.assertRaises(
+                ValueError, MeasurementFile.parseData, b"0.1 \t2\n0.2\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
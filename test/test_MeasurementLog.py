@@ -0,0 +1,132 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Tests of the log of the measurements and of its background writer.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import MeasurementLog
+
+
+class MeasurementLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'log.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testBackgroundOrder(self):
+        log = MeasurementLog.MeasurementLog(self.fileName, syncInterval=0.01)
+        for i in range(500):
+            log.log('save', index=i, voc=float64(0.9))
+        log.close()
+        records = list(MeasurementLog.readLog(self.fileName))
+        self.assertEqual([record['index'] for record in records], range(500))
+        self.assertEqual(records[0]['voc'], 0.9)
+        self.assertEqual(records[0]['event'], 'save')
+
+    def testCloseWritesPending(self):
+        log = MeasurementLog.MeasurementLog(self.fileName, syncInterval=60.0)
+        # the writer is held until the records are queued
+        hold = threading.Lock()
+        hold.acquire()
+        write = log.write
+
+        def heldWrite(lines):
+            with hold:
+                write(lines)
+        log.write = heldWrite
+        for i in range(100):
+            log.log('save', index=i)
+        self.assertEqual(os.path.getsize(self.fileName), 0)
+        hold.release()
+        log.close()
+        self.assertFalse(log.thread.is_alive())
+        self.assertTrue(log.file.closed)
+        records = list(MeasurementLog.readLog(self.fileName))
+        self.assertEqual([record['index'] for record in records], range(100))
+
+    def testAppendWithoutBackground(self):
+        for run in range(2):
+            log = MeasurementLog.MeasurementLog(
+                    self.fileName, background=False)
+            log.log('start', run=run)
+            # written by log itself
+            self.assertEqual(
+                    len(list(MeasurementLog.readLog(self.fileName))),
+                    2 * run + 1)
+            log.log('save', run=run)
+            log.close()
+        records = list(MeasurementLog.readLog(self.fileName))
+        self.assertEqual(
+                [(record['event'], record['run']) for record in records],
+                [('start', 0), ('save', 0), ('start', 1), ('save', 1)])
+
+    def testReadLog(self):
+        log = MeasurementLog.MeasurementLog(self.fileName, background=False)
+        log.log('save', file='a.txt', note='"event": "save"')
+        log.log('start', file='b.txt', note='"event": "save"')
+        log.log('save', file='c.txt', comment=object())
+        log.close()
+        # a record cut by a crash
+        with open(self.fileName, 'a') as f:
+            f.write('{"event": "save", "file": "d.t')
+        records = list(MeasurementLog.readLog(self.fileName, 'save'))
+        self.assertEqual(
+                [record['file'] for record in records], ['a.txt', 'c.txt'])
+        self.assertTrue(isinstance(records[1]['comment'], basestring))
+        self.assertEqual(
+                len(list(MeasurementLog.readLog(self.fileName))), 3)
+
+    def testSummarise(self):
+        records = [
+                dict(user='ilario', experiment='ig40', efficiency=10.0,
+                     voc=0.9),
+                dict(user='ilario', experiment='ig40', efficiency=14.0),
+                dict(user='ilario', experiment='ig41', efficiency=None,
+                     voc=0.8),
+                dict(user='anna', experiment='ig40', efficiency=5)]
+        summary = MeasurementLog.summarise(records)
+        self.assertEqual(
+                [(row['user'], row['experiment'], row['count'])
+                 for row in summary],
+                [('anna', 'ig40', 1), ('ilario', 'ig40', 2),
+                 ('ilario', 'ig41', 1)])
+        self.assertEqual(summary[0]['efficiencyMax'], 5)
+        self.assertEqual(summary[1]['efficiencyMean'], 12.0)
+        self.assertEqual(summary[1]['efficiencyMax'], 14.0)
+        self.assertEqual(summary[1]['vocMean'], 0.9)
+        self.assertFalse('efficiencyMean' in summary[2])
+        self.assertEqual(summary[2]['vocMax'], 0.8)
+        summary = MeasurementLog.summarise(
+                records, by=('experiment',), fields=('voc',))
+        self.assertEqual([row['count'] for row in summary], [3, 1])
+        self.assertFalse('efficiencyMean' in summary[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
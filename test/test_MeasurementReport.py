@@ -0,0 +1,96 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Tests of the reports of the measurements made by MeasurementReport.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import DiodeFit
+import MeasurementFile
+import MeasurementReport
+import RunList
+
+PYPV_DIRECTORY = os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__)))
+
+
+class DarkDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fitCurve = DiodeFit.fitCurve
+        self.fits = 0
+
+        def countedFitCurve(*args, **kwargs):
+            self.fits += 1
+            return self.fitCurve(*args, **kwargs)
+        DiodeFit.fitCurve = countedFitCurve
+
+    def tearDown(self):
+        DiodeFit.fitCurve = self.fitCurve
+        shutil.rmtree(self.directory)
+
+    def measurement(self, fileName):
+        entry = RunList.readList(
+                os.path.join(PYPV_DIRECTORY, 'list-example.txt'))[0]
+        scaleValues = RunList.readScaleValues(
+                os.path.join(PYPV_DIRECTORY, RunList.UI_FILE))
+        parameters = MeasurementReport.listParameters(entry, scaleValues, 0)
+        self.identification = MeasurementReport.listIdentification(entry)
+        m = RunList.ListMeasurement(
+                parameters, '2017-03-02', '0.1', self.identification[-1])
+        metadata, m.voltage, m.current = MeasurementFile.readMeasurement(
+                os.path.join(PYPV_DIRECTORY, 'test', fileName))
+        return m
+
+    def save(self, m, fileName):
+        MeasurementReport.saveText(
+                m, os.path.join(self.directory, fileName),
+                *self.identification)
+        with open(os.path.join(self.directory, fileName)) as f:
+            return [line for line in f if 'Serie Resistance' in line]
+
+    def testFitOncePerMeasurement(self):
+        m = self.measurement('good-1-1-reverse.txt')
+        MeasurementReport.analyse(m)
+        m.efficiency = MeasurementReport.calcEfficiency(
+                m.maxPower, m.cellArea, m.irradiance)
+        last = self.save(m, 'last_measurement.txt')
+        saved = self.save(m, 'saved.txt')
+        result = MeasurementReport.resultRecord(
+                m, 'saved.txt', *self.identification[:-1])
+        self.assertEqual(self.fits, 1)
+        self.assertEqual(last, saved)
+        self.assertEqual(
+                result['parallelResistance'],
+                float(m.darkData['parallelResistance']))
+        # the next curve measured is fitted again
+        m.voltage = m.voltage[::-1]
+        m.current = m.current[::-1]
+        MeasurementReport.analyse(m)
+        self.save(m, 'last_measurement.txt')
+        self.assertEqual(self.fits, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression tests of MeasurementStore: curves and metadata are read back
+# as appended, also by a new store on the same directory, and looked up
+# by their metadata.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import shutil
+import tempfile
+import unittest
+
+import MeasurementStore
+
+
+class MeasurementStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fillStore(self, store):
+        generator = random.RandomState(6)
+        curves = []
+        for i in range(6):
+            voltage = linspace(-0.1, 1.0, generator.randint(1, 200))
+            current = generator.normal(0, 1e-3, len(voltage))
+            record = store.append(
+                    voltage, current, device='c%d' % (i % 3),
+                    diode=str(i % 2), irradiance=100.0 * (i % 2))
+            curves.append((record, voltage, current))
+        return curves
+
+    def assertCurvesRead(self, store, curves):
+        for record, voltage, current in curves:
+            storedVoltage, storedCurrent = store.curve(record)
+            self.assertTrue(array_equal(storedVoltage, voltage))
+            self.assertTrue(array_equal(storedCurrent, current))
+
+    def testAppendAndRead(self):
+        store = MeasurementStore.MeasurementStore(self.directory)
+        curves = self.fillStore(store)
+        self.assertEqual(
+                [record['id'] for record, v, c in curves], range(6))
+        self.assertCurvesRead(store, curves)
+        # appended after the columns were mapped
+        curves += self.fillStore(store)
+        self.assertCurvesRead(store, curves)
+
+    def testReopen(self):
+        curves = self.fillStore(
+                MeasurementStore.MeasurementStore(self.directory))
+        store = MeasurementStore.MeasurementStore(self.directory)
+        self.assertEqual(
+                store.records, [record for record, v, c in curves])
+        self.assertCurvesRead(store, curves)
+
+    def testFind(self):
+        store = MeasurementStore.MeasurementStore(self.directory)
+        curves = self.fillStore(store)
+        found = store.find(device='c1', diode='1')
+        self.assertEqual([record['id'] for record in found], [1])
+        found = store.find(irradiance=0.0)
+        self.assertEqual([record['id'] for record in found], [0, 2, 4])
+        self.assertEqual(store.find(device='none'), [])
+        self.assertEqual(len(store.find()), len(curves))
+        ids = [record['id'] for record, v, c in store.curves(diode='0')]
+        self.assertEqual(ids, [0, 2, 4])
+
+    def testEmptyCurve(self):
+        store = MeasurementStore.MeasurementStore(self.directory)
+        record = store.append([], [], device='c1')
+        voltage, current = store.curve(record)
+        self.assertEqual((len(voltage), len(current)), (0, 0))
+
+    def testLengthsDiffer(self):
+        store = MeasurementStore.MeasurementStore(self.directory)
+        self.assertRaises(ValueError, store.append, [0.0, 0.1], [1e-3])
+        self.assertEqual(store.records, [])
+
+    def testInterruptedAppend(self):
+        """ points written without their record are skipped """
+        store = MeasurementStore.MeasurementStore(self.directory)
+        curves = self.fillStore(store)
+        for column in MeasurementStore.COLUMNS:
+            with open(store.columnName(column), 'ab') as f:
+                ones(7, MeasurementStore.DATA_TYPE).tofile(f)
+        store = MeasurementStore.MeasurementStore(self.directory)
+        curves += self.fillStore(store)
+        self.assertCurvesRead(store, curves)
+
+
+if __name__ == '__main__':
+    unittest.main()
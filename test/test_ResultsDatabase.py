@@ -0,0 +1,132 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Tests of the SQLite database of the results of the saved measurements.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+import unittest
+
+import ResultsDatabase
+
+
+def result(fileName, device, direction, efficiency, **values):
+    row = dict(
+            file=fileName, user='ilario', experiment='ig40', device=device,
+            diode='1', direction=direction, efficiency=efficiency,
+            voc=0.9 + efficiency / 100)
+    row.update(values)
+    return row
+
+
+class ResultsDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.results = ResultsDatabase.ResultsDatabase(':memory:')
+        self.results.insertMany([
+                result('c6-1-forward.txt', 'c6', 'forward', 10.0),
+                result('c6-1-reverse.txt', 'c6', 'reverse', 12.0),
+                result('c7-1-forward.txt', 'c7', 'forward', 8.0),
+                result('c7-1-reverse.txt', 'c7', 'reverse', 9.0,
+                       experiment='ig41')])
+
+    def tearDown(self):
+        self.results.close()
+
+    def testInsertAgainKeepsMissingColumns(self):
+        self.results.updateMany(
+                [dict(file='c6-1-forward.txt', hysteresisIndex=0.2)],
+                ('hysteresisIndex',))
+        # saved again, the new result has no hysteresis index nor voc
+        again = result('c6-1-forward.txt', 'c6', 'forward', 11.0)
+        del again['voc']
+        self.results.insert(**again)
+        rows = self.results.query(file='c6-1-forward.txt')
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['efficiency'], 11.0)
+        self.assertEqual(rows[0]['voc'], 1.0)
+        self.assertEqual(rows[0]['hysteresisIndex'], 0.2)
+        self.assertEqual(len(self.results.query()), 4)
+
+    def testUnknownKeysIgnored(self):
+        self.results.insert(
+                **result('c8-1-forward.txt', 'c8', 'forward', 7.0,
+                         comment='not a column'))
+        self.assertEqual(len(self.results.query(device='c8')), 1)
+
+    def testUpdateMany(self):
+        self.results.updateMany([
+                dict(file='c6-1-forward.txt', hysteresisIndex=0.1,
+                     pceHysteresisIndex=0.15),
+                dict(file='c6-1-reverse.txt', hysteresisIndex=0.1,
+                     pceHysteresisIndex=0.15)],
+                ('hysteresisIndex', 'pceHysteresisIndex'))
+        rows = self.results.query(device='c6')
+        self.assertEqual(
+                [(row['hysteresisIndex'], row['pceHysteresisIndex'])
+                 for row in rows], [(0.1, 0.15)] * 2)
+        # the other columns are untouched
+        self.assertEqual([row['efficiency'] for row in rows], [10.0, 12.0])
+        self.assertEqual(
+                self.results.query(device='c7')[0]['hysteresisIndex'],
+                None)
+        self.assertRaises(
+                ValueError, self.results.updateMany,
+                [dict(file='c6-1-forward.txt')], ('nothing',))
+
+    def testQuery(self):
+        rows = self.results.query(experiment='ig40', orderBy='efficiency')
+        self.assertEqual(
+                [row['file'] for row in rows],
+                ['c7-1-forward.txt', 'c6-1-forward.txt', 'c6-1-reverse.txt'])
+        rows = self.results.query(
+                direction='reverse', experiment=('ig40', 'ig41'),
+                orderBy='efficiency DESC', limit=1)
+        self.assertEqual([row['file'] for row in rows], ['c6-1-reverse.txt'])
+        self.assertEqual(self.results.query(device='c9'), [])
+        self.assertRaises(ValueError, self.results.query, nothing=1)
+        self.assertRaises(
+                ValueError, self.results.query, orderBy='efficiency UP')
+
+    def testSummary(self):
+        rows = self.results.summary(('device',), experiment='ig40')
+        self.assertEqual([row['device'] for row in rows], ['c6', 'c7'])
+        self.assertEqual([row['count'] for row in rows], [2, 1])
+        self.assertAlmostEqual(rows[0]['efficiencyMean'], 11.0)
+        self.assertEqual(rows[0]['efficiencyMax'], 12.0)
+        self.assertAlmostEqual(rows[1]['vocMax'], 0.98)
+        rows = self.results.summary(('experiment', 'direction'))
+        self.assertEqual(
+                [(row['experiment'], row['direction'], row['count'])
+                 for row in rows],
+                [('ig40', 'forward', 2), ('ig40', 'reverse', 1),
+                 ('ig41', 'reverse', 1)])
+
+    def testBest(self):
+        self.assertEqual(
+                self.results.best()['file'], 'c6-1-reverse.txt')
+        self.assertEqual(
+                self.results.best(device='c7')['file'], 'c7-1-reverse.txt')
+        self.assertEqual(
+                self.results.best('voc', experiment='ig40')['file'],
+                'c6-1-reverse.txt')
+        self.assertEqual(self.results.best(device='c9'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests of the reading of the measurements list files by RunList.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import MeasurementReport
+import RunList
+
+PYPV_DIRECTORY = os.path.dirname(
+        os.path.dirname(os.path.abspath(__file__)))
+
+
+class ReadListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writeList(self, *entries):
+        fileName = os.path.join(self.directory, 'list.txt')
+        with open(fileName, 'w') as f:
+            f.write("\t".join(MeasurementReport.LIST_COLUMNS) + "\n")
+            for entry in entries:
+                f.write("\t".join(entry) + "\n")
+        return fileName
+
+    def testExample(self):
+        entries = RunList.readList(
+                os.path.join(PYPV_DIRECTORY, 'list-example.txt'))
+        self.assertEqual(len(entries), 2)
+        scaleValues = RunList.readScaleValues(
+                os.path.join(PYPV_DIRECTORY, RunList.UI_FILE))
+        for entry in entries:
+            parameters = MeasurementReport.listParameters(
+                    entry, scaleValues, 0)
+            self.assertEqual(parameters['cellArea'], 0.09)
+            self.assertEqual(
+                    MeasurementReport.listIdentification(entry)[2], 'c6')
+
+    def testBadLines(self):
+        good = (
+                'ilario', 'ig40', '-0.1', '1.0', '0.01', '0.01', '3', '0.1',
+                '0.09', '1', '100', 'c6', '1', '0', '0', '0', '0', '0')
+        self.assertEqual(len(RunList.readList(self.writeList(good))), 1)
+        # the optional instrument column
+        self.assertEqual(
+                len(RunList.readList(self.writeList(good + ('1',)))), 1)
+        for entry, message in (
+                (good[:17], "line 3: 17 columns instead of 18"),
+                (good[:9] + ('0.5',) + good[10:],
+                 "line 3: AutoScale is 0.5, not an integer"),
+                (good[:2] + ('start',) + good[3:],
+                 "line 3: StartV is start, not a number")):
+            try:
+                RunList.readList(self.writeList(good, entry))
+            except ValueError as e:
+                self.assertTrue(message in str(e), str(e))
+            else:
+                self.fail("no error for %s" % message)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression tests of the fixed size buffers of TimeSeries against the
+# whole series appended.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import os
+import shutil
+import tempfile
+import unittest
+
+import TimeSeries
+
+
+def series(count):
+    """ rows of time and two values """
+    time = arange(count, dtype=float)
+    return column_stack((time, sin(time), time ** 2))
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def testLastRows(self):
+        rows = series(250)
+        buffer = TimeSeries.RingBuffer(100, 3)
+        for count, row in enumerate(rows, 1):
+            buffer.append(row)
+            self.assertEqual(len(buffer), min(count, 100))
+            if count in (1, 99, 100, 101, 250):
+                self.assertTrue(array_equal(
+                        buffer.data(), rows[max(count - 100, 0):count].T))
+
+    def testDataIsCopy(self):
+        buffer = TimeSeries.RingBuffer(4, 3)
+        for row in series(6):
+            buffer.append(row)
+        data = buffer.data()
+        buffer.append(series(7)[-1])
+        self.assertTrue(array_equal(data, series(6)[2:].T))
+
+
+class DecimatedTraceTest(unittest.TestCase):
+
+    def testEvenlySpaced(self):
+        rows = series(1000)
+        trace = TimeSeries.DecimatedTrace(64, 3)
+        for count, row in enumerate(rows, 1):
+            trace.append(row)
+            self.assertTrue(len(trace) <= 64)
+            self.assertTrue(array_equal(
+                    trace.data(), rows[:count:trace.stride].T))
+        self.assertTrue(len(trace) >= 32)
+
+
+class DownsampledSeriesTest(unittest.TestCase):
+
+    def testSummaries(self):
+        rows = series(5000)
+        history = TimeSeries.DownsampledSeries(3, 100, 16, 10)
+        for count, row in enumerate(rows, 1):
+            history.append(row)
+            self.assertEqual(len(history), count)
+            self.assertTrue(history.bins <= 16)
+        mean, low, high = history.data()
+        counts = concatenate((history.counts[:history.bins], ones(100)))
+        # the recent rows as they are
+        self.assertTrue(array_equal(mean[:, -100:], rows[-100:].T))
+        # the bins cover all the older rows, in order
+        self.assertTrue(allclose(
+                (mean * counts).sum(axis=1), rows.sum(axis=0)))
+        self.assertTrue(array_equal(low.min(axis=1), rows.min(axis=0)))
+        self.assertTrue(array_equal(high.max(axis=1), rows.max(axis=0)))
+        self.assertTrue((diff(mean[0]) > 0).all())
+        self.assertTrue((low <= mean + 1e-9).all())
+        self.assertTrue((mean <= high + 1e-9).all())
+
+    def testBinBounds(self):
+        """ each bin spans the times of its rows """
+        rows = series(777)
+        history = TimeSeries.DownsampledSeries(3, 7, 6, 4)
+        for row in rows:
+            history.append(row)
+        mean, low, high = history.data()
+        counts = history.counts[:history.bins]
+        starts = concatenate(([0], cumsum(counts)[:-1]))
+        self.assertTrue(array_equal(low[0, :history.bins], starts))
+        self.assertTrue(array_equal(
+                high[0, :history.bins], starts + counts - 1))
+
+
+class SeriesWriterTest(unittest.TestCase):
+
+    def testChunks(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, 'series.txt')
+            writer = TimeSeries.SeriesWriter(
+                    fileName, ('Time_s', 'Current_mA'), header=('User: me',),
+                    chunkPoints=8, multipliers=(1, 1e3))
+            rows = series(21)[:, :2]
+            for row in rows:
+                writer.append(row)
+            # the full chunks are already on disk
+            self.assertEqual(len(loadtxt(fileName, skiprows=2)), 16)
+            writer.close()
+            with open(fileName) as f:
+                self.assertEqual(
+                        f.read().splitlines()[:2],
+                        ['User: me', 'Time_s\tCurrent_mA'])
+            saved = loadtxt(fileName, skiprows=2)
+            self.assertEqual(writer.points, 21)
+            self.assertTrue(allclose(saved, rows * (1, 1e3), rtol=1e-5))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
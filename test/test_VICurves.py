@@ -0,0 +1,223 @@
+# PyPV
+#
+# Copyright (C) 2015-2017 Ilario Gelmetti <iochesonome@gmail.com>
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+# Regression tests of the batch analysis of VICurves: the batch functions
+# give the results of the scalar ones, on the curves of this directory
+# and on synthetic ones, and calcSeriesResistance finds the window the
+# trimming loop it replaced found.
+#
+# Usage: python2 -m unittest discover (from the PyPV directory)
+
+from numpy import *
+import os
+import unittest
+
+import MeasurementFile
+import VICurves
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEST_FILES = (
+        'bad-1-1-forward.txt', 'good-1-1-reverse.txt',
+        'ugly-1-1-forward.txt')
+
+
+def readCurve(name):
+    """ metadata, voltage and current (photocurrent positive, in A) of a
+    test file """
+    metadata, voltage, current = MeasurementFile.readMeasurement(
+            os.path.join(TEST_DIRECTORY, name))
+    return metadata, voltage, - current
+
+
+def syntheticCurve(generator, points):
+    """ a noisy illuminated curve of an ideal diode with a shunt, from
+    -0.1 V to beyond its open circuit voltage """
+    jsc = generator.uniform(1e-3, 1e-2)
+    voc = generator.uniform(0.5, 1.1)
+    nVt = generator.uniform(0.03, 0.06)
+    shuntResistance = generator.uniform(1e3, 1e5)
+    saturationCurrent = (jsc - voc / shuntResistance) / expm1(voc / nVt)
+    voltage = linspace(-0.1, voc + 0.2, points)
+    current = (
+            jsc - saturationCurrent * expm1(voltage / nVt) -
+            voltage / shuntResistance)
+    current += generator.normal(0, 1e-6, points)
+    return voltage, current
+
+
+class ExtractdataBatchTest(unittest.TestCase):
+
+    def assertMatchesScalar(self, voltages, currents):
+        batch = VICurves.extractdataBatch(voltages, currents)
+        for i, (voltage, current) in enumerate(zip(voltages, currents)):
+            scalar = VICurves.extractdata(voltage, current)
+            for name, value, expected in zip(
+                    ('maxPower', 'jsc', 'voc', 'ff', 'voltageMaxPower',
+                     'currentMaxPower'), batch, scalar):
+                self.assertTrue(
+                        allclose(value[i], expected, rtol=1e-9, atol=1e-12),
+                        "%s of curve %d: %r, scalar %r" % (
+                            name, i, value[i], expected))
+
+    def testFiles(self):
+        curves = [readCurve(name) for name in TEST_FILES]
+        self.assertMatchesScalar(
+                [voltage for metadata, voltage, current in curves],
+                [current for metadata, voltage, current in curves])
+
+    def testSynthetic(self):
+        generator = random.RandomState(1)
+        curves = [
+                syntheticCurve(generator, generator.randint(20, 200))
+                for i in range(50)]
+        self.assertMatchesScalar(
+                [voltage for voltage, current in curves],
+                [current for voltage, current in curves])
+
+    def testStackedWithLengths(self):
+        generator = random.RandomState(2)
+        curves = [syntheticCurve(generator, n) for n in (30, 80, 120)]
+        voltage, lengths = VICurves.stackCurves([v for v, c in curves])
+        current, lengths = VICurves.stackCurves([c for v, c in curves])
+        # the padding is not read
+        voltage[0, 30:] = 100
+        current[0, 30:] = 100
+        batch = VICurves.extractdataBatch(voltage, current, lengths)
+        for i, (v, c) in enumerate(curves):
+            self.assertTrue(allclose(
+                    [value[i] for value in batch],
+                    VICurves.extractdata(v, c), rtol=1e-9))
+
+    def testDegenerateCurveInBatch(self):
+        """ a curve clipped at the compliance, or too short, gets nan
+        where it defines no parabola, without failing the other ones """
+        generator = random.RandomState(9)
+        voltage, current = syntheticCurve(generator, 50)
+        clipped = ones(50) * 0.01
+        batch = VICurves.extractdataBatch(
+                [voltage, voltage, voltage[:2], voltage],
+                [current, clipped, current[:2], current])
+        maxPower, jsc, voc, ff, voltageMaxPower, currentMaxPower = batch
+        expected = VICurves.extractdata(voltage, current)
+        for row in (0, 3):
+            self.assertTrue(allclose(
+                    [value[row] for value in batch], expected, rtol=1e-9))
+        self.assertTrue(isnan(voc[1]) and isnan(ff[1]))
+        self.assertAlmostEqual(jsc[1], 0.01)
+        self.assertAlmostEqual(maxPower[1], 0.01 * voltage.max())
+        self.assertTrue(isnan(jsc[2]) and isnan(voc[2]))
+
+    def testHeaderOfGoodFile(self):
+        metadata, voltage, current = readCurve('good-1-1-reverse.txt')
+        maxPower, jsc, voc, ff, voltageMaxPower, currentMaxPower = (
+                VICurves.extractdataBatch([voltage], [current]))
+        cellArea = metadata['cellArea']
+        self.assertAlmostEqual(
+                jsc[0] * 1e3 / cellArea, metadata['jscDensity'], delta=0.02)
+        self.assertAlmostEqual(voc[0], metadata['voc'], places=3)
+        self.assertAlmostEqual(ff[0], metadata['ff'], places=3)
+
+
+def loopSeriesResistance(voltage, current, compliance, reverse):
+    """ calcSeriesResistance as it was, trimming the curve in a loop """
+    seriesResistance = "NotFound"
+    if reverse:
+        current = current[::-1]
+        voltage = voltage[::-1]
+
+    while len(voltage) > 6:
+        length = len(voltage)
+        if current[length - 6] > 0:
+            break
+        if (
+                (current[length - 5] > current[length - 4]) &
+                (current[length - 4] > current[length - 3]) &
+                (current[length - 3] > current[length - 2]) &
+                (current[length - 2] > current[length - 1]) &
+                (current[length - 1] > - compliance)):
+            voltageSR = voltage[length-5:length]
+            currentSR = current[length-5:length]
+            fitSR = polyfit(voltageSR, currentSR, 1)
+            seriesResistance = - 1 / fitSR[0]
+            break
+        else:
+            current = current[0:length - 2]
+            voltage = voltage[0:length - 2]
+    return seriesResistance
+
+
+class SeriesResistanceTest(unittest.TestCase):
+
+    def assertSameResistance(self, voltage, current, compliance, reverse):
+        expected = loopSeriesResistance(voltage, current, compliance, reverse)
+        found = VICurves.calcSeriesResistance(
+                voltage, current, compliance, reverse)
+        if expected == "NotFound":
+            self.assertEqual(found, "NotFound")
+        else:
+            self.assertAlmostEqual(found, expected, delta=1e-9 * abs(expected))
+
+    def testFiles(self):
+        for name in TEST_FILES:
+            metadata, voltage, current = readCurve(name)
+            for reverse in (False, True):
+                self.assertSameResistance(
+                        voltage, current, metadata['compliance'], reverse)
+
+    def testRandomCurves(self):
+        """ short, noisy curves, crossing zero and reaching the
+        compliance, where all the branches of the trimming are taken """
+        generator = random.RandomState(3)
+        compliance = 0.01
+        for i in range(3000):
+            points = generator.randint(0, 30)
+            voltage = linspace(-0.1, 1.0, points)
+            steps = generator.normal(
+                    - generator.uniform(0, 2e-3), 1e-3, points)
+            current = maximum(
+                    generator.uniform(-2e-3, 5e-3) + cumsum(steps),
+                    - compliance)
+            self.assertSameResistance(
+                    voltage, current, compliance, generator.rand() < 0.5)
+
+    def testFitQuality(self):
+        metadata, voltage, current = readCurve('good-1-1-reverse.txt')
+        seriesResistance, rSquared = VICurves.calcSeriesResistance(
+                voltage, current, metadata['compliance'], True,
+                fitQuality=True)
+        self.assertEqual(
+                seriesResistance, VICurves.calcSeriesResistance(
+                    voltage, current, metadata['compliance'], True))
+        self.assertTrue(0.9 < rSquared <= 1)
+
+
+class QuadraticInterceptBatchTest(unittest.TestCase):
+
+    def testExactParabola(self):
+        x = tile(linspace(-0.3, 0.4, 15), (3, 1)) + array(
+                [[0], [0.1], [0.2]])
+        coefficients = array([[1.0, -2.0, 0.5], [3.0, 0.0, -1.0],
+                              [-0.5, 4.0, 2.0]])
+        y = (coefficients[:, 0:1] * x ** 2 + coefficients[:, 1:2] * x +
+             coefficients[:, 2:3])
+        intercept = VICurves.quadraticInterceptBatch(
+                x, y, ones(x.shape, dtype=bool))
+        self.assertTrue(allclose(intercept, coefficients[:, 2]))
+
+
+if __name__ == '__main__':
+    unittest.main()